@@ -0,0 +1,122 @@
+# Benchmark for the input modes of the GRU+SVM model
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Compares the one-hot and projected input modes, for the same variables"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import argparse
+from models.gru_svm.gru_svm import GruSvm
+import numpy as np
+import tensorflow as tf
+import time
+
+# hyper-parameters of gru_svm_main.py
+BATCH_SIZE = 256
+CELL_SIZE = 256
+DROPOUT_P_KEEP = 0.85
+LEARNING_RATE = 1e-5
+N_CLASSES = 2
+SEQUENCE_LENGTH = 21
+SVM_C = 0.5
+
+
+def build(input_mode):
+    """Returns the graph, session and model of the given input mode"""
+    graph = tf.Graph()
+
+    with graph.as_default():
+        model = GruSvm(alpha=LEARNING_RATE, batch_size=BATCH_SIZE, cell_size=CELL_SIZE, dropout_rate=DROPOUT_P_KEEP,
+                       num_classes=N_CLASSES, sequence_length=SEQUENCE_LENGTH, svm_c=SVM_C, input_mode=input_mode)
+        sess = tf.Session(graph=graph)
+        sess.run(tf.global_variables_initializer())
+
+    return graph, sess, model
+
+
+def run_steps(sess, model, features, labels, num_steps, train):
+    """Runs the training or inference steps, and returns the steps/sec"""
+    current_state = np.zeros([BATCH_SIZE, CELL_SIZE])
+    fetches = [model.optimizer, model.states] if train else [model.predicted_class, model.states]
+
+    start_time = time.time()
+
+    for step in range(num_steps):
+        offset = (step * BATCH_SIZE) % features.shape[0]
+        feed_dict = {model.x_input: features[offset:(offset + BATCH_SIZE)],
+                     model.y_input: labels[offset:(offset + BATCH_SIZE)], model.state: current_state,
+                     model.learning_rate: LEARNING_RATE, model.p_keep: DROPOUT_P_KEEP if train else 1.0}
+        _, current_state = sess.run(fetches, feed_dict=feed_dict)
+
+    return num_steps / (time.time() - start_time)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark for the input modes of GRU+SVM')
+    group = parser.add_argument_group('Arguments')
+    group.add_argument('-s', '--num_steps', required=False, type=int, default=500,
+                       help='number of steps to time for each mode')
+    arguments = parser.parse_args()
+    return arguments
+
+
+def main(arguments):
+    random = np.random.RandomState(0)
+    features = random.randint(0, 10, [BATCH_SIZE * 100, SEQUENCE_LENGTH]).astype(np.uint8)
+    labels = random.randint(0, N_CLASSES, [BATCH_SIZE * 100]).astype(np.uint8)
+
+    onehot_graph, onehot_sess, onehot_model = build(input_mode='onehot')
+    projected_graph, projected_sess, projected_model = build(input_mode='projected')
+
+    # copy the variables of the one-hot model to the projected model, by name
+    with onehot_graph.as_default():
+        values = {variable.op.name: onehot_sess.run(variable) for variable in tf.global_variables()}
+    with projected_graph.as_default():
+        for variable in tf.trainable_variables():
+            variable.load(values[variable.op.name], projected_sess)
+
+    # both modes compute the same loss and predictions without dropout
+    results = []
+    for sess, model in [(onehot_sess, onehot_model), (projected_sess, projected_model)]:
+        feed_dict = {model.x_input: features[:BATCH_SIZE], model.y_input: labels[:BATCH_SIZE],
+                     model.state: np.zeros([BATCH_SIZE, CELL_SIZE]), model.p_keep: 1.0}
+        results.append(sess.run([model.loss, model.predicted_class], feed_dict=feed_dict))
+    print('loss -- onehot : {}, projected : {}'.format(results[0][0], results[1][0]))
+    assert np.allclose(results[0][0], results[1][0], rtol=1e-4), 'The losses of the input modes differ'
+    assert np.array_equal(results[0][1], results[1][1]), 'The predictions of the input modes differ'
+
+    for train in [True, False]:
+        speeds = []
+        for sess, model in [(onehot_sess, onehot_model), (projected_sess, projected_model)]:
+            # warm up
+            run_steps(sess, model, features, labels, num_steps=10, train=train)
+            speeds.append(run_steps(sess, model, features, labels, num_steps=arguments.num_steps, train=train))
+        print('{} -- onehot : {:.2f} steps/sec, projected : {:.2f} steps/sec ({:.2f}x)'.format(
+            'training' if train else 'inference', speeds[0], speeds[1], speeds[1] / speeds[0]))
+
+    onehot_sess.close()
+    projected_sess.close()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    main(args)
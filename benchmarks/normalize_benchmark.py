@@ -0,0 +1,102 @@
+# Benchmark for the vectorized preprocessing in normalize_data
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Compares the vectorized preprocessing with the per-row lambdas on a synthetic dataset"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import argparse
+from dataset import normalize_data as nd
+import numpy as np
+import pandas as pd
+import time
+
+
+def synthetic_data(num_rows, seed):
+    """Returns a dataframe with the detection, label, and start time columns of the Kyoto dataset"""
+    random = np.random.RandomState(seed)
+
+    # detection columns are '0' for most of the connections
+    detections = np.array(['0', 'Trojan.Generic(3)', '1003', '0', '0'], dtype=object)
+
+    # [N, 8] bytes of HH:MM:SS
+    codes = np.full([num_rows, 8], ord(':'), dtype=np.uint8)
+    for index, high in zip([0, 3, 6], [24, 60, 60]):
+        values = random.randint(0, high, num_rows)
+        codes[:, index] = ord('0') + values // 10
+        codes[:, index + 1] = ord('0') + values % 10
+    start_time = codes.view('S8').ravel().astype(str).astype(object)
+
+    return pd.DataFrame({'ids_detection': detections[random.randint(0, 5, num_rows)],
+                         'malware_detection': detections[random.randint(0, 5, num_rows)],
+                         'ashula_detection': detections[random.randint(0, 5, num_rows)],
+                         'label': random.choice([1, -1, -2], num_rows),
+                         'start_time': start_time})
+
+
+def legacy_preprocess(df):
+    """The per-row lambdas of normalize_data 0.2.1"""
+    df['malware_detection'] = df['malware_detection'].apply(
+        lambda malware_detection: 1 if malware_detection != '0' else 0)
+    df['ashula_detection'] = df['ashula_detection'].apply(lambda ashula_detection: 1 if ashula_detection != '0' else 0)
+    df['ids_detection'] = df['ids_detection'].apply(lambda ids_detection: 1 if ids_detection != '0' else 0)
+    df['label'] = df['label'].apply(lambda label: 1 if label == -1 or label == -2 else 0)
+    df['start_time'] = df['start_time'].apply(
+        lambda time: (int(time.split(':')[0]) + (int(time.split(':')[1]) * (1 / 60)) +
+                      (int(time.split(':')[2]) * (1 / 3600))))
+    return df
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark for the preprocessing in normalize_data')
+    group = parser.add_argument_group('Arguments')
+    group.add_argument('-n', '--num_rows', required=False, type=int, default=10000000,
+                       help='number of rows of the synthetic dataset')
+    group.add_argument('-s', '--seed', required=False, type=int, default=0,
+                       help='seed for the synthetic dataset')
+    arguments = parser.parse_args()
+    return arguments
+
+
+def main(arguments):
+    df = synthetic_data(num_rows=arguments.num_rows, seed=arguments.seed)
+    print('Synthetic DataFrame shape: {}'.format(df.shape))
+
+    start = time.time()
+    expected = legacy_preprocess(df.copy())
+    legacy_time = time.time() - start
+    print('lambdas : {:.3f}s'.format(legacy_time))
+
+    start = time.time()
+    actual = nd.preprocess(df.copy())
+    vectorized_time = time.time() - start
+    print('vectorized : {:.3f}s ({:.1f}x)'.format(vectorized_time, legacy_time / vectorized_time))
+
+    for column in expected.columns:
+        assert np.array_equal(expected[column].values, actual[column].values), \
+            'Mismatch in column {}'.format(column)
+    print('Outputs match exactly.')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    main(args)
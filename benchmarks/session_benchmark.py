@@ -0,0 +1,131 @@
+# Benchmark for the session configurations of the GRU+SVM model
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Sweeps the thread and optimizer settings of the sessions, and reports the speed of GruSvm.train and .predict"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import argparse
+import itertools
+from models.gru_svm.gru_svm import GruSvm
+import numpy as np
+import os
+import shutil
+import tempfile
+import tensorflow as tf
+import time
+from utils.session import session_config
+
+# hyper-parameters of gru_svm_main.py
+BATCH_SIZE = 256
+CELL_SIZE = 256
+DROPOUT_P_KEEP = 0.85
+LEARNING_RATE = 1e-5
+N_CLASSES = 2
+SEQUENCE_LENGTH = 21
+SVM_C = 0.5
+
+
+def time_train(config, features, labels, path):
+    """Trains a GruSvm for one epoch over the features, and returns the steps/sec"""
+    num_steps = features.shape[0] // BATCH_SIZE
+
+    with tf.Graph().as_default():
+        model = GruSvm(alpha=LEARNING_RATE, batch_size=BATCH_SIZE, cell_size=CELL_SIZE, dropout_rate=DROPOUT_P_KEEP,
+                       num_classes=N_CLASSES, sequence_length=SEQUENCE_LENGTH, svm_c=SVM_C, session_config=config)
+
+        start_time = time.time()
+        model.train(checkpoint_path=os.path.join(path, 'checkpoint'), log_path=os.path.join(path, 'logs'),
+                    model_name='gru_svm', epochs=1, train_data=[features, labels], train_size=features.shape[0],
+                    validation_data=[features[:BATCH_SIZE], labels[:BATCH_SIZE]], validation_size=BATCH_SIZE,
+                    result_path=os.path.join(path, 'results'), log_interval=num_steps)
+
+    return num_steps / (time.time() - start_time)
+
+
+def time_predict(config, features, labels, path, batch_size):
+    """Classifies the features with the GruSvm trained by `time_train()`, and returns the rows/sec"""
+    with tf.Graph().as_default():
+        start_time = time.time()
+        GruSvm.predict(batch_size=batch_size, cell_size=CELL_SIZE, dropout_rate=1.0, num_classes=N_CLASSES,
+                       test_data=[features, labels], test_size=features.shape[0],
+                       checkpoint_path=os.path.join(path, 'checkpoint'), result_path=os.path.join(path, 'results'),
+                       session_config=config)
+
+    return features.shape[0] / (time.time() - start_time)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark for the session configurations of GRU+SVM')
+    group = parser.add_argument_group('Arguments')
+    group.add_argument('-s', '--num_steps', required=False, type=int, default=200,
+                       help='number of training steps to time for each configuration')
+    group.add_argument('-n', '--num_rows', required=False, type=int, default=100000,
+                       help='number of rows to classify for each configuration')
+    group.add_argument('--inference_batch_size', required=False, type=int, default=4096,
+                       help='number of rows per batch when classifying')
+    group.add_argument('--intra_op_threads', required=False, type=int, nargs='+', default=[0, 1, 4, 16],
+                       help='numbers of threads per op to sweep')
+    group.add_argument('--inter_op_threads', required=False, type=int, nargs='+', default=[0, 1, 2],
+                       help='numbers of concurrent op threads to sweep')
+    group.add_argument('--opt_levels', required=False, type=str, nargs='+', default=['L1'], choices=['L0', 'L1'],
+                       help='graph optimizer levels to sweep')
+    group.add_argument('--xla', action='store_true',
+                       help='also sweep the configurations with the XLA JIT')
+    arguments = parser.parse_args()
+    return arguments
+
+
+def main(arguments):
+    random = np.random.RandomState(0)
+    num_rows = max(arguments.num_steps * BATCH_SIZE, arguments.num_rows)
+    features = random.randint(0, 10, [num_rows, SEQUENCE_LENGTH]).astype(np.uint8)
+    labels = random.randint(0, N_CLASSES, [num_rows]).astype(np.uint8)
+
+    sweep = itertools.product(arguments.intra_op_threads, arguments.inter_op_threads, arguments.opt_levels,
+                              [False, True] if arguments.xla else [False])
+    results = []
+
+    for intra_op_threads, inter_op_threads, opt_level, xla in sweep:
+        config = session_config(intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads,
+                                opt_level=opt_level, xla=xla)
+        path = tempfile.mkdtemp()
+
+        try:
+            steps_per_sec = time_train(config, features[:arguments.num_steps * BATCH_SIZE],
+                                       labels[:arguments.num_steps * BATCH_SIZE], path)
+            rows_per_sec = time_predict(config, features[:arguments.num_rows], labels[:arguments.num_rows], path,
+                                        arguments.inference_batch_size)
+        finally:
+            shutil.rmtree(path)
+
+        results.append((intra_op_threads, inter_op_threads, opt_level, xla, steps_per_sec, rows_per_sec))
+
+    print('intra_op  inter_op  opt_level  xla    train steps/sec  predict rows/sec')
+    for intra_op_threads, inter_op_threads, opt_level, xla, steps_per_sec, rows_per_sec in results:
+        print('{:<9} {:<9} {:<10} {:<6} {:<16.2f} {:.0f}'.format(
+            intra_op_threads, inter_op_threads, opt_level, str(xla), steps_per_sec, rows_per_sec))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    main(args)
@@ -0,0 +1,135 @@
+# Benchmark for the training steps of the GRU+SVM model
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Compares the steps/sec of fetching the summaries on every training step, and only every log interval"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import argparse
+from models.gru_svm.gru_svm import GruSvm
+import numpy as np
+import tensorflow as tf
+import time
+from utils.data import one_hot
+
+# hyper-parameters of gru_svm_main.py
+BATCH_SIZE = 256
+CELL_SIZE = 256
+DROPOUT_P_KEEP = 0.85
+LEARNING_RATE = 1e-5
+N_CLASSES = 2
+SEQUENCE_LENGTH = 21
+SVM_C = 0.5
+
+
+def run_steps(sess, model, features, labels, num_steps, log_interval, lean):
+    """Runs the training steps, and returns the steps/sec
+
+    Parameter
+    ---------
+    sess : tf.Session
+      The session of the model.
+    model : GruSvm
+      The GRU+SVM model.
+    features : numpy.ndarray
+      The synthetic features.
+    labels : numpy.ndarray
+      The synthetic labels.
+    num_steps : int
+      The number of training steps to run.
+    log_interval : int
+      The number of steps between the computations of the loss and accuracy.
+    lean : bool
+      If True, the summaries, loss and accuracy are fetched with the training op every log_interval steps only,
+      and the other steps fetch the predictions for the results file and the states, with the one-hot labels
+      computed in NumPy. Otherwise, the summaries are fetched on every step, and the loss and accuracy in a
+      second run, as before.
+    """
+    current_state = np.zeros([BATCH_SIZE, CELL_SIZE])
+
+    start_time = time.time()
+
+    for step in range(num_steps):
+        offset = (step * BATCH_SIZE) % features.shape[0]
+        feed_dict = {model.x_input: features[offset:(offset + BATCH_SIZE)],
+                     model.y_input: labels[offset:(offset + BATCH_SIZE)], model.state: current_state,
+                     model.learning_rate: LEARNING_RATE, model.p_keep: DROPOUT_P_KEEP}
+
+        if lean:
+            if step % log_interval == 0:
+                results = sess.run([model.merged, model.optimizer, model.predicted_class, model.y_onehot,
+                                    model.states, model.loss, model.accuracy], feed_dict=feed_dict)
+            else:
+                _, predictions, next_state = sess.run([model.optimizer, model.predicted_class, model.states],
+                                                      feed_dict=feed_dict)
+                actual = one_hot(labels=feed_dict[model.y_input], num_classes=N_CLASSES, on_value=1.0,
+                                 off_value=-1.0)
+                results = [None, None, predictions, actual, next_state]
+        else:
+            results = sess.run([model.merged, model.optimizer, model.predicted_class, model.y_onehot, model.states],
+                               feed_dict=feed_dict)
+            if step % log_interval == 0:
+                sess.run([model.loss, model.accuracy], feed_dict=feed_dict)
+
+        current_state = results[4]
+
+    return num_steps / (time.time() - start_time)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark for the training steps of GRU+SVM')
+    group = parser.add_argument_group('Arguments')
+    group.add_argument('-s', '--num_steps', required=False, type=int, default=1000,
+                       help='number of training steps to time for each mode')
+    group.add_argument('-l', '--log_interval', required=False, type=int, default=100,
+                       help='number of steps between the computations of the loss and accuracy')
+    arguments = parser.parse_args()
+    return arguments
+
+
+def main(arguments):
+    random = np.random.RandomState(0)
+    features = random.randint(0, 10, [BATCH_SIZE * 100, SEQUENCE_LENGTH]).astype(np.uint8)
+    labels = random.randint(0, N_CLASSES, [BATCH_SIZE * 100]).astype(np.uint8)
+
+    model = GruSvm(alpha=LEARNING_RATE, batch_size=BATCH_SIZE, cell_size=CELL_SIZE, dropout_rate=DROPOUT_P_KEEP,
+                   num_classes=N_CLASSES, sequence_length=SEQUENCE_LENGTH, svm_c=SVM_C)
+
+    with tf.Session() as sess:
+        sess.run(tf.global_variables_initializer())
+
+        # warm up
+        run_steps(sess, model, features, labels, num_steps=10, log_interval=arguments.log_interval, lean=True)
+
+        before = run_steps(sess, model, features, labels, num_steps=arguments.num_steps,
+                           log_interval=arguments.log_interval, lean=False)
+        print('summaries on every step : {:.2f} steps/sec'.format(before))
+
+        after = run_steps(sess, model, features, labels, num_steps=arguments.num_steps,
+                          log_interval=arguments.log_interval, lean=True)
+        print('summaries every {} steps : {:.2f} steps/sec ({:.2f}x)'.format(
+            arguments.log_interval, after, after / before))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    main(args)
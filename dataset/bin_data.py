@@ -17,22 +17,35 @@
 
 """Bins continuous data into 10 evenly-spaced intervals"""
 import argparse
+import json
+from multiprocessing import Pool
 import numpy as np
 import os
 import pandas as pd
-import normalize_data as nd
 
-__version__ = '0.1'
+try:
+    import normalize_data as nd
+    from sketch import QuantileSketch
+except ImportError:
+    # imported as the dataset package, e.g. by the scoring server
+    from dataset import normalize_data as nd
+    from dataset.sketch import QuantileSketch
+
+__version__ = '0.3'
 __author__ = 'Abien Fred Agarap'
 
 column_names = nd.COLUMN_NAMES
 columns_to_save = list(column_names)
 columns_to_save.remove('dst_ip_add')
 columns_to_save.remove('src_ip_add')
-cols_to_std = nd.COLUMN_TO_STANDARDIZE
+# copy the list, so that nd.COLUMN_TO_STANDARDIZE is left as is
+cols_to_std = list(nd.COLUMN_TO_STANDARDIZE)
 cols_to_std.append('service')
 cols_to_std.append('flag')
 
+# number of bins per binned feature
+NUM_BINS = 10
+
 
 def bin_data(path, write_path, num_chunks, binning):
     """Bins the continuous features through bucket or quantile binning
@@ -81,6 +94,206 @@ def bin_data(path, write_path, num_chunks, binning):
         print('Saving CSV file : {path}'.format(path=os.path.join(write_path, '{id}'.format(id=id))))
 
 
+def bin_files(path, write_path, num_chunks, binning, chunk_size, edges_path=None, workers=1):
+    """Bins the continuous features chunk by chunk, in constant memory
+
+    The first pass fits the bin edges from a quantile sketch of each binned feature, unless
+    `edges_path` already exists, in which case the saved edges are reused. The files are
+    sketched independently, in a pool of `workers` processes, and their sketches are merged.
+    The second pass bins the files chunk by chunk, and appends the chunks to `num_chunks` CSV files.
+
+    Parameter
+    ---------
+    path : str
+      The path where the dataset to be binned is located.
+    write_path : str
+      The path where to save the binned dataset.
+    num_chunks : int
+      The number of file splits to perform on the binned dataset.
+    binning : int
+      The type of binning to perform on the dataset: 0 if bucket binning, 1 if quantile binning.
+    chunk_size : int
+      The number of rows to read at a time.
+    edges_path : str
+      The path of the bin edges to reuse, or where to save them.
+    workers : int
+      The number of processes to use for sketching the files.
+    """
+
+    files = nd.list_files(path=path)
+
+    if edges_path and os.path.exists(edges_path):
+        edges, binning = load_edges(edges_path)
+        print('Loaded bin edges from {}'.format(edges_path))
+    else:
+        edges = fit_edges(files=files, binning=binning, chunk_size=chunk_size, workers=workers)
+        if edges_path:
+            save_edges(edges=edges, binning=binning, path=edges_path)
+            print('Saved bin edges to {}'.format(edges_path))
+
+    write_files = [open(os.path.join(write_path, '{id}.csv'.format(id=id)), 'w') for id in range(num_chunks)]
+
+    try:
+        index = 0
+        for file in files:
+            print('binning : {}'.format(file))
+            for chunk in pd.read_csv(filepath_or_buffer=file, names=column_names, chunksize=chunk_size):
+                for column in cols_to_std:
+                    chunk[column] = bin_values(values=chunk[column].values, edges=edges[column], binning=binning)
+                chunk.to_csv(path_or_buf=write_files[index % num_chunks], columns=columns_to_save, header=None,
+                             index=False)
+                index += 1
+    finally:
+        for write_file in write_files:
+            write_file.close()
+            print('Saving CSV file : {path}'.format(path=write_file.name))
+
+
+def fit_edges(files, binning, chunk_size, workers=1):
+    """Fits the bin edges of the binned features, from their merged quantile sketches
+
+    Parameter
+    ---------
+    files : list
+      The list of normalized CSV files.
+    binning : int
+      The type of binning: 0 if bucket binning, 1 if quantile binning.
+    chunk_size : int
+      The number of rows to read at a time.
+    workers : int
+      The number of processes to use for sketching the files.
+
+    Returns
+    -------
+    edges : dict
+      The bin edges of each binned feature.
+    """
+    tasks = [(file, chunk_size) for file in files]
+
+    if workers > 1:
+        pool = Pool(processes=workers)
+        try:
+            file_sketches = pool.map(sketch_file, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        file_sketches = [sketch_file(task) for task in tasks]
+
+    sketches = {column: QuantileSketch() for column in cols_to_std}
+    for file_sketch in file_sketches:
+        for column in cols_to_std:
+            sketches[column].merge(file_sketch[column])
+
+    edges = {column: sketch_edges(sketch=sketches[column], binning=binning) for column in cols_to_std}
+    for column in cols_to_std:
+        print('{} edges : {}'.format(column, edges[column]))
+
+    return edges
+
+
+def sketch_file(task):
+    """Returns the quantile sketches of the binned features of a normalized CSV file
+
+    Parameter
+    ---------
+    task : tuple
+      The (file, chunk size) pair.
+
+    Returns
+    -------
+    sketches : dict
+      The quantile sketch of each binned feature.
+    """
+    file, chunk_size = task
+    sketches = {column: QuantileSketch() for column in cols_to_std}
+
+    print('sketching : {}'.format(file))
+    for chunk in pd.read_csv(filepath_or_buffer=file, names=column_names, usecols=cols_to_std, chunksize=chunk_size):
+        for column in cols_to_std:
+            sketches[column].update(chunk[column].values)
+
+    return sketches
+
+
+def sketch_edges(sketch, binning):
+    """Returns the bin edges from the quantile sketch of a feature
+
+    Parameter
+    ---------
+    sketch : QuantileSketch
+      The quantile sketch of the feature.
+    binning : int
+      The type of binning: 0 if bucket binning, 1 if quantile binning.
+
+    Returns
+    -------
+    edges : numpy.ndarray
+      The bucket edges from the exact minimum and maximum, or the unique estimated deciles.
+    """
+    if int(binning) == 0:
+        return bucket_edges(sketch.minimum, sketch.maximum)
+    else:
+        # as in pd.qcut(..., duplicates='drop')
+        return np.unique(sketch.quantiles(np.linspace(0, 1, NUM_BINS + 1)))
+
+
+def bucket_edges(minimum, maximum):
+    """Returns the edges for bucket binning, i.e. NUM_BINS evenly-spaced values from `minimum` to `maximum`"""
+    return np.linspace(minimum, maximum, NUM_BINS)
+
+
+def bin_values(values, edges, binning):
+    """Bins the given values using fitted bin edges
+
+    Parameter
+    ---------
+    values : numpy.ndarray
+      The values to be binned.
+    edges : numpy.ndarray
+      The bin edges, i.e. from `bucket_edges()` if bucket binning, or the quantiles if quantile binning.
+    binning : int
+      The type of binning: 0 if bucket binning, 1 if quantile binning.
+
+    Returns
+    -------
+    indices : numpy.ndarray
+      The bin indices of the values. Values outside of the fitted range are put in the first or last bin.
+    """
+    edges = np.asarray(edges)
+
+    if int(binning) == 0:
+        # same as np.digitize(values, edges, right=True)
+        indices = np.searchsorted(edges, values, side='left')
+        return np.clip(indices, 0, len(edges) - 1)
+    else:
+        # same as pd.qcut(values, edges, labels=False), where the bins are right-closed
+        indices = np.searchsorted(edges[1:-1], values, side='left')
+        return np.clip(indices, 0, max(len(edges) - 2, 0))
+
+
+def save_edges(edges, binning, path):
+    """Saves the fitted bin edges of each binned feature to a JSON file"""
+    with open(path, 'w') as file:
+        json.dump({'binning': int(binning),
+                   'edges': {column: np.asarray(edges[column]).tolist() for column in edges}}, file)
+
+
+def load_edges(path):
+    """Loads the fitted bin edges from a JSON file
+
+    Returns
+    -------
+    edges : dict
+      The bin edges of each binned feature.
+    binning : int
+      The type of binning the edges were fitted for.
+    """
+    with open(path, 'r') as file:
+        saved = json.load(file)
+    return {column: np.array(saved['edges'][column]) for column in saved['edges']}, saved['binning']
+
+
 def parse_args():
     parser = argparse.ArgumentParser(
         description='Module for binning the Kyoto University 2013 dataset')
@@ -93,12 +306,22 @@ def parse_args():
                        help='number of chunks of CSV files to save')
     group.add_argument('-b', '--binning', action='store',
                        help='set to 0 for bucket binning; set 1 for decile binning')
+    group.add_argument('-c', '--chunk_size', required=False, type=int,
+                       help='number of rows to read at a time; bins in constant memory using quantile sketches if set')
+    group.add_argument('-e', '--edges', required=False, type=str,
+                       help='path of the bin edges (*.json) to reuse if it exists, otherwise to save')
+    group.add_argument('--workers', required=False, type=int, default=1,
+                       help='number of processes to use for sketching the files')
     arguments = parser.parse_args()
     return arguments
 
 
 def main(arguments):
-    bin_data(arguments.dataset, arguments.write_path, arguments.num_chunks, arguments.binning)
+    if arguments.chunk_size:
+        bin_files(arguments.dataset, arguments.write_path, arguments.num_chunks, int(arguments.binning or 1),
+                  arguments.chunk_size, arguments.edges, arguments.workers)
+    else:
+        bin_data(arguments.dataset, arguments.write_path, arguments.num_chunks, arguments.binning)
 
 
 if __name__ == '__main__':
@@ -20,17 +20,40 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-__version__ = '0.1.0'
+__version__ = '0.3.0'
 __author__ = 'Abien Fred Agarap'
 
 import argparse
+from bin_data import columns_to_save
 from normalize_data import list_files
 import numpy as np
 import os
 import pandas as pd
+from store import StoreWriter
 
+# index of the label in the binned CSV files
+LABEL_INDEX = columns_to_save.index('label')
 
-def csv_to_npy(csv_path, npy_path, npy_filename):
+# 64-bit FNV-1a hash parameters
+FNV_OFFSET_BASIS = np.uint64(14695981039346656037)
+FNV_PRIME = np.uint64(1099511628211)
+
+
+def csv_to_npy(csv_path, npy_path, npy_filename, file_format='npy'):
+    """Converts the binned CSV files to a NPY file, or to a binary store
+
+    Parameter
+    ---------
+    csv_path : str
+      The path of the CSV files to be converted.
+    npy_path : str
+      The path where to save the converted dataset.
+    npy_filename : str
+      The filename of the NPY file, or the directory name of the binary store.
+    file_format : str
+      The format to save: 'npy' for a NPY file of the binned columns,
+      'store' for a binary store of the uint8 features and labels.
+    """
     files = list_files(path=csv_path)
 
     df = pd.DataFrame()
@@ -43,7 +66,240 @@ def csv_to_npy(csv_path, npy_path, npy_filename):
 
     data = np.array(df)
 
-    np.save(file=os.path.join(npy_path, npy_filename), arr=data)
+    if file_format == 'store':
+        save_store(data=data, path=os.path.join(npy_path, npy_filename))
+    else:
+        np.save(file=os.path.join(npy_path, npy_filename), arr=data)
+
+
+def save_store(data, path):
+    """Saves the binned dataset to a binary store of uint8 features and uint8 labels
+
+    Parameter
+    ---------
+    data : numpy.ndarray
+      The binned dataset, with the label at `LABEL_INDEX`.
+    path : str
+      The directory of the binary store.
+    """
+    assert data.size == 0 or (data.min() >= 0 and data.max() <= 255), 'Binned values must be in [0, 255]'
+
+    with StoreWriter(path=path, columns=[column for column in columns_to_save if column != 'label']) as writer:
+        writer.write(*split_label(data))
+
+    print('Saved {} rows to {}'.format(writer.num_rows, path))
+
+
+def split_label(data):
+    """Returns the features and the labels of the binned dataset"""
+    return np.delete(arr=data, obj=[LABEL_INDEX], axis=1), data[:, LABEL_INDEX]
+
+
+def csv_to_npy_streaming(csv_path, npy_path, npy_filename, file_format='npy', chunk_size=100000, dedup='hash',
+                         expected_rows=100000000, false_positive_rate=1e-6):
+    """Converts the binned CSV files chunk by chunk, dropping the duplicate rows as they are read
+
+    Each row is hashed from its binned bytes. The first row of each hash is kept, and the
+    other rows are dropped. In 'hash' mode, the hashes seen so far are kept in a `HashSet`,
+    so rows are only dropped on a 64-bit hash collision besides actual duplicates. In 'bloom'
+    mode, they are kept in a `BloomFilter` of fixed size, which drops about `false_positive_rate`
+    of the unique rows as well.
+
+    Parameter
+    ---------
+    csv_path : str
+      The path of the CSV files to be converted.
+    npy_path : str
+      The path where to save the converted dataset.
+    npy_filename : str
+      The filename of the NPY file, or the directory name of the binary store.
+    file_format : str
+      The format to save: 'npy' for a NPY file of the unique rows, of the same dtype as `csv_to_npy()`,
+      which are kept in memory until saved, 'store' for a binary store to which the uint8 unique rows
+      are written directly.
+    chunk_size : int
+      The number of rows to read at a time.
+    dedup : str
+      The set of seen rows: 'hash' for an exact hash set, 'bloom' for a Bloom filter.
+    expected_rows : int
+      The expected number of unique rows, to size the Bloom filter.
+    false_positive_rate : float
+      The false positive rate of the Bloom filter at `expected_rows`.
+    """
+    files = list_files(path=csv_path)
+
+    if dedup == 'bloom':
+        seen = BloomFilter.for_capacity(capacity=expected_rows, false_positive_rate=false_positive_rate)
+    else:
+        seen = HashSet()
+
+    if file_format == 'store':
+        writer = StoreWriter(path=os.path.join(npy_path, npy_filename),
+                             columns=[column for column in columns_to_save if column != 'label'])
+    else:
+        unique_chunks = []
+
+    num_rows = 0
+    num_unique = 0
+
+    for file in files:
+        print('Reading file : {}'.format(file))
+        for chunk in pd.read_csv(filepath_or_buffer=file, header=None, chunksize=chunk_size):
+            values = chunk.values
+            assert values.size == 0 or (values.min() >= 0 and values.max() <= 255), \
+                'Binned values must be in [0, 255]'
+            data = values.astype(np.uint8)
+
+            # keep the first row of each hash in the chunk, in order
+            hashes = row_hashes(data)
+            _, first_indices = np.unique(hashes, return_index=True)
+            first_indices = np.sort(first_indices)
+
+            # then keep the rows that were not seen in the previous chunks
+            is_new = seen.add(hashes[first_indices])
+            data = data[first_indices[is_new]]
+
+            if file_format == 'store':
+                writer.write(*split_label(data))
+            else:
+                # keep the values as read, as the NPY file of `csv_to_npy()`
+                unique_chunks.append(values[first_indices[is_new]])
+
+            num_rows += chunk.shape[0]
+            num_unique += data.shape[0]
+
+    if file_format == 'store':
+        writer.close()
+    else:
+        data = np.concatenate(unique_chunks) if unique_chunks else np.zeros([0, len(columns_to_save)])
+        np.save(file=os.path.join(npy_path, npy_filename), arr=data)
+
+    print('Rows : {}, unique rows : {}, duplicate ratio : {:.4f}'.format(
+        num_rows, num_unique, (num_rows - num_unique) / max(num_rows, 1)))
+    print('Memory used by the {} of seen rows : {:.2f} MB'.format(type(seen).__name__, seen.nbytes / 2 ** 20))
+
+
+def row_hashes(data):
+    """Returns the 64-bit FNV-1a hashes of the rows of a uint8 matrix"""
+    hashes = np.full(data.shape[0], FNV_OFFSET_BASIS, dtype=np.uint64)
+    for column in range(data.shape[1]):
+        hashes ^= data[:, column].astype(np.uint64)
+        hashes *= FNV_PRIME
+    return hashes
+
+
+class HashSet:
+    """Compact set of 64-bit hashes
+
+    The hashes are kept in sorted uint64 runs of geometrically decreasing sizes,
+    i.e. 8 bytes per hash. Adding a batch of hashes appends a run, and merges
+    the last runs while they are of similar sizes.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def add(self, hashes):
+        """Adds distinct hashes to the set
+
+        Parameter
+        ---------
+        hashes : numpy.ndarray
+          The uint64 hashes to add, without duplicates among them.
+
+        Returns
+        -------
+        is_new : numpy.ndarray
+          The boolean mask of the hashes that were not in the set.
+        """
+        is_new = np.ones(hashes.shape[0], dtype=np.bool_)
+
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, hashes), run.shape[0] - 1)
+            is_new &= run[positions] != hashes
+
+        run = np.sort(hashes[is_new])
+        if run.shape[0] > 0:
+            self.runs.append(run)
+
+        while len(self.runs) > 1 and self.runs[-2].shape[0] <= 2 * self.runs[-1].shape[0]:
+            last_run = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last_run]), kind='mergesort')
+
+        return is_new
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self.runs)
+
+    def __len__(self):
+        return sum(run.shape[0] for run in self.runs)
+
+
+class BloomFilter:
+    """Bloom filter of 64-bit hashes, using double hashing for its `num_hashes` bit positions"""
+
+    def __init__(self, num_bits, num_hashes):
+        """Initialize the BloomFilter class
+
+        Parameter
+        ---------
+        num_bits : int
+          The number of bits of the filter.
+        num_hashes : int
+          The number of bit positions per hash.
+        """
+        self.num_bits = int(num_bits)
+        self.num_hashes = int(num_hashes)
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate):
+        """Returns a Bloom filter sized for `capacity` hashes at the given false positive rate"""
+        num_bits = int(np.ceil(-capacity * np.log(false_positive_rate) / np.log(2) ** 2))
+        num_hashes = max(int(round(num_bits / capacity * np.log(2))), 1)
+        return cls(num_bits=num_bits, num_hashes=num_hashes)
+
+    def positions(self, hashes):
+        """Returns the [N, NUM_HASHES] bit positions of the hashes"""
+        # derive a second hash with the splitmix64 finalizer, made odd
+        second = hashes ^ (hashes >> np.uint64(30))
+        second *= np.uint64(0xbf58476d1ce4e5b9)
+        second ^= second >> np.uint64(27)
+        second *= np.uint64(0x94d049bb133111eb)
+        second ^= second >> np.uint64(31)
+        second |= np.uint64(1)
+
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (hashes[:, None] + steps[None, :] * second[:, None]) % np.uint64(self.num_bits)
+
+    def add(self, hashes):
+        """Adds distinct hashes to the filter
+
+        Parameter
+        ---------
+        hashes : numpy.ndarray
+          The uint64 hashes to add, without duplicates among them.
+
+        Returns
+        -------
+        is_new : numpy.ndarray
+          The boolean mask of the hashes that were not in the filter, up to false positives.
+        """
+        positions = self.positions(hashes)
+        bytes_indices = (positions >> np.uint64(3)).astype(np.int64)
+        masks = (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+
+        is_new = ~np.all(self.bits[bytes_indices] & masks, axis=1)
+
+        new_bytes, new_masks = bytes_indices[is_new].ravel(), masks[is_new].ravel()
+        np.bitwise_or.at(self.bits, new_bytes, new_masks)
+
+        return is_new
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
 
 
 def parse_args():
@@ -55,12 +311,27 @@ def parse_args():
                        help='path where converted NPY files will be stored')
     group.add_argument('-f', '--npy_filename', required=True, type=str,
                        help='filename of the NPY file to save')
+    group.add_argument('--format', required=False, type=str, default='npy', choices=['npy', 'store'],
+                       help='"npy" to save a NPY file, "store" to save a binary store of uint8 features and labels')
+    group.add_argument('--chunk_size', required=False, type=int,
+                       help='number of rows to read at a time; drops the duplicates while streaming if set')
+    group.add_argument('--dedup', required=False, type=str, default='hash', choices=['hash', 'bloom'],
+                       help='set of seen rows when streaming: "hash" for a hash set, "bloom" for a Bloom filter')
+    group.add_argument('--expected_rows', required=False, type=int, default=100000000,
+                       help='expected number of unique rows, to size the Bloom filter')
+    group.add_argument('--false_positive_rate', required=False, type=float, default=1e-6,
+                       help='false positive rate of the Bloom filter')
     arguments = parser.parse_args()
     return arguments
 
 
 def main(arguments):
-    csv_to_npy(arguments.csv_path, arguments.npy_path, arguments.npy_filename)
+    if arguments.chunk_size:
+        csv_to_npy_streaming(arguments.csv_path, arguments.npy_path, arguments.npy_filename, arguments.format,
+                             arguments.chunk_size, arguments.dedup, arguments.expected_rows,
+                             arguments.false_positive_rate)
+    else:
+        csv_to_npy(arguments.csv_path, arguments.npy_path, arguments.npy_filename, arguments.format)
 
 
 if __name__ == '__main__':
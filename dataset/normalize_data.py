@@ -20,10 +20,11 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-__version__ = '0.2.1'
+__version__ = '0.3.0'
 __author__ = 'Abien Fred Agarap'
 
 import argparse
+import json
 import numpy as np
 import pandas as pd
 import os
@@ -49,18 +50,24 @@ COLUMN_TO_STANDARDIZE = ['duration', 'src_bytes', 'dest_bytes', 'count',
 COLUMN_TO_INDEX = ['ashula_detection', 'dst_ip_add', 'flag', 'ids_detection', 'label',
                    'malware_detection', 'protocol', 'service', 'src_ip_add']
 
+# column types for the C parser, so that mixed-type columns are read as strings
+COLUMN_DTYPES = {'ashula_detection': str, 'dst_ip_add': str, 'flag': str, 'ids_detection': str,
+                 'malware_detection': str, 'protocol': str, 'service': str, 'src_ip_add': str, 'start_time': str}
 
-def normalize_data(path):
+# number of rows to read at a time in streaming mode
+CHUNK_SIZE = 100000
+
+
+def normalize_data(path, chunk_size=None):
     """Normalizes a given dataset.
 
     Parameter
     ---------
     path : str
       The path of the dataset to be normalized.
-    write_path : str
-      The path where to save the normalized dataset.
-    num_chunks : int
-      The number of file splits for the normalized dataset.
+    chunk_size : int
+      The number of rows to read at a time. If None, each file is read whole
+      using the python engine.
 
     Returns
     -------
@@ -100,47 +107,294 @@ def normalize_data(path):
     # get all the CSV files in the PATH dir
     files = list_files(path=path)
 
-    # create empty df, where dfs shall be appended
-    df = pd.DataFrame()
+    if chunk_size:
+        # preprocess the files chunk by chunk, and concatenate the chunks only once
+        df = pd.concat(iter_chunks(files=files, chunk_size=chunk_size), ignore_index=True)
+        print('DataFrame shape after preprocessing: {}'.format(df.shape))
+    else:
+        # create empty df, where dfs shall be appended
+        df = pd.DataFrame()
+
+        # append the dfs from each file to the data df
+        for file in files:
+            # the python engine was used to support mixed data types
+            df = df.append(pd.read_csv(filepath_or_buffer=file, names=COLUMN_NAMES, engine='python'))
+            print('Appending {}'.format(file))
+
+        print('Current DataFrame shape: {}'.format(df.shape))
+
+        df = preprocess(df)
+        print('DataFrame shape after NaN values removal: {}'.format(df.shape))
+
+    # index categorical data to [0, n-1] where n is the number of categories per feature
+    df[COLUMN_TO_INDEX] = df[COLUMN_TO_INDEX].apply(preprocessing.LabelEncoder().fit_transform)
+
+    # standardize continuous and quasi-continuous features
+    df[COLUMN_TO_STANDARDIZE] = preprocessing.StandardScaler().fit_transform(df[COLUMN_TO_STANDARDIZE])
 
-    # append the dfs from each file to the data df
+    return df
+
+
+def iter_chunks(files, chunk_size=CHUNK_SIZE, sep=','):
+    """Yields the preprocessed chunks of the given files, one at a time.
+
+    Only one chunk of `chunk_size` rows is held in memory at a time.
+
+    Parameter
+    ---------
+    files : list
+      The list of files to read.
+    chunk_size : int
+      The number of rows per chunk.
+    sep : str
+      The field delimiter of the files, i.e. ',' for CSV and '\\t' for the raw TXT files.
+
+    Returns
+    -------
+    chunk : pandas.core.frame.DataFrame
+      A preprocessed chunk of the dataset.
+    """
     for file in files:
-        # the python engine was used to support mixed data types
-        df = df.append(pd.read_csv(filepath_or_buffer=file, names=COLUMN_NAMES, engine='python'))
-        print('Appending {}'.format(file))
+        print('Reading {}'.format(file))
+        reader = pd.read_csv(filepath_or_buffer=file, names=COLUMN_NAMES, sep=sep, engine='c', dtype=COLUMN_DTYPES,
+                             chunksize=chunk_size)
+        for chunk in reader:
+            yield preprocess(chunk)
+
+
+def preprocess(df):
+    """Drops the rows with NaN values, maps the detection and label columns
+    to binary values, and converts the start time to continuous data.
+
+    Parameter
+    ---------
+    df : pandas.core.frame.DataFrame
+      A Pandas dataframe of the raw dataset.
 
-    print('Current DataFrame shape: {}'.format(df.shape))
+    Returns
+    -------
+    df : pandas.core.frame.DataFrame
+      The preprocessed Pandas dataframe.
+    """
 
     # drop rows with NaN values
-    df[COLUMN_NAMES] = df[COLUMN_NAMES].dropna(axis=0, how='any')
-    print('DataFrame shape after NaN values removal: {}'.format(df.shape))
+    df = df.dropna(axis=0, how='any')
 
     # since malware_detection, ashula_detection,
     # and ids_detection col contains string data
-    # replace if the string != '0' with int 1
-    # otherwise with int 0
-    df['malware_detection'] = df['malware_detection'].apply(
-        lambda malware_detection: 1 if malware_detection != '0' else 0)
-    df['ashula_detection'] = df['ashula_detection'].apply(lambda ashula_detection: 1 if ashula_detection != '0' else 0)
-    df['ids_detection'] = df['ids_detection'].apply(lambda ids_detection: 1 if ids_detection != '0' else 0)
+    # only the string '0' maps to int 0, and every other value maps to int 1,
+    # as the legacy lambdas compared against the string
+    for column in ['malware_detection', 'ashula_detection', 'ids_detection']:
+        df[column] = np.where(df[column].isin(['0']), 0, 1)
 
     # label indicates there is an attack if
     # it is either -1 or -2, otherwise 1
     # replace -1 & -2 with 1, and 1 with 0
-    df['label'] = df['label'].apply(lambda label: 1 if label == -1 or label == -2 else 0)
+    df['label'] = np.where(df['label'].isin([-1, -2]), 1, 0)
 
     # convert time to continuous data
-    df['start_time'] = \
-        df['start_time'].apply(lambda time: int(time.split(':')[0]) + (int(time.split(':')[1]) * (1 / 60)) +
-                                            (int(time.split(':')[2]) * (1 / 3600)))
+    df['start_time'] = parse_start_time(df['start_time'])
 
-    # index categorical data to [0, n-1] where n is the number of categories per feature
-    df[COLUMN_TO_INDEX] = df[COLUMN_TO_INDEX].apply(preprocessing.LabelEncoder().fit_transform)
+    return df
 
-    # standardize continuous and quasi-continuous features
-    df[COLUMN_TO_STANDARDIZE] = preprocessing.StandardScaler().fit_transform(df[COLUMN_TO_STANDARDIZE])
 
-    return df
+def parse_start_time(start_time):
+    """Converts the HH:MM:SS start times to hours, i.e. H + M / 60 + S / 3600.
+
+    Fixed-width start times are parsed directly from their bytes,
+    otherwise they are parsed as timedeltas.
+
+    Parameter
+    ---------
+    start_time : pandas.core.series.Series
+      The start times, as HH:MM:SS strings.
+
+    Returns
+    -------
+    hours : numpy.ndarray
+      The start times in hours.
+    """
+
+    values = np.asarray(start_time.values, dtype='S')
+
+    if values.dtype.itemsize == 8:
+        # [N, 8] bytes of HH:MM:SS
+        codes = values.view(np.uint8).reshape(-1, 8)
+        digits = codes[:, [0, 1, 3, 4, 6, 7]].astype(np.int64) - ord('0')
+        if ((digits >= 0) & (digits <= 9)).all() and (codes[:, [2, 5]] == ord(':')).all():
+            hours = digits[:, 0] * 10 + digits[:, 1]
+            minutes = digits[:, 2] * 10 + digits[:, 3]
+            seconds = digits[:, 4] * 10 + digits[:, 5]
+            return hours + (minutes * (1 / 60)) + (seconds * (1 / 3600))
+
+    seconds = pd.to_timedelta(start_time).values.astype('timedelta64[s]').astype(np.int64)
+    hours, minutes, seconds = seconds // 3600, (seconds % 3600) // 60, seconds % 60
+
+    return hours + (minutes * (1 / 60)) + (seconds * (1 / 3600))
+
+
+def fit_statistics(files, chunk_size=CHUNK_SIZE, sep=','):
+    """Accumulates the standardization and indexing statistics of the given files.
+
+    This is the first pass of the out-of-core normalization. The running mean and
+    variance of `COLUMN_TO_STANDARDIZE`, and the category counts of `COLUMN_TO_INDEX`
+    are updated one chunk at a time.
+
+    Parameter
+    ---------
+    files : list
+      The list of files to read.
+    chunk_size : int
+      The number of rows per chunk.
+    sep : str
+      The field delimiter of the files.
+
+    Returns
+    -------
+    statistics : dict
+      The fitted `mean` and `scale` of the continuous features, and the sorted
+      `vocabularies` (with their `counts`) of the categorical features.
+    """
+
+    scaler = preprocessing.StandardScaler()
+    counts = {column: {} for column in COLUMN_TO_INDEX}
+
+    for chunk in iter_chunks(files=files, chunk_size=chunk_size, sep=sep):
+        partial_fit_statistics(chunk=chunk, scaler=scaler, counts=counts)
+
+    return make_statistics(scaler=scaler, counts=counts)
+
+
+def partial_fit_statistics(chunk, scaler, counts):
+    """Updates the given scaler and category counts with a preprocessed chunk.
+
+    Parameter
+    ---------
+    chunk : pandas.core.frame.DataFrame
+      A preprocessed chunk of the dataset.
+    scaler : sklearn.preprocessing.StandardScaler
+      The scaler accumulating the running mean and variance.
+    counts : dict
+      The category counts per categorical feature.
+    """
+    if chunk.shape[0] == 0:
+        return
+
+    scaler.partial_fit(chunk[COLUMN_TO_STANDARDIZE].values.astype(np.float64))
+
+    for column in COLUMN_TO_INDEX:
+        for value, count in chunk[column].value_counts().items():
+            # use native python types, so that the statistics are JSON-serializable
+            value = value.item() if isinstance(value, np.generic) else value
+            counts[column][value] = counts[column].get(value, 0) + int(count)
+
+
+def make_statistics(scaler, counts):
+    """Returns the statistics dictionary of a fitted scaler and category counts."""
+    vocabularies = {column: sorted(counts[column]) for column in COLUMN_TO_INDEX}
+
+    return {'version': 1,
+            'num_samples': int(scaler.n_samples_seen_),
+            'mean': dict(zip(COLUMN_TO_STANDARDIZE, scaler.mean_.tolist())),
+            'scale': dict(zip(COLUMN_TO_STANDARDIZE, scaler.scale_.tolist())),
+            'vocabularies': vocabularies,
+            'counts': {column: [counts[column][value] for value in vocabularies[column]]
+                       for column in COLUMN_TO_INDEX}}
+
+
+def transform(chunk, statistics):
+    """Indexes and standardizes a preprocessed chunk using fitted statistics.
+
+    The index of a category is its position in the sorted vocabulary, as in
+    `preprocessing.LabelEncoder`. Categories that were not seen during the fit
+    are indexed as -1.
+
+    Parameter
+    ---------
+    chunk : pandas.core.frame.DataFrame
+      A preprocessed chunk of the dataset.
+    statistics : dict
+      The statistics returned by `fit_statistics()`.
+
+    Returns
+    -------
+    chunk : pandas.core.frame.DataFrame
+      The normalized chunk.
+    """
+
+    for column in COLUMN_TO_INDEX:
+        chunk[column] = pd.Categorical(chunk[column], categories=statistics['vocabularies'][column]).codes
+
+    mean = np.array([statistics['mean'][column] for column in COLUMN_TO_STANDARDIZE])
+    scale = np.array([statistics['scale'][column] for column in COLUMN_TO_STANDARDIZE])
+    chunk[COLUMN_TO_STANDARDIZE] = (chunk[COLUMN_TO_STANDARDIZE].values.astype(np.float64) - mean) / scale
+
+    return chunk
+
+
+def normalize_files(path, write_path, num_chunks, chunk_size=CHUNK_SIZE, statistics_path=None):
+    """Normalizes a given dataset out-of-core, in two passes.
+
+    The first pass fits the statistics over all the files, unless `statistics_path`
+    already exists, in which case the saved statistics are reused. The second pass
+    normalizes the files chunk by chunk, and appends the chunks to `num_chunks` CSV files.
+
+    Parameter
+    ---------
+    path : str
+      The path of the dataset to be normalized.
+    write_path : str
+      The path where to save the normalized dataset.
+    num_chunks : int
+      The number of file splits for the normalized dataset.
+    chunk_size : int
+      The number of rows to read at a time.
+    statistics_path : str
+      The path of the fitted statistics to reuse, or where to save them.
+
+    Returns
+    -------
+    statistics : dict
+      The statistics used for the normalization.
+    """
+
+    files = list_files(path=path)
+
+    if statistics_path and os.path.exists(statistics_path):
+        statistics = load_statistics(statistics_path)
+        print('Loaded statistics from {}'.format(statistics_path))
+    else:
+        statistics = fit_statistics(files=files, chunk_size=chunk_size)
+        print('Fitted statistics over {} rows'.format(statistics['num_samples']))
+        if statistics_path:
+            save_statistics(statistics=statistics, path=statistics_path)
+            print('Saved statistics to {}'.format(statistics_path))
+
+    write_files = [open(os.path.join(write_path, '{id}.csv'.format(id=id)), 'w') for id in range(num_chunks)]
+
+    try:
+        for index, chunk in enumerate(iter_chunks(files=files, chunk_size=chunk_size)):
+            chunk = transform(chunk=chunk, statistics=statistics)
+            chunk.to_csv(path_or_buf=write_files[index % num_chunks], columns=COLUMN_NAMES, header=None,
+                         index=False)
+    finally:
+        for write_file in write_files:
+            write_file.close()
+            print('Saving CSV file : {path}'.format(path=write_file.name))
+
+    return statistics
+
+
+def save_statistics(statistics, path):
+    """Saves the fitted statistics to a JSON file."""
+    with open(path, 'w') as file:
+        json.dump(statistics, file)
+
+
+def load_statistics(path):
+    """Loads the fitted statistics from a JSON file."""
+    with open(path, 'r') as file:
+        return json.load(file)
 
 
 def save_dataframe(dataframe, write_path, num_chunks):
@@ -196,6 +450,10 @@ def parse_args():
                        help='path where to save the normalized dataset')
     group.add_argument('-n', '--num_chunks', required=True, type=int,
                        help='number of file splits for the dataset')
+    group.add_argument('-c', '--chunk_size', required=False, type=int,
+                       help='number of rows to read at a time; normalizes out-of-core in two passes if set')
+    group.add_argument('-s', '--statistics', required=False, type=str,
+                       help='path of the fitted statistics (*.json) to reuse if it exists, otherwise to save')
     arguments = parser.parse_args()
     return arguments
 
@@ -203,6 +461,10 @@ def parse_args():
 if __name__ == '__main__':
     args = parse_args()
 
-    normalized_data = normalize_data(args.dataset)
+    if args.chunk_size:
+        normalize_files(path=args.dataset, write_path=args.write_path, num_chunks=args.num_chunks,
+                        chunk_size=args.chunk_size, statistics_path=args.statistics)
+    else:
+        normalized_data = normalize_data(args.dataset)
 
-    save_dataframe(dataframe=normalized_data, write_path=args.write_path, num_chunks=args.num_chunks)
+        save_dataframe(dataframe=normalized_data, write_path=args.write_path, num_chunks=args.num_chunks)
@@ -0,0 +1,245 @@
+# Preprocessing pipeline from the raw Kyoto University 2013 dataset to a binary store
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""
+Normalizes and bins the raw Kyoto University dataset TXT files,
+ and writes the binned features and labels to a binary store
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import argparse
+import io
+import numpy as np
+import os
+import pandas as pd
+from sklearn import preprocessing
+
+try:
+    import bin_data as bd
+    import normalize_data as nd
+    from sketch import QuantileSketch, weighted_quantiles
+    from store import StoreWriter
+except ImportError:
+    # imported as the dataset package, e.g. by the scoring server
+    from dataset import bin_data as bd
+    from dataset import normalize_data as nd
+    from dataset.sketch import QuantileSketch, weighted_quantiles
+    from dataset.store import StoreWriter
+
+# column names of the features in the store, i.e. the binned columns without the label
+FEATURE_COLUMNS = [column for column in bd.columns_to_save if column != 'label']
+
+
+def fit(files, chunk_size=nd.CHUNK_SIZE, binning=1):
+    """Fits the normalization statistics and the bin edges over the raw TXT files, in one pass
+
+    Parameter
+    ---------
+    files : list
+      The list of TXT files to read.
+    chunk_size : int
+      The number of rows to read at a time.
+    binning : int
+      The type of binning: 0 if bucket binning, 1 if quantile binning.
+
+    Returns
+    -------
+    statistics : dict
+      The normalization statistics, as in `normalize_data.fit_statistics()`.
+    edges : dict
+      The bin edges of each binned feature, in the normalized space.
+    """
+
+    scaler = preprocessing.StandardScaler()
+    counts = {column: {} for column in nd.COLUMN_TO_INDEX}
+    sketches = {column: QuantileSketch() for column in nd.COLUMN_TO_STANDARDIZE}
+
+    for chunk in nd.iter_chunks(files=files, chunk_size=chunk_size, sep='\t'):
+        nd.partial_fit_statistics(chunk=chunk, scaler=scaler, counts=counts)
+        for column in nd.COLUMN_TO_STANDARDIZE:
+            sketches[column].update(chunk[column].values)
+
+    statistics = nd.make_statistics(scaler=scaler, counts=counts)
+
+    edges = {}
+    for column in nd.COLUMN_TO_STANDARDIZE:
+        # standardization is monotonic, so the edges of the normalized feature
+        # are the standardized edges of the raw feature
+        mean, scale = statistics['mean'][column], statistics['scale'][column]
+        edges[column] = (bd.sketch_edges(sketch=sketches[column], binning=binning) - mean) / scale
+    for column in ['service', 'flag']:
+        # indexed features range from 0 to n-1, and their quantiles are exact from the category counts
+        num_categories = len(statistics['vocabularies'][column])
+        if int(binning) == 0:
+            edges[column] = bd.bucket_edges(0, num_categories - 1)
+        else:
+            edges[column] = np.unique(weighted_quantiles(values=np.arange(num_categories),
+                                                         weights=statistics['counts'][column],
+                                                         q=np.linspace(0, 1, bd.NUM_BINS + 1)))
+
+    return statistics, edges
+
+
+def transform(chunk, statistics, edges, binning):
+    """Normalizes and bins a preprocessed chunk
+
+    Parameter
+    ---------
+    chunk : pandas.core.frame.DataFrame
+      A preprocessed chunk of the raw dataset.
+    statistics : dict
+      The normalization statistics.
+    edges : dict
+      The bin edges of each binned feature.
+    binning : int
+      The type of binning the edges were fitted for: 0 if bucket binning, 1 if quantile binning.
+
+    Returns
+    -------
+    features : numpy.ndarray
+      The [N, 21] uint8 binned features.
+    labels : numpy.ndarray
+      The [N] uint8 labels.
+    """
+
+    chunk = nd.transform(chunk=chunk, statistics=statistics)
+
+    for column in bd.cols_to_std:
+        chunk[column] = bd.bin_values(values=chunk[column].values, edges=edges[column], binning=binning)
+
+    # categories that were not seen during the fit are indexed as -1, put them in the first bin
+    features = np.clip(chunk[FEATURE_COLUMNS].values, 0, bd.NUM_BINS - 1).astype(np.uint8)
+    labels = chunk['label'].values.astype(np.uint8)
+
+    return features, labels
+
+
+def transform_records(text, statistics, edges, binning):
+    """Preprocesses, normalizes and bins raw records, e.g. the lines appended to a TXT file
+
+    Parameter
+    ---------
+    text : str
+      The records, one per line, with the tab-separated fields of the raw TXT files.
+    statistics : dict
+      The normalization statistics.
+    edges : dict
+      The bin edges of each binned feature.
+    binning : int
+      The type of binning the edges were fitted for: 0 if bucket binning, 1 if quantile binning.
+
+    Returns
+    -------
+    features : numpy.ndarray
+      The [N, 21] uint8 binned features of the valid records.
+    index : numpy.ndarray
+      The [N] line index of each valid record, since the records with NaN values are dropped.
+    num_records : int
+      The number of records in `text`.
+    """
+    records = pd.read_csv(io.StringIO(text), names=nd.COLUMN_NAMES, sep='\t', engine='c', dtype=nd.COLUMN_DTYPES)
+    num_records = records.shape[0]
+
+    # the records are not guaranteed to be clean, set the malformed values to NaN so that their records are dropped
+    for column in nd.COLUMN_NAMES:
+        if column not in nd.COLUMN_DTYPES:
+            records[column] = pd.to_numeric(records[column], errors='coerce')
+    records.loc[pd.to_timedelta(records['start_time'], errors='coerce').isnull(), 'start_time'] = np.nan
+    records = nd.preprocess(records)
+    features, _ = transform(chunk=records, statistics=statistics, edges=edges, binning=binning)
+
+    return features, records.index.values, num_records
+
+
+def run_pipeline(txt_path, store_path, chunk_size=nd.CHUNK_SIZE, binning=1, statistics_path=None, edges_path=None):
+    """Preprocesses the raw TXT files to a binary store
+
+    The text is parsed once for fitting (skipped if `statistics_path` and `edges_path` both exist),
+    and once for normalizing, binning, and writing the rows to the store. No intermediate CSV files are written.
+
+    Parameter
+    ---------
+    txt_path : str
+      The path where the TXT files are located.
+    store_path : str
+      The directory where to write the binary store.
+    chunk_size : int
+      The number of rows to read at a time.
+    binning : int
+      The type of binning to fit: 0 if bucket binning, 1 if quantile binning.
+    statistics_path : str
+      The path of the normalization statistics to reuse, or where to save them.
+    edges_path : str
+      The path of the bin edges to reuse, or where to save them.
+    """
+
+    files = nd.list_files(path=txt_path)
+
+    if statistics_path and edges_path and os.path.exists(statistics_path) and os.path.exists(edges_path):
+        statistics = nd.load_statistics(statistics_path)
+        edges, binning = bd.load_edges(edges_path)
+        print('Loaded statistics from {}, and bin edges from {}'.format(statistics_path, edges_path))
+    else:
+        statistics, edges = fit(files=files, chunk_size=chunk_size, binning=binning)
+        print('Fitted statistics and bin edges over {} rows'.format(statistics['num_samples']))
+        if statistics_path:
+            nd.save_statistics(statistics=statistics, path=statistics_path)
+        if edges_path:
+            bd.save_edges(edges=edges, binning=binning, path=edges_path)
+
+    with StoreWriter(path=store_path, columns=FEATURE_COLUMNS) as writer:
+        for chunk in nd.iter_chunks(files=files, chunk_size=chunk_size, sep='\t'):
+            features, labels = transform(chunk=chunk, statistics=statistics, edges=edges, binning=binning)
+            writer.write(features=features, labels=labels)
+
+    print('Saved {} rows to {}'.format(writer.num_rows, store_path))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Preprocessing pipeline from the Kyoto University 2013 dataset TXT files to a binary store')
+    group = parser.add_argument_group('Arguments')
+    group.add_argument('-t', '--txt_path', required=True, type=str,
+                       help='path of the dataset in TXT format')
+    group.add_argument('-s', '--store_path', required=True, type=str,
+                       help='path where the binary store will be written')
+    group.add_argument('-c', '--chunk_size', required=False, type=int, default=nd.CHUNK_SIZE,
+                       help='number of rows to read at a time')
+    group.add_argument('-b', '--binning', required=False, type=int, default=1, choices=[0, 1],
+                       help='set to 0 for bucket binning; set 1 for decile binning')
+    group.add_argument('--statistics', required=False, type=str,
+                       help='path of the normalization statistics (*.json) to reuse if it exists, otherwise to save')
+    group.add_argument('--edges', required=False, type=str,
+                       help='path of the bin edges (*.json) to reuse if it exists, otherwise to save')
+    arguments = parser.parse_args()
+    return arguments
+
+
+def main(arguments):
+    run_pipeline(txt_path=arguments.txt_path, store_path=arguments.store_path, chunk_size=arguments.chunk_size,
+                 binning=arguments.binning, statistics_path=arguments.statistics, edges_path=arguments.edges)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    main(args)
@@ -0,0 +1,160 @@
+# Module for estimating quantiles in a single pass
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Mergeable quantile sketch for streaming quantile binning"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import numpy as np
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch, in the manner of KLL
+
+    The sketch is a hierarchy of compactors: the items at level h have a weight of 2^h.
+    When a level holds more than `capacity` items, they are sorted, and every other item
+    (starting at a random offset) is promoted to the next level. The memory is thus
+    O(capacity * log(n / capacity)), and the rank error of a quantile is about
+    O(log(n / capacity) / capacity). Two sketches are merged by concatenating their levels.
+    """
+
+    def __init__(self, capacity=2048, seed=None):
+        """Initialize the QuantileSketch class
+
+        Parameter
+        ---------
+        capacity : int
+          The maximum number of items per level.
+        seed : int
+          The seed for choosing the compaction offsets.
+        """
+        self.capacity = capacity
+        self.levels = [np.zeros([0])]
+        self.count = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.random = np.random.RandomState(seed)
+
+    def update(self, values):
+        """Adds the given values, ignoring NaN values"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+
+        if values.shape[0] == 0:
+            return
+
+        self.count += values.shape[0]
+        self.minimum = min(self.minimum, values.min())
+        self.maximum = max(self.maximum, values.max())
+
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.compress()
+
+    def merge(self, other):
+        """Adds the items of another sketch to this sketch"""
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.zeros([0]))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.compress()
+
+        return self
+
+    def compress(self):
+        """Compacts the levels that hold more than `capacity` items"""
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.shape[0] > self.capacity:
+                items = np.sort(items)
+
+                # keep the last item at this level if the number of items is odd
+                even = items.shape[0] - items.shape[0] % 2
+                promoted = items[self.random.randint(2):even:2]
+                self.levels[level] = items[even:]
+
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.zeros([0]))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantiles(self, q):
+        """Returns the estimated quantiles
+
+        Parameter
+        ---------
+        q : array_like
+          The quantiles to estimate, in [0, 1].
+
+        Returns
+        -------
+        quantiles : numpy.ndarray
+          The estimated quantiles. The 0 and 1 quantiles are the exact minimum and maximum.
+        """
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(items.shape[0], 2.0 ** level) for level, items in enumerate(self.levels)])
+
+        quantiles = weighted_quantiles(values=values, weights=weights, q=q)
+
+        q = np.asarray(q, dtype=np.float64)
+        quantiles = np.where(q <= 0, self.minimum, quantiles)
+        return np.where(q >= 1, self.maximum, quantiles)
+
+    @property
+    def nbytes(self):
+        return sum(items.nbytes for items in self.levels)
+
+
+def weighted_quantiles(values, weights, q):
+    """Returns the quantiles of weighted values, i.e. the value at each rank `q * sum(weights)`
+
+    Parameter
+    ---------
+    values : numpy.ndarray
+      The values.
+    weights : numpy.ndarray
+      The weight (e.g. count) of each value.
+    q : array_like
+      The quantiles to get, in [0, 1].
+
+    Returns
+    -------
+    quantiles : numpy.ndarray
+      The quantiles of the values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    q = np.asarray(q, dtype=np.float64)
+
+    if values.shape[0] == 0:
+        return np.full(q.shape, np.nan)
+
+    order = np.argsort(values, kind='mergesort')
+    values, weights = values[order], weights[order]
+
+    cumulative = np.cumsum(weights)
+    indices = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+
+    return values[np.clip(indices, 0, values.shape[0] - 1)]
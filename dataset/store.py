@@ -0,0 +1,181 @@
+# Module for the binary store of the binned Kyoto University 2013 dataset
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Binary store of a uint8 feature matrix and a uint8 label vector"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import json
+import numpy as np
+import os
+
+STORE_FORMAT = 'gru-svm-store'
+STORE_VERSION = 1
+
+# a store is a directory with the following files
+SCHEMA_FILENAME = 'schema.json'
+FEATURES_FILENAME = 'features.bin'
+LABELS_FILENAME = 'labels.bin'
+
+
+class StoreWriter:
+    """Appends rows of features and labels to a binary store
+
+    The features are written as a C-ordered [NUM_ROWS, NUM_COLUMNS] uint8 matrix,
+    and the labels as a [NUM_ROWS] uint8 vector. The schema is written on `close()`,
+    so an unfinished store is never mistaken for a complete one.
+    """
+
+    def __init__(self, path, columns, label='label'):
+        """Initialize the StoreWriter class
+
+        Parameter
+        ---------
+        path : str
+          The directory of the store.
+        columns : list
+          The column names of the features.
+        label : str
+          The column name of the labels.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.label = label
+        self.num_rows = 0
+
+        if not os.path.exists(path=path):
+            os.makedirs(path)
+
+        # remove the schema of a previous store, until this one is complete
+        if os.path.exists(os.path.join(path, SCHEMA_FILENAME)):
+            os.remove(os.path.join(path, SCHEMA_FILENAME))
+
+        self.features_file = open(os.path.join(path, FEATURES_FILENAME), 'wb')
+        self.labels_file = open(os.path.join(path, LABELS_FILENAME), 'wb')
+
+    def write(self, features, labels):
+        """Appends the given rows to the store
+
+        Parameter
+        ---------
+        features : numpy.ndarray
+          The [N, NUM_COLUMNS] features, with values in [0, 255].
+        labels : numpy.ndarray
+          The [N] labels, with values in [0, 255].
+        """
+        features = np.ascontiguousarray(features, dtype=np.uint8)
+        labels = np.ascontiguousarray(labels, dtype=np.uint8)
+
+        assert features.ndim == 2 and features.shape[1] == len(self.columns), \
+            'Expected features of shape [N, {}], got {}'.format(len(self.columns), features.shape)
+        assert labels.shape == (features.shape[0],), \
+            'Expected labels of shape [{}], got {}'.format(features.shape[0], labels.shape)
+
+        self.features_file.write(features.tobytes())
+        self.labels_file.write(labels.tobytes())
+        self.num_rows += features.shape[0]
+
+    def close(self):
+        """Closes the store files, and writes the schema"""
+        self.features_file.close()
+        self.labels_file.close()
+
+        schema = {'format': STORE_FORMAT, 'version': STORE_VERSION, 'num_rows': self.num_rows,
+                  'dtype': 'uint8', 'columns': self.columns, 'label': self.label}
+
+        with open(os.path.join(self.path, SCHEMA_FILENAME), 'w') as file:
+            json.dump(schema, file, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.features_file.close()
+            self.labels_file.close()
+
+
+def is_store(path):
+    """Returns True if the given path is a binary store"""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, SCHEMA_FILENAME))
+
+
+def load_schema(path):
+    """Returns the schema of a binary store
+
+    Parameter
+    ---------
+    path : str
+      The directory of the store.
+
+    Returns
+    -------
+    schema : dict
+      The format, version, number of rows, dtype, feature column names, and label column name of the store.
+    """
+    with open(os.path.join(path, SCHEMA_FILENAME), 'r') as file:
+        schema = json.load(file)
+
+    if schema.get('format') != STORE_FORMAT or schema.get('version') != STORE_VERSION:
+        raise ValueError('Unsupported store {}: format {}, version {}'.format(path, schema.get('format'),
+                                                                              schema.get('version')))
+    return schema
+
+
+def read_store(path, mmap=False):
+    """Returns the features and labels of a binary store, as stored, i.e. without converting them
+
+    Parameter
+    ---------
+    path : str
+      The directory of the store.
+    mmap : bool
+      If True, the features and labels are memory-mapped instead of read into memory.
+
+    Returns
+    -------
+    features : numpy.ndarray
+      The [NUM_ROWS, NUM_COLUMNS] uint8 features.
+    labels : numpy.ndarray
+      The [NUM_ROWS] uint8 labels.
+    """
+    schema = load_schema(path)
+    num_rows, num_columns = schema['num_rows'], len(schema['columns'])
+    dtype = np.dtype(schema['dtype'])
+
+    features_path = os.path.join(path, FEATURES_FILENAME)
+    labels_path = os.path.join(path, LABELS_FILENAME)
+
+    if num_rows == 0:
+        # an empty file cannot be memory-mapped
+        return np.zeros([0, num_columns], dtype=dtype), np.zeros([0], dtype=dtype)
+
+    if mmap:
+        features = np.memmap(features_path, dtype=dtype, mode='r', shape=(num_rows, num_columns))
+        labels = np.memmap(labels_path, dtype=dtype, mode='r', shape=(num_rows,))
+    else:
+        features = np.fromfile(features_path, dtype=dtype, count=num_rows * num_columns)
+        features = features.reshape([num_rows, num_columns])
+        labels = np.fromfile(labels_path, dtype=dtype, count=num_rows)
+
+    return features, labels
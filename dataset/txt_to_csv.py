@@ -23,58 +23,131 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-__version__ = '0.1.1'
+__version__ = '0.2.0'
 __author__ = 'Abien Fred Agarap'
 
 import argparse
 import csv
+from multiprocessing import Pool
 from normalize_data import list_files
 import os
-from os import walk
+import time
 
 
-def convert_txt_to_csv(txt_path, csv_path):
+def convert_txt_to_csv(txt_path, csv_path, workers=1):
     """Converts the Kyoto University dataset TXT files to CSV files
 
+    The files are converted independently of each other, in a pool of `workers` processes.
+    Files whose CSV file already exists, and is newer than the TXT file, are skipped. A CSV file is
+    written under a temporary name, and renamed once complete, so that an interrupted conversion
+    does not leave a truncated CSV file to be skipped.
+
     Parameter
     ---------
     txt_path : str
       The path where the TXT files are located.
     csv_path : str
       The path where to save the CSV-converted files.
+    workers : int
+      The number of processes to use for the conversion.
     """
 
     # list to store the filenames under the subdirectories of the <path>
     data = list_files(path=txt_path)
 
-    csv_data = []  # list to store the converted CSV files
-
     # Create the <csv_path> if it does not exist
     os.makedirs(csv_path) if not os.path.exists(csv_path) else print('CSV folder exists')
 
-    for month in range(12):
-        ''' Create the subdirectories under the <csv_path> if it does not exist '''
-        if next(walk(csv_path))[1].__len__() == 12:
-            print('Folders exist')
-            break
-        print('Creating subdirectories.')
-        # get the dirpath from the generator object <walk> (index 0)
-        # then joins the dirpath with the month number
-        os.makedirs(os.path.join(next(walk(csv_path))[0], '0' + str(month + 1) if month < 9 else str(month + 1)))
-
-    for index in range(len(data)):
-        ''' Store the processed CSV filename to <csv_data> list '''
-        csv_data.append(os.path.join(csv_path, data[index].split(csv_path)[1].replace('txt', 'csv')))
-
-    for index in range(len(data)):
-        ''' Reading the text files delimited with tab, and converts it to CSV '''
+    tasks = []  # list to store the (TXT, CSV) filename pairs to convert
+
+    for txt_file in data:
+        # keep the subdirectories of the <txt_path>, e.g. the month folders, under the <csv_path>
+        csv_file = os.path.join(csv_path, os.path.relpath(txt_file, txt_path))
+        csv_file = os.path.splitext(csv_file)[0] + '.csv'
+
+        if os.path.exists(csv_file) and os.path.getmtime(csv_file) >= os.path.getmtime(txt_file):
+            print('Skipping: {}'.format(txt_file))
+            continue
+
+        tasks.append((txt_file, csv_file))
+
+    start_time = time.time()
+
+    if workers > 1:
+        pool = Pool(processes=workers)
         try:
-            print('Processing: {}'.format(data[index]))
-            in_csv = csv.reader(open(data[index], 'r'), delimiter='\t')
-            out_csv = csv.writer(open(csv_data[index], 'x'))
-            out_csv.writerows(in_csv)
-        except FileNotFoundError:
-            print('File not found: {}'.format(data[index]))
+            results = list(pool.imap_unordered(convert_file, tasks))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [convert_file(task) for task in tasks]
+
+    print_summary(results=results, elapsed_time=time.time() - start_time)
+
+
+def convert_file(task):
+    """Reads a text file delimited with tab, and converts it to CSV
+
+    Parameter
+    ---------
+    task : tuple
+      The (TXT, CSV) filename pair.
+
+    Returns
+    -------
+    result : tuple
+      The (worker process ID, number of rows, number of bytes read, elapsed time) of the conversion.
+    """
+    txt_file, csv_file = task
+    start_time = time.time()
+    rows = 0
+
+    try:
+        print('Processing: {}'.format(txt_file))
+        if not os.path.exists(os.path.dirname(csv_file)):
+            os.makedirs(os.path.dirname(csv_file), exist_ok=True)
+        temporary_file = csv_file + '.tmp'
+        with open(txt_file, 'r', newline='') as in_file, open(temporary_file, 'w', newline='') as out_file:
+            out_csv = csv.writer(out_file)
+            for row in csv.reader(in_file, delimiter='\t'):
+                out_csv.writerow(row)
+                rows += 1
+        os.replace(temporary_file, csv_file)
+        num_bytes = os.path.getsize(txt_file)
+    except FileNotFoundError:
+        print('File not found: {}'.format(txt_file))
+        num_bytes = 0
+
+    return os.getpid(), rows, num_bytes, time.time() - start_time
+
+
+def print_summary(results, elapsed_time):
+    """Displays the rows/sec and bytes/sec of each worker process
+
+    Parameter
+    ---------
+    results : list
+      The results returned by `convert_file()`.
+    elapsed_time : float
+      The wall time of the whole conversion, in seconds.
+    """
+    workers = {}
+
+    for pid, rows, num_bytes, seconds in results:
+        files, total_rows, total_bytes, total_seconds = workers.get(pid, (0, 0, 0, 0.0))
+        workers[pid] = (files + 1, total_rows + rows, total_bytes + num_bytes, total_seconds + seconds)
+
+    for pid, (files, rows, num_bytes, seconds) in sorted(workers.items()):
+        seconds = max(seconds, 1e-9)
+        print('worker [{}] files : {}, rows/sec : {:.0f}, bytes/sec : {:.0f}'.format(pid, files, rows / seconds,
+                                                                                     num_bytes / seconds))
+
+    total_rows = sum(result[1] for result in results)
+    total_bytes = sum(result[2] for result in results)
+    elapsed_time = max(elapsed_time, 1e-9)
+    print('Converted {} files in {:.2f}s -- rows/sec : {:.0f}, bytes/sec : {:.0f}'.format(
+        len(results), elapsed_time, total_rows / elapsed_time, total_bytes / elapsed_time))
 
 
 def parse_args():
@@ -85,12 +158,14 @@ def parse_args():
                        help='path of the dataset in TXT format')
     group.add_argument('-c', '--csv_path', required=True, type=str,
                        help='path where the dataset in CSV format will be stored')
+    group.add_argument('-w', '--workers', required=False, type=int, default=1,
+                       help='number of processes to use for the conversion')
     arguments = parser.parse_args()
     return arguments
 
 
 def main(arguments):
-    convert_txt_to_csv(arguments.txt_path, arguments.csv_path)
+    convert_txt_to_csv(arguments.txt_path, arguments.csv_path, arguments.workers)
 
 
 if __name__ == '__main__':
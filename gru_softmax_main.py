@@ -27,6 +27,7 @@ __author__ = 'Abien Fred Agarap'
 import argparse
 from models.gru_softmax.gru_softmax import GruSoftmax
 from utils import data
+from utils.session import session_config
 
 # hyper-parameters
 BATCH_SIZE = 256
@@ -55,20 +56,47 @@ def parse_args():
                        help='filename for the trained model')
     group.add_argument('-r', '--result_path', required=True, type=str,
                        help='path where to save the actual and predicted labels')
+    group.add_argument('--mmap', action='store_true',
+                       help='memory-map the datasets instead of reading them into memory')
+    group.add_argument('--log_interval', required=False, type=int, default=100,
+                       help='number of training steps between the summaries, loss, and accuracy')
+    group.add_argument('--keep_last', required=False, type=int, default=5,
+                       help='number of latest checkpoints to keep')
+    group.add_argument('--keep_interval', required=False, type=float,
+                       help='seconds between the checkpoints kept regardless of the others')
+    group.add_argument('--keep_best', required=False, type=int, default=1,
+                       help='number of checkpoints to keep with the best accuracy on the first validation batches')
+    group.add_argument('--inference_batch_size', required=False, type=int, default=BATCH_SIZE,
+                       help='number of examples per batch on "test", which scores every example')
+    group.add_argument('--input_mode', required=False, type=str, default='onehot', choices=['onehot', 'projected'],
+                       help='"onehot" to multiply the one-hot features by the GRU input kernels, "projected" to gather '
+                            'their rows instead')
+    group.add_argument('--intra_op_threads', required=False, type=int, default=0,
+                       help='number of threads per op, e.g. a matmul; 0 for the number of cores')
+    group.add_argument('--inter_op_threads', required=False, type=int, default=0,
+                       help='number of threads running independent ops concurrently; 0 for the number of cores')
+    group.add_argument('--opt_level', required=False, type=str, choices=['L0', 'L1'],
+                       help='level of the graph optimizer: "L0" for none, "L1" for the default')
+    group.add_argument('--xla', action='store_true',
+                       help='compile the graph with the XLA JIT')
     arguments = parser.parse_args()
     return arguments
 
 
 def main(arguments):
 
+    config = session_config(intra_op_threads=arguments.intra_op_threads, inter_op_threads=arguments.inter_op_threads,
+                            opt_level=arguments.opt_level, xla=arguments.xla)
+
     if arguments.operation == 'train':
         # get the train data
         # features: train_data[0], labels: train_data[1]
-        train_features, train_labels = data.load_data(dataset=arguments.train_dataset)
+        train_features, train_labels = data.load_data(dataset=arguments.train_dataset, mmap=arguments.mmap)
 
         # get the validation data
         # features: validation_data[0], labels: validation_data[1]
-        validation_features, validation_labels = data.load_data(dataset=arguments.validation_dataset)
+        validation_features, validation_labels = data.load_data(dataset=arguments.validation_dataset,
+                                                                mmap=arguments.mmap)
 
         # get the size of the dataset for slicing
         train_size = train_features.shape[0]
@@ -92,25 +120,25 @@ def main(arguments):
         validation_size = validation_features.shape[0]
 
         model = GruSoftmax(alpha=LEARNING_RATE, batch_size=BATCH_SIZE, cell_size=CELL_SIZE, dropout_rate=DROPOUT_P_KEEP,
-                           num_classes=N_CLASSES, sequence_length=SEQUENCE_LENGTH)
+                           num_classes=N_CLASSES, sequence_length=SEQUENCE_LENGTH, input_mode=arguments.input_mode,
+                           session_config=config)
 
         model.train(checkpoint_path=arguments.checkpoint_path, log_path=arguments.log_path,
                     model_name=arguments.model_name, epochs=HM_EPOCHS, train_data=[train_features, train_labels],
                     train_size=train_size, validation_data=[validation_features, validation_labels],
-                    validation_size=validation_size, result_path=arguments.result_path)
+                    validation_size=validation_size, result_path=arguments.result_path,
+                    log_interval=arguments.log_interval, keep_last=arguments.keep_last,
+                    keep_interval=arguments.keep_interval, keep_best=arguments.keep_best)
     elif arguments.operation == 'test':
-        test_features, test_labels = data.load_data(dataset=arguments.validation_dataset)
-
-        test_size = test_features.shape[0]
-
-        test_features = test_features[:test_size - (test_size % BATCH_SIZE)]
-        test_labels = test_labels[:test_size - (test_size % BATCH_SIZE)]
+        test_features, test_labels = data.load_data(dataset=arguments.validation_dataset, mmap=arguments.mmap)
 
+        # score every example, without truncating the dataset to a multiple of the batch size
         test_size = test_features.shape[0]
 
-        GruSoftmax.predict(batch_size=BATCH_SIZE, cell_size=CELL_SIZE, dropout_rate=DROPOUT_P_KEEP,
+        GruSoftmax.predict(batch_size=arguments.inference_batch_size, cell_size=CELL_SIZE, dropout_rate=DROPOUT_P_KEEP,
                            num_classes=N_CLASSES, test_data=[test_features, test_labels], test_size=test_size,
-                           checkpoint_path=arguments.checkpoint_path, result_path=arguments.result_path)
+                           checkpoint_path=arguments.checkpoint_path, result_path=arguments.result_path,
+                           session_config=config)
 
 
 if __name__ == '__main__':
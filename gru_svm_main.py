@@ -25,8 +25,8 @@ __version__ = '0.1.1'
 __author__ = 'Abien Fred Agarap'
 
 import argparse
+from models.gru_svm.numpy_gru_svm import NumpyGruSvm
 from utils import data
-from models.gru_svm.gru_svm import GruSvm
 
 # hyper-parameters for the model
 BATCH_SIZE = 256
@@ -43,10 +43,10 @@ def parse_args():
     parser = argparse.ArgumentParser(description='GRU+SVM for Intrusion Detection')
     group = parser.add_argument_group('Arguments')
     group.add_argument('-o', '--operation', required=True, type=str,
-                       help='the operation to perform: "train" or "test"')
+                       help='the operation to perform: "train", "test", or "export"')
     group.add_argument('-t', '--train_dataset', required=False, type=str,
                        help='the NumPy array training dataset (*.npy) to be used')
-    group.add_argument('-v', '--validation_dataset', required=True, type=str,
+    group.add_argument('-v', '--validation_dataset', required=False, type=str,
                        help='the NumPy array validation dataset (*.npy) to be used')
     group.add_argument('-c', '--checkpoint_path', required=True, type=str,
                        help='path where to save the trained model')
@@ -54,22 +54,85 @@ def parse_args():
                        help='path where to save the TensorBoard logs')
     group.add_argument('-m', '--model_name', required=False, type=str,
                        help='filename for the trained model')
-    group.add_argument('-r', '--result_path', required=True, type=str,
+    group.add_argument('-r', '--result_path', required=False, type=str,
                        help='path where to save the actual and predicted labels')
+    group.add_argument('--mmap', action='store_true',
+                       help='memory-map the datasets instead of reading them into memory')
+    group.add_argument('--log_interval', required=False, type=int, default=100,
+                       help='number of training steps between the summaries, loss, and accuracy')
+    group.add_argument('--keep_last', required=False, type=int, default=5,
+                       help='number of latest checkpoints to keep')
+    group.add_argument('--keep_interval', required=False, type=float,
+                       help='seconds between the checkpoints kept regardless of the others')
+    group.add_argument('--keep_best', required=False, type=int, default=1,
+                       help='number of checkpoints to keep with the best accuracy on the first validation batches')
+    group.add_argument('--inference_batch_size', required=False, type=int, default=BATCH_SIZE,
+                       help='number of examples per batch on "test", which scores every example')
+    group.add_argument('--input_mode', required=False, type=str, default='onehot', choices=['onehot', 'projected'],
+                       help='"onehot" to multiply the one-hot features by the GRU input kernels, "projected" to gather '
+                            'their rows instead')
+    group.add_argument('--shuffle', action='store_true',
+                       help='shuffle the order of the training batches for every epoch')
+    group.add_argument('--frozen_graph', required=False, type=str,
+                       help='the frozen inference graph (*.pb) to save on "export", or to load on "test"')
+    group.add_argument('--engine', required=False, type=str, default='tensorflow', choices=['tensorflow', 'numpy'],
+                       help='the engine to "test" with: "tensorflow", or "numpy" to run the forward pass in NumPy')
+    group.add_argument('--numpy_weights', required=False, type=str,
+                       help='the variables (*.npz) of the numpy engine to reuse if it exists, otherwise to save')
+    group.add_argument('--intra_op_threads', required=False, type=int, default=0,
+                       help='number of threads per op, e.g. a matmul; 0 for the number of cores')
+    group.add_argument('--inter_op_threads', required=False, type=int, default=0,
+                       help='number of threads running independent ops concurrently; 0 for the number of cores')
+    group.add_argument('--opt_level', required=False, type=str, choices=['L0', 'L1'],
+                       help='level of the graph optimizer: "L0" for none, "L1" for the default')
+    group.add_argument('--xla', action='store_true',
+                       help='compile the graph with the XLA JIT')
+    group.add_argument('--workers', required=False, type=int, default=1,
+                       help='number of processes training on shards of the memory-mapped dataset, '
+                            'averaging their gradients on every step')
     arguments = parser.parse_args()
+    if arguments.operation == 'export' and not arguments.frozen_graph:
+        parser.error('"export" requires --frozen_graph')
+    if arguments.operation != 'export' and not (arguments.validation_dataset and arguments.result_path):
+        parser.error('"{}" requires --validation_dataset and --result_path'.format(arguments.operation))
     return arguments
 
 
 def main(argv):
 
-    if argv.operation == 'train':
+    # import TensorFlow only when it is used, i.e. not by the numpy engine
+    if argv.operation != 'test' or argv.engine == 'tensorflow':
+        from models.gru_svm.gru_svm import GruSvm
+        from utils.session import session_config
+
+        config = session_config(intra_op_threads=argv.intra_op_threads, inter_op_threads=argv.inter_op_threads,
+                                opt_level=argv.opt_level, xla=argv.xla)
+
+    if argv.operation == 'train' and argv.workers > 1:
+        from models.gru_svm.parallel import train_parallel
+
+        # divide the cores between the workers, unless the sessions are configured
+        configured = argv.intra_op_threads or argv.inter_op_threads or argv.opt_level or argv.xla
+
+        train_parallel(num_workers=argv.workers,
+                       model_options={'alpha': LEARNING_RATE, 'batch_size': BATCH_SIZE, 'cell_size': CELL_SIZE,
+                                      'dropout_rate': DROPOUT_P_KEEP, 'num_classes': N_CLASSES,
+                                      'sequence_length': SEQUENCE_LENGTH, 'svm_c': SVM_C,
+                                      'input_mode': argv.input_mode},
+                       train_dataset=argv.train_dataset, validation_dataset=argv.validation_dataset,
+                       checkpoint_path=argv.checkpoint_path, log_path=argv.log_path, model_name=argv.model_name,
+                       epochs=HM_EPOCHS, result_path=argv.result_path, shuffle=argv.shuffle,
+                       log_interval=argv.log_interval, session_config=config if configured else None,
+                       keep_last=argv.keep_last, keep_interval=argv.keep_interval, keep_best=argv.keep_best)
+    elif argv.operation == 'train':
         # get the train data
         # features: train_data[0], labels: train_data[1]
-        train_features, train_labels = data.load_data(dataset=argv.train_dataset)
+        train_features, train_labels = data.load_data(dataset=argv.train_dataset, mmap=argv.mmap)
 
         # get the validation data
         # features: validation_data[0], labels: validation_data[1]
-        validation_features, validation_labels = data.load_data(dataset=argv.validation_dataset)
+        validation_features, validation_labels = data.load_data(dataset=argv.validation_dataset,
+                                                                mmap=argv.mmap)
 
         # get the size of the dataset for slicing
         train_size = train_features.shape[0]
@@ -94,26 +157,34 @@ def main(argv):
 
         # instantiate the model
         model = GruSvm(alpha=LEARNING_RATE, batch_size=BATCH_SIZE, cell_size=CELL_SIZE, dropout_rate=DROPOUT_P_KEEP,
-                       num_classes=N_CLASSES, sequence_length=SEQUENCE_LENGTH, svm_c=SVM_C)
+                       num_classes=N_CLASSES, sequence_length=SEQUENCE_LENGTH, svm_c=SVM_C,
+                       input_mode=argv.input_mode, session_config=config)
 
         # train the model
         model.train(checkpoint_path=argv.checkpoint_path, log_path=argv.log_path, model_name=argv.model_name,
                     epochs=HM_EPOCHS, train_data=[train_features, train_labels], train_size=train_size,
                     validation_data=[validation_features, validation_labels], validation_size=validation_size,
-                    result_path=argv.result_path)
+                    result_path=argv.result_path, shuffle=argv.shuffle, log_interval=argv.log_interval,
+                    keep_last=argv.keep_last, keep_interval=argv.keep_interval, keep_best=argv.keep_best)
     elif argv.operation == 'test':
-        test_features, test_labels = data.load_data(dataset=argv.validation_dataset)
+        test_features, test_labels = data.load_data(dataset=argv.validation_dataset, mmap=argv.mmap)
 
+        # score every example, without truncating the dataset to a multiple of the batch size
         test_size = test_features.shape[0]
 
-        test_features = test_features[:test_size-(test_size % BATCH_SIZE)]
-        test_labels = test_labels[:test_size-(test_size % BATCH_SIZE)]
-
-        test_size = test_features.shape[0]
-
-        GruSvm.predict(batch_size=BATCH_SIZE, cell_size=CELL_SIZE, dropout_rate=DROPOUT_P_KEEP, num_classes=N_CLASSES,
-                       test_data=[test_features, test_labels], test_size=test_size,
-                       checkpoint_path=argv.checkpoint_path, result_path=argv.result_path)
+        if argv.engine == 'numpy':
+            model = NumpyGruSvm.from_weights_or_checkpoint(checkpoint_path=argv.checkpoint_path,
+                                                           numpy_weights=argv.numpy_weights)
+            model.classify(batch_size=argv.inference_batch_size, num_classes=N_CLASSES,
+                           test_data=[test_features, test_labels], test_size=test_size, result_path=argv.result_path)
+        else:
+            # disable the dropout, as the frozen graph and the NumPy engine do
+            GruSvm.predict(batch_size=argv.inference_batch_size, cell_size=CELL_SIZE, dropout_rate=1.0,
+                           num_classes=N_CLASSES, test_data=[test_features, test_labels], test_size=test_size,
+                           checkpoint_path=argv.checkpoint_path, result_path=argv.result_path,
+                           frozen_graph=argv.frozen_graph, session_config=config)
+    elif argv.operation == 'export':
+        GruSvm.export(checkpoint_path=argv.checkpoint_path, frozen_graph_path=argv.frozen_graph)
 
 
 if __name__ == '__main__':
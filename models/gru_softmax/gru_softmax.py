@@ -29,12 +29,20 @@ import os
 import sys
 import tensorflow as tf
 import time
+from models.projected_gru import ProjectedGRUCell, projected_inputs
+from utils.checkpoint import AsyncCheckpointer
+from utils.data import one_hot
+from utils.results import ResultsWriter
+
+# the number of validation batches whose accuracy ranks the checkpoints
+VALIDATION_BATCHES = 4
 
 
 class GruSoftmax:
     """Implementation of the GRU+Softmax model using TensorFlow"""
 
-    def __init__(self, alpha, batch_size, cell_size, dropout_rate, num_classes, sequence_length):
+    def __init__(self, alpha, batch_size, cell_size, dropout_rate, num_classes, sequence_length, input_mode='onehot',
+                 session_config=None):
         """Initialize the GRU+Softmax class
 
         Parameter
@@ -51,6 +59,11 @@ class GruSoftmax:
           The number of classes in a dataset.
         sequence_length : int
           The number of features in a dataset.
+        input_mode : str
+          The input of the GRU: 'onehot' to multiply the one-hot encoded features by its input kernels,
+          'projected' to gather the rows of its input kernels instead, with a `ProjectedGRUCell`.
+        session_config : tf.ConfigProto
+          The configuration of the sessions, e.g. from `utils.session.session_config()`. None for the default.
         """
 
         self.alpha = alpha
@@ -59,6 +72,8 @@ class GruSoftmax:
         self.dropout_rate = dropout_rate
         self.num_classes = num_classes
         self.sequence_length = sequence_length
+        self.input_mode = input_mode
+        self.session_config = session_config
 
         def __graph__():
             """Build the inference graph"""
@@ -66,9 +81,6 @@ class GruSoftmax:
                 # [BATCH_SIZE, SEQUENCE_LENGTH]
                 x_input = tf.placeholder(dtype=tf.uint8, shape=[None, self.sequence_length], name='x_input')
 
-                # [BATCH_SIZE, SEQUENCE_LENGTH, 10]
-                x_onehot = tf.one_hot(indices=x_input, depth=10, on_value=1.0, off_value=0.0, name='x_onehot')
-
                 # [BATCH_SIZE]
                 y_input = tf.placeholder(dtype=tf.uint8, shape=[None], name='y_input')
 
@@ -82,12 +94,24 @@ class GruSoftmax:
             learning_rate = tf.placeholder(tf.float32, name='learning_rate')
             p_keep = tf.placeholder(tf.float32, name='p_keep')
 
-            cell = tf.contrib.rnn.GRUCell(self.cell_size)
-            drop_cell = tf.contrib.rnn.DropoutWrapper(cell, input_keep_prob=p_keep)
+            if self.input_mode == 'projected':
+                # [BATCH_SIZE, SEQUENCE_LENGTH, 2], the symbols and their input dropout scales
+                x_projected = projected_inputs(x_input=x_input, p_keep=p_keep)
+                cell = ProjectedGRUCell(num_units=self.cell_size, depth=10)
 
-            # outputs: [BATCH_SIZE, SEQUENCE_LENGTH, CELL_SIZE]
-            # states: [BATCH_SIZE, CELL_SIZE]
-            outputs, states = tf.nn.dynamic_rnn(drop_cell, x_onehot, initial_state=state, dtype=tf.float32)
+                # outputs: [BATCH_SIZE, SEQUENCE_LENGTH, CELL_SIZE]
+                # states: [BATCH_SIZE, CELL_SIZE]
+                outputs, states = tf.nn.dynamic_rnn(cell, x_projected, initial_state=state, dtype=tf.float32)
+            else:
+                # [BATCH_SIZE, SEQUENCE_LENGTH, 10]
+                x_onehot = tf.one_hot(indices=x_input, depth=10, on_value=1.0, off_value=0.0, name='x_onehot')
+
+                cell = tf.contrib.rnn.GRUCell(self.cell_size)
+                drop_cell = tf.contrib.rnn.DropoutWrapper(cell, input_keep_prob=p_keep)
+
+                # outputs: [BATCH_SIZE, SEQUENCE_LENGTH, CELL_SIZE]
+                # states: [BATCH_SIZE, CELL_SIZE]
+                outputs, states = tf.nn.dynamic_rnn(drop_cell, x_onehot, initial_state=state, dtype=tf.float32)
 
             states = tf.identity(states, name='H')
 
@@ -141,7 +165,7 @@ class GruSoftmax:
         sys.stdout.write('</log>\n')
 
     def train(self, checkpoint_path, log_path, model_name, epochs, train_data, train_size, validation_data,
-              validation_size, result_path):
+              validation_size, result_path, log_interval=100, keep_last=5, keep_interval=None, keep_best=1):
         """Trains the model
 
         Parameter
@@ -164,12 +188,23 @@ class GruSoftmax:
           The size of `validation_data`.
         result_path : str
           The path where to save the actual and predicted classes.
+        log_interval : int
+          The number of steps between the computations of the summaries, loss, and accuracy.
+        keep_last : int
+          The number of latest checkpoints to keep.
+        keep_interval : float
+          The number of seconds between the checkpoints kept regardless of the others. None to disable.
+        keep_best : int
+          The number of checkpoints to keep with the best accuracy on the first VALIDATION_BATCHES
+          batches of `validation_data`, computed every `log_interval` steps.
         """
-        
+
         if not os.path.exists(path=checkpoint_path):
             os.mkdir(path=checkpoint_path)
 
-        saver = tf.train.Saver(max_to_keep=1000)
+        # snapshot the variables, and write the checkpoints on a background thread
+        checkpointer = AsyncCheckpointer(save_path=os.path.join(checkpoint_path, model_name), keep_last=keep_last,
+                                         keep_interval=keep_interval, keep_best=keep_best)
 
         current_state = np.zeros([self.batch_size, self.cell_size])  # initialize H (current_state) with values of zeros
 
@@ -185,7 +220,7 @@ class GruSoftmax:
         validation_writer = tf.summary.FileWriter(logdir=os.path.join(log_path, timestamp + '-validation'),
                                                   graph=tf.get_default_graph())
 
-        with tf.Session() as sess:
+        with tf.Session(config=self.session_config) as sess:
 
             sess.run(init_op)
 
@@ -198,6 +233,10 @@ class GruSoftmax:
                 # restore variables to resume training
                 saver.restore(sess, tf.train.latest_checkpoint(checkpoint_path))
 
+            # buffer the predicted and actual labels, and append them to one file per phase
+            training_results = ResultsWriter(result_path=result_path, phase='training', model_name='gru_softmax',
+                                             num_classes=self.num_classes)
+
             try:
                 for step in range(epochs * train_size // self.batch_size):
 
@@ -214,15 +253,12 @@ class GruSoftmax:
                                  self.state: current_state,
                                  self.learning_rate: self.alpha, self.p_keep: self.dropout_rate}
 
-                    train_summary, _, predictions, actual, next_state = sess.run([self.merged, self.optimizer,
-                                                                                  self.predicted_class, self.y_onehot,
-                                                                                  self.states],
-                                                                                 feed_dict=feed_dict)
-
-                    # Display training accuracy every 100 steps and at step 0
-                    if step % 100 == 0:
-                        # get the train loss and accuracy
-                        train_loss, train_accuracy = sess.run([self.loss, self.accuracy], feed_dict=feed_dict)
+                    # Display training accuracy every log_interval steps and at step 0
+                    if step % log_interval == 0:
+                        # fetch the summaries, loss and accuracy in the same run as the training op
+                        train_summary, _, predictions, actual, next_state, train_loss, train_accuracy = \
+                            sess.run([self.merged, self.optimizer, self.predicted_class, self.y_onehot, self.states,
+                                      self.loss, self.accuracy], feed_dict=feed_dict)
 
                         # display train loss and accuracy
                         print('step [{}] train -- loss : {}, accuracy : {}'.format(step, train_loss, train_accuracy))
@@ -231,18 +267,32 @@ class GruSoftmax:
                         train_writer.add_summary(train_summary, step)
 
                         # save the model at the current step
-                        saver.save(sess=sess, save_path=os.path.join(checkpoint_path, model_name), global_step=step)
+                        checkpointer.save(sess=sess, step=step,
+                                          metric=self.validation_accuracy(sess, validation_data, validation_size))
+                    else:
+                        # the predictions are still fetched for the results file, and the states for the next step,
+                        # but the one-hot labels are computed from the fed labels instead
+                        _, predictions, next_state = sess.run([self.optimizer, self.predicted_class, self.states],
+                                                              feed_dict=feed_dict)
+                        actual = one_hot(labels=train_label_batch, num_classes=self.num_classes, on_value=1.0,
+                                         off_value=0.0)
 
                     current_state = next_state
 
-                    self.save_labels(predictions=predictions, actual=actual, result_path=result_path, step=step,
-                                     phase='training')
+                    training_results.write(step=step, predictions=predictions, actual=actual)
             except KeyboardInterrupt:
                 print('Training interrupted at {}'.format(step))
+                training_results.close()
+                checkpointer.close()
                 os._exit(1)
             finally:
+                training_results.close()
+                checkpointer.close()
                 print('EOF -- Training done at step {}'.format(step))
 
+                validation_results = ResultsWriter(result_path=result_path, phase='validation',
+                                                   model_name='gru_softmax', num_classes=self.num_classes)
+
                 for step in range(epochs * validation_size // self.batch_size):
 
                     offset = (step * self.batch_size) % validation_size
@@ -253,26 +303,44 @@ class GruSoftmax:
                     feed_dict = {self.x_input: test_example_batch, self.y_input: test_label_batch,
                                  self.state: np.zeros([self.batch_size, self.cell_size]), self.p_keep: 1.0}
 
-                    validation_summary, predictions, actual, validation_loss, validation_accuracy = \
-                        sess.run([self.merged, self.predicted_class, self.y_onehot, self.loss, self.accuracy],
-                                 feed_dict=feed_dict)
-
-                    # Validate training every 100 steps
-                    if step % 100 == 0 and step > 0:
+                    # Validate training every log_interval steps
+                    if step % log_interval == 0 and step > 0:
+                        validation_summary, predictions, actual, validation_loss, validation_accuracy = \
+                            sess.run([self.merged, self.predicted_class, self.y_onehot, self.loss, self.accuracy],
+                                     feed_dict=feed_dict)
 
                         # add the validation summary
                         validation_writer.add_summary(validation_summary, step)
 
                         print('step [{}] validation -- loss : {}, accuracy : {}'.format(step, validation_loss,
                                                                                         validation_accuracy))
+                    else:
+                        predictions, actual = sess.run([self.predicted_class, self.y_onehot], feed_dict=feed_dict)
 
-                    self.save_labels(predictions=predictions, actual=actual, result_path=result_path, step=step,
-                                     phase='validation')
+                    validation_results.write(step=step, predictions=predictions, actual=actual)
 
+                validation_results.close()
                 print('EOF -- Testing done at step {}'.format(step))
 
+    def validation_accuracy(self, sess, validation_data, validation_size, num_batches=VALIDATION_BATCHES):
+        """Returns the accuracy on the first `num_batches` batches of the validation dataset, or None if empty
+
+        It is computed every log interval of the training, to rank the checkpoints.
+        """
+        accuracies = []
+
+        for step in range(min(num_batches, validation_size // self.batch_size)):
+            offset = step * self.batch_size
+            feed_dict = {self.x_input: validation_data[0][offset:(offset + self.batch_size)],
+                         self.y_input: validation_data[1][offset:(offset + self.batch_size)],
+                         self.state: np.zeros([self.batch_size, self.cell_size]), self.p_keep: 1.0}
+            accuracies.append(sess.run(self.accuracy, feed_dict=feed_dict))
+
+        return float(np.mean(accuracies)) if accuracies else None
+
     @staticmethod
-    def predict(batch_size, cell_size, dropout_rate, num_classes, test_data, test_size, checkpoint_path, result_path):
+    def predict(batch_size, cell_size, dropout_rate, num_classes, test_data, test_size, checkpoint_path, result_path,
+                session_config=None):
         """Classifies the data whether there is an intrusion or none
 
         Parameter
@@ -293,6 +361,8 @@ class GruSoftmax:
           The path where to save the trained model.
         result_path : str
           The path where to save the actual and predicted classes array.
+        session_config : tf.ConfigProto
+          The configuration of the session, e.g. from `utils.session.session_config()`. None for the default.
         """
 
         # create initial RNN state array, filled with zeros
@@ -301,10 +371,12 @@ class GruSoftmax:
         # cast the array to float32
         initial_state = initial_state.astype(np.float32)
 
-        # variables initializer
-        init_op = tf.group(tf.global_variables_initializer(), tf.local_variables_initializer())
+        # restore the checkpoint in a graph of its own, so that finalizing it leaves the default graph usable
+        graph = tf.Graph()
 
-        with tf.Session() as sess:
+        with graph.as_default(), tf.Session(graph=graph, config=session_config) as sess:
+            # variables initializer
+            init_op = tf.group(tf.global_variables_initializer(), tf.local_variables_initializer())
             sess.run(init_op)
 
             checkpoint = tf.train.get_checkpoint_state(checkpoint_path)
@@ -314,44 +386,45 @@ class GruSoftmax:
                 saver.restore(sess, tf.train.latest_checkpoint(checkpoint_path))
                 print('Loaded model from {}'.format(tf.train.latest_checkpoint(checkpoint_path)))
 
+            # resolve the tensors once, and freeze the graph so that no op is added per batch
+            prediction_tensor = sess.graph.get_tensor_by_name('accuracy/Softmax:0')
+            accuracy_tensor = sess.graph.get_tensor_by_name('accuracy/accuracy/Mean:0')
+            sess.graph.finalize()
+
+            testing_results = ResultsWriter(result_path=result_path, phase='testing', model_name='gru_softmax',
+                                            num_classes=num_classes)
+
+            step = 0
+
             try:
-                for step in range(test_size // batch_size):
+                # score every row, the last batch having the remaining test_size % batch_size rows if any
+                for step in range((test_size + batch_size - 1) // batch_size):
 
-                    offset = (step * batch_size) % test_size
+                    offset = step * batch_size
                     test_example_batch = test_data[0][offset:(offset + batch_size)]
                     test_label_batch = test_data[1][offset:(offset + batch_size)]
 
                     # one-hot encode labels according to NUM_CLASSES
-                    label_onehot = tf.one_hot(test_label_batch, num_classes, 1.0, 0.0)
-                    y_onehot = sess.run(label_onehot)
+                    y_onehot = one_hot(labels=test_label_batch, num_classes=num_classes, on_value=1.0, off_value=0.0)
 
                     # dictionary for input values for the tensors
-                    feed_dict = {'input/x_input:0': test_example_batch,
-                                 'initial_state:0': initial_state.astype(np.float32),
-                                 'p_keep:0': dropout_rate}
+                    feed_dict = {'input/x_input:0': test_example_batch, 'input/y_input:0': test_label_batch,
+                                 'initial_state:0': initial_state[:len(test_label_batch)], 'p_keep:0': dropout_rate}
 
-                    # get the tensor for classification
-                    softmax_tensor = sess.graph.get_tensor_by_name('accuracy/Softmax:0')
-                    predictions = sess.run(softmax_tensor, feed_dict=feed_dict)
-
-                    # add key, value pair for labels
-                    feed_dict['input/y_input:0'] = test_label_batch
-
-                    # get the tensor for calculating the classification accuracy
-                    accuracy_tensor = sess.graph.get_tensor_by_name('accuracy/accuracy/Mean:0')
-                    accuracy = sess.run(accuracy_tensor, feed_dict=feed_dict)
+                    # get the softmax predictions and the classification accuracy in a single run
+                    predictions, accuracy = sess.run([prediction_tensor, accuracy_tensor], feed_dict=feed_dict)
 
                     if step % 100 == 0 and step > 0:
                         print('step [{}] test -- accuracy : {}'.format(step, accuracy))
 
-                    GruSoftmax.save_labels(predictions=predictions, actual=y_onehot, result_path=result_path, step=step,
-                                           phase='testing')
+                    testing_results.write(step=step, predictions=predictions, actual=y_onehot)
 
             except tf.errors.OutOfRangeError:
                 print('EOF')
             except KeyboardInterrupt:
                 print('KeyboardInterrupt')
             finally:
+                testing_results.close()
                 print('EOF -- testing done at step {}'.format(step))
 
     @staticmethod
@@ -365,30 +438,3 @@ class GruSoftmax:
             tf.summary.scalar('max', tf.reduce_max(var))
             tf.summary.scalar('min', tf.reduce_min(var))
             tf.summary.histogram('histogram', var)
-
-    @staticmethod
-    def save_labels(predictions, actual, result_path, step, phase):
-        """Saves the actual and predicted labels to a NPY file
-
-        Parameter
-        ---------
-        predictions : numpy.ndarray
-          The NumPy array containing the predicted labels.
-        actual : numpy.ndarray
-          The NumPy array containing the actual labels.
-        result_path : str
-          The path where to save the concatenated actual and predicted labels.
-        step : int
-          The time step for the NumPy arrays.
-        phase : str
-          The phase for which the predictions is, i.e. training/validation/testing.
-        """
-
-        # Concatenate the predicted and actual labels
-        labels = np.concatenate((predictions, actual), axis=1)
-
-        if not os.path.exists(path=result_path):
-            os.mkdir(path=result_path)
-
-        # save every labels array to NPY file
-        np.save(file=os.path.join(result_path, '{}-gru_softmax-{}.npy'.format(phase, step)), arr=labels)
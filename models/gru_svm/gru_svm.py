@@ -21,7 +21,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-__version__ = '0.3.11'
+__version__ = '0.3.12'
 __author__ = 'Abien Fred Agarap'
 
 import numpy as np
@@ -29,12 +29,22 @@ import os
 import sys
 import tensorflow as tf
 import time
+from models.projected_gru import ProjectedGRUCell, projected_inputs
+from utils.checkpoint import AsyncCheckpointer
+from utils.data import one_hot
+from utils.graph import freeze_graph, load_frozen_graph
+from utils.prefetch import BatchPrefetcher
+from utils.results import ResultsWriter
+
+# the number of validation batches whose accuracy ranks the checkpoints
+VALIDATION_BATCHES = 4
 
 
 class GruSvm:
     """Implementation of the GRU+SVM model using TensorFlow"""
 
-    def __init__(self, alpha, batch_size, cell_size, dropout_rate, num_classes, sequence_length, svm_c):
+    def __init__(self, alpha, batch_size, cell_size, dropout_rate, num_classes, sequence_length, svm_c,
+                 input_mode='onehot', session_config=None):
         """Initialize the GRU+SVM class
 
         Parameter
@@ -53,6 +63,11 @@ class GruSvm:
           The number of features in a dataset.
         svm_c : float
           The SVM penalty parameter C.
+        input_mode : str
+          The input of the GRU: 'onehot' to multiply the one-hot encoded features by its input kernels,
+          'projected' to gather the rows of its input kernels instead, with a `ProjectedGRUCell`.
+        session_config : tf.ConfigProto
+          The configuration of the sessions, e.g. from `utils.session.session_config()`. None for the default.
         """
         self.alpha = alpha
         self.batch_size = batch_size
@@ -60,6 +75,8 @@ class GruSvm:
         self.dropout_rate = dropout_rate
         self.num_classes = num_classes
         self.sequence_length = sequence_length
+        self.input_mode = input_mode
+        self.session_config = session_config
         self.svm_c = svm_c
 
         def __graph__():
@@ -68,9 +85,6 @@ class GruSvm:
                 # [BATCH_SIZE, SEQUENCE_LENGTH]
                 x_input = tf.placeholder(dtype=tf.uint8, shape=[None, self.sequence_length], name='x_input')
 
-                # [BATCH_SIZE, SEQUENCE_LENGTH, 10]
-                x_onehot = tf.one_hot(indices=x_input, depth=10, on_value=1.0, off_value=0.0, name='x_onehot')
-
                 # [BATCH_SIZE]
                 y_input = tf.placeholder(dtype=tf.uint8, shape=[None], name='y_input')
 
@@ -83,12 +97,24 @@ class GruSvm:
             p_keep = tf.placeholder(dtype=tf.float32, name='p_keep')
             learning_rate = tf.placeholder(dtype=tf.float32, name='learning_rate')
 
-            cell = tf.contrib.rnn.GRUCell(self.cell_size)
-            drop_cell = tf.contrib.rnn.DropoutWrapper(cell, input_keep_prob=p_keep)
+            if self.input_mode == 'projected':
+                # [BATCH_SIZE, SEQUENCE_LENGTH, 2], the symbols and their input dropout scales
+                x_projected = projected_inputs(x_input=x_input, p_keep=p_keep)
+                cell = ProjectedGRUCell(num_units=self.cell_size, depth=10)
+
+                # outputs: [BATCH_SIZE, SEQUENCE_LENGTH, CELL_SIZE]
+                # states: [BATCH_SIZE, CELL_SIZE]
+                outputs, states = tf.nn.dynamic_rnn(cell, x_projected, initial_state=state, dtype=tf.float32)
+            else:
+                # [BATCH_SIZE, SEQUENCE_LENGTH, 10]
+                x_onehot = tf.one_hot(indices=x_input, depth=10, on_value=1.0, off_value=0.0, name='x_onehot')
 
-            # outputs: [BATCH_SIZE, SEQUENCE_LENGTH, CELL_SIZE]
-            # states: [BATCH_SIZE, CELL_SIZE]
-            outputs, states = tf.nn.dynamic_rnn(drop_cell, x_onehot, initial_state=state, dtype=tf.float32)
+                cell = tf.contrib.rnn.GRUCell(self.cell_size)
+                drop_cell = tf.contrib.rnn.DropoutWrapper(cell, input_keep_prob=p_keep)
+
+                # outputs: [BATCH_SIZE, SEQUENCE_LENGTH, CELL_SIZE]
+                # states: [BATCH_SIZE, CELL_SIZE]
+                outputs, states = tf.nn.dynamic_rnn(drop_cell, x_onehot, initial_state=state, dtype=tf.float32)
 
             states = tf.identity(states, name='H')
 
@@ -111,12 +137,14 @@ class GruSvm:
             with tf.name_scope('svm'):
                 regularization_loss = 0.5 * tf.reduce_sum(tf.square(weight))
                 hinge_loss = tf.reduce_sum(
-                    tf.square(tf.maximum(tf.zeros([self.batch_size, self.num_classes]), 1 - y_onehot * output)))
+                    tf.square(tf.maximum(tf.zeros_like(output), 1 - y_onehot * output)))
                 with tf.name_scope('loss'):
                     loss = regularization_loss + self.svm_c * hinge_loss
             tf.summary.scalar('loss', loss)
 
-            optimizer = tf.train.AdamOptimizer(learning_rate=learning_rate).minimize(loss)
+            # keep the optimizer, so that its slots may be reused to apply other gradients, e.g. averaged ones
+            adam_optimizer = tf.train.AdamOptimizer(learning_rate=learning_rate)
+            optimizer = adam_optimizer.minimize(loss)
 
             with tf.name_scope('accuracy'):
                 predicted_class = tf.sign(output)
@@ -137,6 +165,7 @@ class GruSvm:
             self.p_keep = p_keep
             self.loss = loss
             self.optimizer = optimizer
+            self.adam_optimizer = adam_optimizer
             self.state = state
             self.states = states
             self.learning_rate = learning_rate
@@ -149,7 +178,8 @@ class GruSvm:
         sys.stdout.write('</log>\n')
 
     def train(self, checkpoint_path, log_path, model_name, epochs, train_data, train_size, validation_data,
-              validation_size, result_path):
+              validation_size, result_path, shuffle=False, prefetch_capacity=8, log_interval=100,
+              keep_last=5, keep_interval=None, keep_best=1):
         """Trains the model
 
         Parameter
@@ -172,12 +202,27 @@ class GruSvm:
           The size of `validation_data`.
         result_path : str
           The path where to save the actual and predicted classes array.
+        shuffle : bool
+          If True, the order of the training batches is shuffled for every epoch.
+        prefetch_capacity : int
+          The maximum number of training batches prepared ahead of the training steps.
+        log_interval : int
+          The number of steps between the computations of the summaries, loss, and accuracy.
+        keep_last : int
+          The number of latest checkpoints to keep.
+        keep_interval : float
+          The number of seconds between the checkpoints kept regardless of the others. None to disable.
+        keep_best : int
+          The number of checkpoints to keep with the best accuracy on the first VALIDATION_BATCHES
+          batches of `validation_data`, computed every `log_interval` steps.
         """
 
         if not os.path.exists(path=checkpoint_path):
             os.mkdir(path=checkpoint_path)
 
-        saver = tf.train.Saver(max_to_keep=1000)
+        # snapshot the variables, and write the checkpoints on a background thread
+        checkpointer = AsyncCheckpointer(save_path=os.path.join(checkpoint_path, model_name), keep_last=keep_last,
+                                         keep_interval=keep_interval, keep_best=keep_best)
 
         # initialize H (current_state) with values of zeros
         current_state = np.zeros([self.batch_size, self.cell_size])
@@ -193,7 +238,7 @@ class GruSvm:
         validation_writer = tf.summary.FileWriter(logdir=os.path.join(log_path, timestamp + '-validation'),
                                                   graph=tf.get_default_graph())
 
-        with tf.Session() as sess:
+        with tf.Session(config=self.session_config) as sess:
             sess.run(init_op)
 
             checkpoint = tf.train.get_checkpoint_state(checkpoint_path)
@@ -202,51 +247,73 @@ class GruSvm:
                 saver = tf.train.import_meta_graph(checkpoint.model_checkpoint_path + '.meta')
                 saver.restore(sess, tf.train.latest_checkpoint(checkpoint_path))
 
-            try:
-                for step in range(epochs * train_size // self.batch_size):
+            # slice and stage the batches on a background thread, ahead of the training steps
+            # e.g. step = 0, batch_size = 256, train_size = 1898240
+            # (0 * 256) % 1898240 = 0
+            # [offset:(offset + batch_size)] = [0:256]
+            batches = BatchPrefetcher(features=train_data[0], labels=train_data[1], batch_size=self.batch_size,
+                                      num_steps=epochs * train_size // self.batch_size, shuffle=shuffle,
+                                      capacity=prefetch_capacity, dtype=np.uint8)
+            wait_time = 0.0
+
+            # buffer the predicted and actual labels, and append them to one file per phase
+            training_results = ResultsWriter(result_path=result_path, phase='training', model_name='gru_svm',
+                                             num_classes=self.num_classes)
 
-                    # set the value for slicing
-                    # e.g. step = 0, batch_size = 256, train_size = 1898240
-                    # (0 * 256) % 1898240 = 0
-                    # [offset:(offset + batch_size)] = [0:256]
-                    offset = (step * self.batch_size) % train_size
-                    train_example_batch = train_data[0][offset:(offset + self.batch_size)]
-                    train_label_batch = train_data[1][offset:(offset + self.batch_size)]
+            try:
+                for step, (train_example_batch, train_label_batch) in enumerate(batches):
 
                     # dictionary for key-value pair input for training
                     feed_dict = {self.x_input: train_example_batch, self.y_input: train_label_batch,
                                  self.state: current_state,
                                  self.learning_rate: self.alpha, self.p_keep: self.dropout_rate}
 
-                    train_summary, _, predictions, actual, next_state = sess.run([self.merged, self.optimizer,
-                                                                                  self.predicted_class, self.y_onehot,
-                                                                                  self.states],
-                                                                                 feed_dict=feed_dict)
+                    # fetch the summaries, loss and accuracy in the same run as the training op,
+                    # only every log_interval steps and at step 0
+                    if step % log_interval == 0:
+                        train_summary, _, predictions, actual, next_state, train_loss, train_accuracy = \
+                            sess.run([self.merged, self.optimizer, self.predicted_class, self.y_onehot, self.states,
+                                      self.loss, self.accuracy], feed_dict=feed_dict)
 
-                    # Display training loss and accuracy every 100 steps and at step 0
-                    if step % 100 == 0:
-                        # get train loss and accuracy
-                        train_loss, train_accuracy = sess.run([self.loss, self.accuracy], feed_dict=feed_dict)
+                        # get the time spent waiting for input since the last display
+                        input_wait = (batches.wait_time - wait_time) * 1000 / (log_interval if step > 0 else 1)
+                        wait_time = batches.wait_time
 
                         # display train loss and accuracy
-                        print('step [{}] train -- loss : {}, accuracy : {}'.format(step, train_loss, train_accuracy))
+                        print('step [{}] train -- loss : {}, accuracy : {}, input wait : {:.3f} ms/step'.format(
+                            step, train_loss, train_accuracy, input_wait))
 
                         # write the train summary
                         train_writer.add_summary(train_summary, step)
 
                         # save the model at current step
-                        saver.save(sess=sess, save_path=os.path.join(checkpoint_path, model_name), global_step=step)
+                        checkpointer.save(sess=sess, step=step,
+                                          metric=self.validation_accuracy(sess, validation_data, validation_size))
+                    else:
+                        # the predictions are still fetched for the results file, and the states for the next step,
+                        # but the one-hot labels are computed from the fed labels instead
+                        _, predictions, next_state = sess.run([self.optimizer, self.predicted_class, self.states],
+                                                              feed_dict=feed_dict)
+                        actual = one_hot(labels=train_label_batch, num_classes=self.num_classes, on_value=1.0,
+                                         off_value=-1.0)
 
                     current_state = next_state
 
-                    self.save_labels(predictions=predictions, actual=actual, result_path=result_path, step=step,
-                                     phase='training')
+                    training_results.write(step=step, predictions=predictions, actual=actual)
             except KeyboardInterrupt:
                 print('Training interrupted at {}'.format(step))
+                training_results.close()
+                checkpointer.close()
                 os._exit(1)
             finally:
+                batches.close()
+                training_results.close()
+                checkpointer.close()
                 print('EOF -- Training done at step {}'.format(step))
 
+                validation_results = ResultsWriter(result_path=result_path, phase='validation', model_name='gru_svm',
+                                                   num_classes=self.num_classes)
+
                 for step in range(epochs * validation_size // self.batch_size):
 
                     offset = (step * self.batch_size) % validation_size
@@ -257,12 +324,11 @@ class GruSvm:
                     feed_dict = {self.x_input: test_example_batch, self.y_input: test_label_batch,
                                  self.state: np.zeros([self.batch_size, self.cell_size]), self.p_keep: 1.0}
 
-                    validation_summary, predictions, actual, validation_loss, validation_accuracy = \
-                        sess.run([self.merged, self.predicted_class, self.y_onehot, self.loss, self.accuracy],
-                                 feed_dict=feed_dict)
-
-                    # Display validation loss and accuracy every 100 steps
-                    if step % 100 == 0 and step > 0:
+                    # Display validation loss and accuracy every log_interval steps
+                    if step % log_interval == 0 and step > 0:
+                        validation_summary, predictions, actual, validation_loss, validation_accuracy = \
+                            sess.run([self.merged, self.predicted_class, self.y_onehot, self.loss, self.accuracy],
+                                     feed_dict=feed_dict)
 
                         # add the validation summary
                         validation_writer.add_summary(validation_summary, step)
@@ -270,14 +336,33 @@ class GruSvm:
                         # display validation loss and accuracy
                         print('step [{}] validation -- loss : {}, accuracy : {}'.format(step, validation_loss,
                                                                                         validation_accuracy))
+                    else:
+                        predictions, actual = sess.run([self.predicted_class, self.y_onehot], feed_dict=feed_dict)
 
-                    self.save_labels(predictions=predictions, actual=actual, result_path=result_path, step=step,
-                                     phase='validation')
+                    validation_results.write(step=step, predictions=predictions, actual=actual)
 
+                validation_results.close()
                 print('EOF -- Testing done at step {}'.format(step))
 
+    def validation_accuracy(self, sess, validation_data, validation_size, num_batches=VALIDATION_BATCHES):
+        """Returns the accuracy on the first `num_batches` batches of the validation dataset, or None if empty
+
+        It is computed every log interval of the training, to rank the checkpoints.
+        """
+        accuracies = []
+
+        for step in range(min(num_batches, validation_size // self.batch_size)):
+            offset = step * self.batch_size
+            feed_dict = {self.x_input: validation_data[0][offset:(offset + self.batch_size)],
+                         self.y_input: validation_data[1][offset:(offset + self.batch_size)],
+                         self.state: np.zeros([self.batch_size, self.cell_size]), self.p_keep: 1.0}
+            accuracies.append(sess.run(self.accuracy, feed_dict=feed_dict))
+
+        return float(np.mean(accuracies)) if accuracies else None
+
     @staticmethod
-    def predict(batch_size, cell_size, dropout_rate, num_classes, test_data, test_size, checkpoint_path, result_path):
+    def predict(batch_size, cell_size, dropout_rate, num_classes, test_data, test_size, checkpoint_path, result_path,
+                frozen_graph=None, session_config=None):
         """Classifies the data whether there is an intrusion or none
 
         Parameter
@@ -287,7 +372,7 @@ class GruSvm:
         cell_size : int
           The size of cell state.
         dropout_rate : float
-          The dropout rate to be used.
+          The keep probability fed to the dropout, 1.0 to disable it at inference.
         num_classes : int
           The number of classes in a dataset.
         test_data : numpy.ndarray
@@ -298,6 +383,11 @@ class GruSvm:
           The path where to save the trained model.
         result_path : str
           The path where to save the actual and predicted classes array.
+        frozen_graph : str
+          The path of the frozen graph (*.pb) saved by `GruSvm.export()`, to load instead of the checkpoint.
+          Its dropout is disabled, so `dropout_rate` is not used.
+        session_config : tf.ConfigProto
+          The configuration of the session, e.g. from `utils.session.session_config()`. None for the default.
         """
 
         # create initial RNN state array, filled with zeros
@@ -306,58 +396,93 @@ class GruSvm:
         # cast the array to float32
         initial_state = initial_state.astype(np.float32)
 
-        # variables initializer
-        init_op = tf.group(tf.global_variables_initializer(), tf.local_variables_initializer())
+        start_time = time.time()
 
-        with tf.Session() as sess:
-            sess.run(init_op)
+        # load the inference graph, or restore the checkpoint in a graph of its own,
+        # so that finalizing it leaves the default graph usable
+        graph = load_frozen_graph(frozen_graph) if frozen_graph else tf.Graph()
 
-            # get the checkpoint file
-            checkpoint = tf.train.get_checkpoint_state(checkpoint_path)
+        with graph.as_default(), tf.Session(graph=graph, config=session_config) as sess:
+            if frozen_graph:
+                print('Loaded model from {}'.format(frozen_graph))
+            else:
+                # variables initializer
+                init_op = tf.group(tf.global_variables_initializer(), tf.local_variables_initializer())
+                sess.run(init_op)
 
-            if checkpoint and checkpoint.model_checkpoint_path:
-                # if checkpoint file exists, load the saved meta graph
-                saver = tf.train.import_meta_graph(checkpoint.model_checkpoint_path + '.meta')
-                # and restore previously saved variables
-                saver.restore(sess, tf.train.latest_checkpoint(checkpoint_path))
-                print('Loaded model from {}'.format(tf.train.latest_checkpoint(checkpoint_path)))
+                # get the checkpoint file
+                checkpoint = tf.train.get_checkpoint_state(checkpoint_path)
+
+                if checkpoint and checkpoint.model_checkpoint_path:
+                    # if checkpoint file exists, load the saved meta graph
+                    saver = tf.train.import_meta_graph(checkpoint.model_checkpoint_path + '.meta')
+                    # and restore previously saved variables
+                    saver.restore(sess, tf.train.latest_checkpoint(checkpoint_path))
+                    print('Loaded model from {}'.format(tf.train.latest_checkpoint(checkpoint_path)))
+
+            # resolve the tensors once, and freeze the graph so that no op is added per batch
+            prediction_tensor = sess.graph.get_tensor_by_name('accuracy/prediction:0')
+            accuracy_tensor = sess.graph.get_tensor_by_name('accuracy/accuracy/Mean:0')
+            sess.graph.finalize()
+
+            print('Load time : {:.3f}s'.format(time.time() - start_time))
+
+            testing_results = ResultsWriter(result_path=result_path, phase='testing', model_name='gru_svm',
+                                            num_classes=num_classes)
+            run_time = 0.0
+            step = 0
 
             try:
-                for step in range(test_size // batch_size):
+                # score every row, the last batch having the remaining test_size % batch_size rows if any
+                for step in range((test_size + batch_size - 1) // batch_size):
 
-                    offset = (step * batch_size) % test_size
+                    offset = step * batch_size
                     test_features_batch = test_data[0][offset:(offset + batch_size)]
                     test_labels_batch = test_data[1][offset:(offset + batch_size)]
 
                     # one-hot encode labels according to NUM_CLASSES
-                    label_onehot = tf.one_hot(test_labels_batch, num_classes, 1.0, -1.0)
-                    y_onehot = sess.run(label_onehot)
+                    y_onehot = one_hot(labels=test_labels_batch, num_classes=num_classes, on_value=1.0, off_value=-1.0)
 
                     # dictionary for input values for the tensors
-                    feed_dict = {'input/x_input:0': test_features_batch,
-                                 'initial_state:0': initial_state, 'p_keep:0': dropout_rate}
-
-                    # get the tensor for classification
-                    prediction_tensor = sess.graph.get_tensor_by_name('accuracy/prediction:0')
-                    predictions = sess.run(prediction_tensor, feed_dict=feed_dict)
+                    feed_dict = {'input/x_input:0': test_features_batch, 'input/y_input:0': test_labels_batch,
+                                 'initial_state:0': initial_state[:len(test_labels_batch)]}
 
-                    # add key, value pair for labels
-                    feed_dict['input/y_input:0'] = test_labels_batch
+                    if not frozen_graph:
+                        feed_dict['p_keep:0'] = dropout_rate
 
-                    # get the tensor for calculating the classification accuracy
-                    accuracy_tensor = sess.graph.get_tensor_by_name('accuracy/accuracy/Mean:0')
-                    accuracy = sess.run(accuracy_tensor, feed_dict=feed_dict)
+                    # get the predictions and the classification accuracy in a single run
+                    run_start_time = time.time()
+                    predictions, accuracy = sess.run([prediction_tensor, accuracy_tensor], feed_dict=feed_dict)
+                    run_time += time.time() - run_start_time
 
                     if step % 100 == 0 and step > 0:
                         print('step [{}] test -- accuracy : {}'.format(step, accuracy))
 
-                    GruSvm.save_labels(predictions=predictions, actual=y_onehot, result_path=result_path,
-                                       phase='testing', step=step)
+                    testing_results.write(step=step, predictions=predictions, actual=y_onehot)
 
             except KeyboardInterrupt:
                 print('KeyboardInterrupt at step {}'.format(step))
             finally:
+                testing_results.close()
                 print('Done classifying at step {}'.format(step))
+                print('Latency : {:.3f} ms/batch'.format(run_time * 1000 / (step + 1)))
+
+    @staticmethod
+    def export(checkpoint_path, frozen_graph_path):
+        """Exports the latest checkpoint as a frozen inference graph
+
+        The graph keeps only the ops of the predictions and the accuracy, with the
+        trained variables as constants and the dropout keep probability fixed to 1.0.
+
+        Parameter
+        ---------
+        checkpoint_path : str
+          The path where the trained model is saved.
+        frozen_graph_path : str
+          The path of the frozen graph (*.pb) to save.
+        """
+        freeze_graph(checkpoint_path=checkpoint_path, output_names=['accuracy/prediction', 'accuracy/accuracy/Mean'],
+                     frozen_graph_path=frozen_graph_path, constants={'p_keep': 1.0})
 
     @staticmethod
     def variable_summaries(var):
@@ -370,31 +495,3 @@ class GruSvm:
             tf.summary.scalar('max', tf.reduce_max(var))
             tf.summary.scalar('min', tf.reduce_min(var))
             tf.summary.histogram('histogram', var)
-
-    @staticmethod
-    def save_labels(predictions, actual, result_path, step, phase):
-        """Saves the actual and predicted labels to a NPY file
-
-        Parameter
-        ---------
-        predictions : numpy.ndarray
-          The NumPy array containing the predicted labels.
-        actual : numpy.ndarray
-          The NumPy array containing the actual labels.
-        result_path : str
-          The path where to save the concatenated actual and predicted labels.
-        step : int
-          The time step for the NumPy arrays.
-        phase : str
-          The phase for which the predictions is, i.e. training/validation/testing.
-        """
-
-        # Concatenate the predicted and actual labels
-        labels = np.concatenate((predictions, actual), axis=1)
-
-        # Create the result_path directory if it does not exist
-        if not os.path.exists(path=result_path):
-            os.mkdir(path=result_path)
-
-        # Save the labels array to NPY file
-        np.save(file=os.path.join(result_path, '{}-gru_svm-{}.npy'.format(phase, step)), arr=labels)
@@ -0,0 +1,223 @@
+# A Neural Network Architecture Combining Gated Recurrent Unit (GRU) and
+# Support Vector Machine (SVM) for Intrusion Detection in Network Traffic Data
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Forward pass of a trained GRU+SVM model in NumPy, for inference without TensorFlow"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import numpy as np
+import os
+import time
+from utils.data import one_hot
+from utils.results import ResultsWriter
+
+# the variables of the trained model, by the suffix of their name in the checkpoint
+VARIABLE_SUFFIXES = {'gates_kernel': 'gates/kernel', 'gates_bias': 'gates/bias',
+                     'candidate_kernel': 'candidate/kernel', 'candidate_bias': 'candidate/bias'}
+SVM_VARIABLES = {'weights': 'weights', 'biases': 'biases'}
+
+
+class NumpyGruSvm:
+    """Inference of the GRU+SVM model using NumPy
+
+    The features are one-hot encoded over `depth` values, so the input projection of the
+    GRU is a lookup of the input rows of its kernels, with their biases added ahead of time.
+    Only the recurrent projections are computed as matmuls, batched over the examples.
+
+    The predictions match those of `GruSvm.predict()` when its dropout is disabled, i.e. with
+    a keep probability of 1.0 or from a frozen graph.
+    """
+
+    def __init__(self, gates_kernel, gates_bias, candidate_kernel, candidate_bias, weights, biases):
+        """Initialize the NumpyGruSvm class
+
+        Parameter
+        ---------
+        gates_kernel : numpy.ndarray
+          The [depth + cell_size, 2 * cell_size] kernel of the reset and update gates.
+        gates_bias : numpy.ndarray
+          The [2 * cell_size] bias of the reset and update gates.
+        candidate_kernel : numpy.ndarray
+          The [depth + cell_size, cell_size] kernel of the candidate state.
+        candidate_bias : numpy.ndarray
+          The [cell_size] bias of the candidate state.
+        weights : numpy.ndarray
+          The [cell_size, num_classes] weights of the SVM.
+        biases : numpy.ndarray
+          The [num_classes] biases of the SVM.
+        """
+        self.variables = {'gates_kernel': gates_kernel, 'gates_bias': gates_bias,
+                          'candidate_kernel': candidate_kernel, 'candidate_bias': candidate_bias,
+                          'weights': weights, 'biases': biases}
+        variables = {name: np.asarray(value, dtype=np.float32) for name, value in self.variables.items()}
+
+        self.cell_size = variables['candidate_bias'].shape[0]
+        self.depth = variables['gates_kernel'].shape[0] - self.cell_size
+
+        # the input rows of the kernels come first, as the cell concatenates [inputs, state]
+        self.gates_table = variables['gates_kernel'][:self.depth] + variables['gates_bias']
+        self.gates_recurrent = variables['gates_kernel'][self.depth:]
+        self.candidate_table = variables['candidate_kernel'][:self.depth] + variables['candidate_bias']
+        self.candidate_recurrent = variables['candidate_kernel'][self.depth:]
+        self.weights = variables['weights']
+        self.biases = variables['biases']
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint_path):
+        """Loads the trained variables from the latest checkpoint in `checkpoint_path`
+
+        TensorFlow is only imported here, to read the checkpoint.
+        """
+        import tensorflow as tf
+
+        reader = tf.train.NewCheckpointReader(tf.train.latest_checkpoint(checkpoint_path))
+        names = reader.get_variable_to_shape_map().keys()
+
+        variables = {}
+        for variable, suffix in VARIABLE_SUFFIXES.items():
+            matches = [name for name in names if name.endswith(suffix)]
+            assert len(matches) == 1, 'Expected one variable ending with {}, found {}'.format(suffix, matches)
+            variables[variable] = reader.get_tensor(matches[0])
+        for variable, name in SVM_VARIABLES.items():
+            variables[variable] = reader.get_tensor(name)
+
+        return cls(**variables)
+
+    @classmethod
+    def load(cls, path):
+        """Loads the trained variables from a NPZ file saved by `save()`"""
+        with np.load(path) as variables:
+            return cls(**{name: variables[name] for name in variables.files})
+
+    def save(self, path):
+        """Saves the trained variables to a NPZ file"""
+        np.savez(path, **self.variables)
+
+    @classmethod
+    def from_weights_or_checkpoint(cls, checkpoint_path, numpy_weights=None):
+        """Loads the trained variables from `numpy_weights` if it exists, else from the checkpoint
+
+        The variables read from the checkpoint are saved to `numpy_weights` if given, for the later loads.
+        """
+        start_time = time.time()
+
+        if numpy_weights and os.path.exists(numpy_weights):
+            model = cls.load(numpy_weights)
+            print('Loaded model from {}'.format(numpy_weights))
+        else:
+            model = cls.from_checkpoint(checkpoint_path)
+            print('Loaded model from {}'.format(checkpoint_path))
+            if numpy_weights:
+                model.save(numpy_weights)
+                print('Saved the variables to {}'.format(numpy_weights))
+
+        print('Load time : {:.3f}s'.format(time.time() - start_time))
+
+        return model
+
+    def hidden_state(self, features, state=None):
+        """Returns the hidden state of the GRU at the last time step
+
+        Parameter
+        ---------
+        features : numpy.ndarray
+          The [batch_size, sequence_length] binned features, with values in [0, depth).
+        state : numpy.ndarray
+          The [batch_size, cell_size] initial state. Defaults to zeros.
+        """
+        features = np.asarray(features).astype(np.intp)
+
+        if state is None:
+            state = np.zeros([features.shape[0], self.cell_size], dtype=np.float32)
+
+        for step in range(features.shape[1]):
+            inputs = features[:, step]
+
+            # r, u = sigmoid([x, h] W_g + b_g), where sigmoid(x) = (tanh(x / 2) + 1) / 2
+            gates = self.gates_table[inputs] + np.dot(state, self.gates_recurrent)
+            gates = 0.5 * (np.tanh(0.5 * gates) + 1.0)
+            reset, update = gates[:, :self.cell_size], gates[:, self.cell_size:]
+
+            # c = tanh([x, r * h] W_c + b_c)
+            candidate = np.tanh(self.candidate_table[inputs] + np.dot(reset * state, self.candidate_recurrent))
+
+            state = update * state + (1.0 - update) * candidate
+
+        return state
+
+    def decision_function(self, features, state=None):
+        """Returns the SVM decision values h W + b of the features"""
+        return np.dot(self.hidden_state(features, state), self.weights) + self.biases
+
+    def predict(self, features, state=None):
+        """Returns the predicted classes sign(h W + b) of the features, as in `GruSvm`"""
+        return np.sign(self.decision_function(features, state))
+
+    def classify(self, batch_size, num_classes, test_data, test_size, result_path):
+        """Classifies the data whether there is an intrusion or none, as `GruSvm.predict()` does
+
+        Parameter
+        ---------
+        batch_size : int
+          The number of examples per batch.
+        num_classes : int
+          The number of classes in a dataset.
+        test_data : numpy.ndarray
+          The NumPy array testing dataset.
+        test_size : int
+          The size of `test_data`.
+        result_path : str
+          The path where to save the actual and predicted classes array.
+        """
+        testing_results = ResultsWriter(result_path=result_path, phase='testing', model_name='gru_svm',
+                                        num_classes=num_classes)
+        run_time = 0.0
+        step = 0
+
+        try:
+            # score every row, the last batch having the remaining test_size % batch_size rows if any
+            for step in range((test_size + batch_size - 1) // batch_size):
+
+                offset = step * batch_size
+                test_features_batch = test_data[0][offset:(offset + batch_size)]
+                test_labels_batch = np.asarray(test_data[1][offset:(offset + batch_size)]).astype(np.intp)
+
+                # one-hot encode labels according to NUM_CLASSES
+                y_onehot = one_hot(labels=test_labels_batch, num_classes=num_classes, on_value=1.0, off_value=-1.0)
+
+                run_start_time = time.time()
+                predictions = self.predict(test_features_batch)
+                run_time += time.time() - run_start_time
+
+                accuracy = np.mean(np.argmax(predictions, axis=1) == test_labels_batch)
+
+                if step % 100 == 0 and step > 0:
+                    print('step [{}] test -- accuracy : {}'.format(step, accuracy))
+
+                testing_results.write(step=step, predictions=predictions, actual=y_onehot)
+
+        except KeyboardInterrupt:
+            print('KeyboardInterrupt at step {}'.format(step))
+        finally:
+            testing_results.close()
+            print('Done classifying at step {}'.format(step))
+            print('Latency : {:.3f} ms/batch'.format(run_time * 1000 / (step + 1)))
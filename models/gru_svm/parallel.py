@@ -0,0 +1,319 @@
+# A Neural Network Architecture Combining Gated Recurrent Unit (GRU) and
+# Support Vector Machine (SVM) for Intrusion Detection in Network Traffic Data
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Synchronous data-parallel training of the GRU+SVM model over worker processes"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import multiprocessing
+import numpy as np
+import os
+import time
+
+
+def train_parallel(num_workers, model_options, train_dataset, validation_dataset, checkpoint_path, log_path,
+                   model_name, epochs, result_path, shuffle=False, log_interval=100, session_config=None, keep_last=5,
+                   keep_interval=None, keep_best=1):
+    """Trains the GRU+SVM model with synchronous data-parallel SGD over `num_workers` processes
+
+    Each worker memory-maps the training dataset, and trains a replica of the model on its
+    own contiguous shard, with batches of `model_options['batch_size']` rows. On every step,
+    the workers send their gradients to this process, which averages them and sends the
+    average back (an all-reduce through a star), so every replica applies the same update
+    and the variables stay in sync. The variables of rank 0 are broadcast before the first step.
+
+    The global batch is `num_workers` times the batch size of a worker, and one epoch is
+    `num_workers` times fewer steps than in `GruSvm.train()`.
+
+    Rank 0 saves the checkpoints and the summaries, writes the training results of its shard,
+    and runs the validation after training.
+
+    Parameter
+    ---------
+    num_workers : int
+      The number of worker processes.
+    model_options : dict
+      The keyword arguments of `GruSvm`, except `session_config`.
+    train_dataset : str
+      The path of the training dataset, a NPY file or a binary store.
+    validation_dataset : str
+      The path of the validation dataset.
+    checkpoint_path : str
+      The path where to save the trained model.
+    log_path : str
+      The path where to save the TensorBoard summaries.
+    model_name : str
+      The filename of the model to be saved.
+    epochs : int
+      The number of passes through the training dataset.
+    result_path : str
+      The path where to save the actual and predicted classes.
+    shuffle : bool
+      If True, the order of the batches of every shard is shuffled for every epoch.
+    log_interval : int
+      The number of steps between the displays of the loss and accuracy.
+    session_config : tf.ConfigProto
+      The configuration of the worker sessions. Defaults to dividing the cores between the workers.
+    keep_last : int
+      The number of latest checkpoints to keep.
+    keep_interval : float
+      The number of seconds between the checkpoints kept regardless of the others. None to disable.
+    keep_best : int
+      The number of checkpoints to keep with the best accuracy on the first validation batches,
+      computed every `log_interval` steps.
+    """
+    context = multiprocessing.get_context('spawn')
+
+    options = {'num_workers': num_workers, 'model_options': model_options, 'train_dataset': train_dataset,
+               'validation_dataset': validation_dataset, 'checkpoint_path': checkpoint_path, 'log_path': log_path,
+               'model_name': model_name, 'epochs': epochs, 'result_path': result_path, 'shuffle': shuffle,
+               'log_interval': log_interval, 'keep_last': keep_last, 'keep_interval': keep_interval,
+               'keep_best': keep_best,
+               'session_config': session_config.SerializeToString() if session_config is not None else None}
+
+    connections = []
+    workers = []
+
+    for rank in range(num_workers):
+        connection, worker_connection = context.Pipe()
+        worker = context.Process(target=run_worker, args=(rank, worker_connection, options),
+                                 name='gru-svm-worker-{}'.format(rank))
+        worker.start()
+        # close the end of the worker in this process, so that its connection gets EOF if the worker dies
+        worker_connection.close()
+        connections.append(connection)
+        workers.append(worker)
+
+    def receive(rank, pickled=False):
+        """Receives a message from a worker, raising if the worker has exited"""
+        try:
+            return connections[rank].recv() if pickled else connections[rank].recv_bytes()
+        except (EOFError, ConnectionError):
+            workers[rank].join(timeout=1)
+            raise RuntimeError('Worker {} exited with code {}'.format(rank, workers[rank].exitcode))
+
+    try:
+        # broadcast the number of steps and the initial variables of rank 0
+        num_steps = receive(0, pickled=True)
+        variables = receive(0)
+        for connection in connections[1:]:
+            connection.send_bytes(variables)
+
+        print('Training with {} workers for {} steps'.format(num_workers, num_steps))
+
+        start_time = time.time()
+        reduce_time = 0.0
+
+        for step in range(num_steps):
+            messages = [receive(rank) for rank in range(num_workers)]
+
+            reduce_start_time = time.time()
+
+            # average the gradients, followed by the loss and accuracy of every worker
+            average = np.frombuffer(messages[0], dtype=np.float32).copy()
+            for message in messages[1:]:
+                average += np.frombuffer(message, dtype=np.float32)
+            average /= num_workers
+
+            message = average.tobytes()
+            for connection in connections:
+                connection.send_bytes(message)
+
+            reduce_time += time.time() - reduce_start_time
+
+            if step % log_interval == 0:
+                elapsed_time = time.time() - start_time
+                print('step [{}] train -- loss : {}, accuracy : {}, steps/sec : {:.2f}, reduce : {:.3f} ms/step'
+                      .format(step, average[-2], average[-1], (step + 1) / elapsed_time,
+                              reduce_time * 1000 / (step + 1)))
+
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        print('Training interrupted')
+        for worker in workers:
+            worker.terminate()
+    except (RuntimeError, ConnectionError):
+        # a dead worker would block the others on the all-reduce forever
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        raise
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def run_worker(rank, connection, options):
+    """Trains a replica of the GRU+SVM model on the shard of the worker
+
+    Parameter
+    ---------
+    rank : int
+      The index of the worker, from 0 to NUM_WORKERS - 1.
+    connection : multiprocessing.Connection
+      The connection to the process averaging the gradients.
+    options : dict
+      The options of `train_parallel()`.
+    """
+    import tensorflow as tf
+    from models.gru_svm.gru_svm import GruSvm
+    from utils.checkpoint import AsyncCheckpointer
+    from utils.data import load_data
+    from utils.prefetch import BatchPrefetcher
+    from utils.results import ResultsWriter
+    from utils.session import session_config
+
+    num_workers = options['num_workers']
+    batch_size = options['model_options']['batch_size']
+    log_interval = options['log_interval']
+
+    # take the contiguous shard of the worker, as a multiple of the batch size
+    features, labels = load_data(dataset=options['train_dataset'], mmap=True)
+    shard_size = features.shape[0] // num_workers // batch_size * batch_size
+    features = features[(rank * shard_size):((rank + 1) * shard_size)]
+    labels = labels[(rank * shard_size):((rank + 1) * shard_size)]
+    num_steps = options['epochs'] * shard_size // batch_size
+
+    if options['session_config'] is not None:
+        config = tf.ConfigProto.FromString(options['session_config'])
+    else:
+        config = session_config(intra_op_threads=max(multiprocessing.cpu_count() // num_workers, 1),
+                                inter_op_threads=2)
+
+    model = GruSvm(session_config=config, **options['model_options'])
+
+    # compute the gradients of the replica, and apply the averaged gradients with the optimizer
+    # of the model, which reuses its slots instead of adding a second set to the checkpoints
+    variables = tf.trainable_variables()
+    gradients = [tf.convert_to_tensor(gradient) for gradient in tf.gradients(model.loss, variables)]
+    averaged_gradients = [tf.placeholder(dtype=tf.float32, shape=variable.get_shape()) for variable in variables]
+    apply_gradients = model.adam_optimizer.apply_gradients(zip(averaged_gradients, variables))
+
+    shapes = [variable.get_shape().as_list() for variable in variables]
+    sizes = [int(np.prod(shape)) for shape in shapes]
+
+    def unflatten(array):
+        return [part.reshape(shape) for part, shape in zip(np.split(array, np.cumsum(sizes)[:-1]), shapes)]
+
+    init_op = tf.group(tf.global_variables_initializer(), tf.local_variables_initializer())
+
+    with tf.Session(config=config) as sess:
+        sess.run(init_op)
+
+        if rank == 0:
+            connection.send(num_steps)
+            connection.send_bytes(np.concatenate([value.ravel() for value in sess.run(variables)])
+                                  .astype(np.float32).tobytes())
+            if not os.path.exists(path=options['checkpoint_path']):
+                os.mkdir(path=options['checkpoint_path'])
+            train_writer = tf.summary.FileWriter(logdir=os.path.join(options['log_path'], str(time.asctime()) +
+                                                                     '-training'), graph=sess.graph)
+            training_results = ResultsWriter(result_path=options['result_path'], phase='training',
+                                             model_name='gru_svm', num_classes=model.num_classes)
+            checkpointer = AsyncCheckpointer(save_path=os.path.join(options['checkpoint_path'],
+                                                                    options['model_name']),
+                                             keep_last=options['keep_last'], keep_interval=options['keep_interval'],
+                                             keep_best=options['keep_best'])
+            # the validation batches which rank the checkpoints
+            validation_data = load_data(dataset=options['validation_dataset'], mmap=True)
+        else:
+            initial_values = unflatten(np.frombuffer(connection.recv_bytes(), dtype=np.float32))
+            for variable, value in zip(variables, initial_values):
+                variable.load(value, sess)
+
+        batches = BatchPrefetcher(features=features, labels=labels, batch_size=batch_size, num_steps=num_steps,
+                                  shuffle=options['shuffle'], dtype=np.uint8, seed=rank)
+        current_state = np.zeros([batch_size, model.cell_size])
+        step = 0
+
+        try:
+            for step, (train_example_batch, train_label_batch) in enumerate(batches):
+                feed_dict = {model.x_input: train_example_batch, model.y_input: train_label_batch,
+                             model.state: current_state, model.p_keep: model.dropout_rate}
+
+                summarize = rank == 0 and step % log_interval == 0
+                fetches = [model.loss, model.accuracy, model.states, model.predicted_class, model.y_onehot]
+                results = sess.run(gradients + fetches + ([model.merged] if summarize else []), feed_dict=feed_dict)
+                gradient_values = results[:len(gradients)]
+                loss, accuracy, current_state, predictions, actual = results[len(gradients):len(gradients) + 5]
+
+                # all-reduce the gradients, along with the loss and accuracy
+                connection.send_bytes(np.concatenate([value.ravel() for value in gradient_values] + [[loss, accuracy]])
+                                      .astype(np.float32).tobytes())
+                average = np.frombuffer(connection.recv_bytes(), dtype=np.float32)
+
+                apply_feed_dict = dict(zip(averaged_gradients, unflatten(average[:-2])))
+                apply_feed_dict[model.learning_rate] = model.alpha
+                sess.run(apply_gradients, feed_dict=apply_feed_dict)
+
+                if rank == 0:
+                    training_results.write(step=step, predictions=predictions, actual=actual)
+                    if summarize:
+                        train_writer.add_summary(results[-1], step)
+                        checkpointer.save(sess=sess, step=step,
+                                          metric=model.validation_accuracy(sess, validation_data,
+                                                                           validation_data[0].shape[0]))
+        except KeyboardInterrupt:
+            return
+        finally:
+            batches.close()
+            if rank == 0:
+                training_results.close()
+
+        if rank == 0:
+            checkpointer.save(sess=sess, step=step,
+                              metric=model.validation_accuracy(sess, validation_data, validation_data[0].shape[0]))
+            checkpointer.close()
+            print('EOF -- Training done at step {}'.format(step))
+            validate(sess=sess, model=model, options=options)
+
+    connection.close()
+
+
+def validate(sess, model, options):
+    """Classifies the validation dataset with the trained replica, as `GruSvm.train()` does after training"""
+    from utils.data import load_data
+    from utils.results import ResultsWriter
+
+    features, labels = load_data(dataset=options['validation_dataset'], mmap=True)
+    batch_size = model.batch_size
+    validation_size = features.shape[0] // batch_size * batch_size
+
+    with ResultsWriter(result_path=options['result_path'], phase='validation', model_name='gru_svm',
+                       num_classes=model.num_classes) as validation_results:
+        step = 0
+        for step in range(validation_size // batch_size):
+            offset = step * batch_size
+            feed_dict = {model.x_input: np.asarray(features[offset:(offset + batch_size)], dtype=np.uint8),
+                         model.y_input: np.asarray(labels[offset:(offset + batch_size)], dtype=np.uint8),
+                         model.state: np.zeros([batch_size, model.cell_size]), model.p_keep: 1.0}
+
+            predictions, actual, accuracy = sess.run([model.predicted_class, model.y_onehot, model.accuracy],
+                                                     feed_dict=feed_dict)
+
+            if step % options['log_interval'] == 0 and step > 0:
+                print('step [{}] validation -- accuracy : {}'.format(step, accuracy))
+
+            validation_results.write(step=step, predictions=predictions, actual=actual)
+
+    print('EOF -- Testing done at step {}'.format(step))
@@ -0,0 +1,116 @@
+# GRU cell with a table lookup for the projection of one-hot inputs
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""GRU cell which gathers the rows of its input kernels, instead of multiplying one-hot inputs by them"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import tensorflow as tf
+
+# the modes of feeding the binned features to the GRU
+INPUT_MODES = ['onehot', 'projected']
+
+
+class ProjectedGRUCell(tf.contrib.rnn.RNNCell):
+    """GRU cell for inputs which are one of `depth` symbols
+
+    The cell computes the same recurrence as `tf.contrib.rnn.GRUCell` on one-hot inputs.
+    Since x W_x of a one-hot x is the row of W_x of its symbol, the input projections are
+    gathered from the input rows of the kernels, and only the recurrent projections are matmuls.
+
+    The variables have the names and shapes of the `GRUCell` variables under `scope`, i.e.
+    [depth + num_units, ...] kernels with the input rows first, so checkpoints of either cell
+    can be restored into the other.
+
+    The inputs of the cell are the [batch_size, 2] pairs (symbol, dropout scale) returned
+    for every time step by `projected_inputs()`.
+    """
+
+    def __init__(self, num_units, depth, scope='rnn/gru_cell'):
+        """Initialize the ProjectedGRUCell class
+
+        Parameter
+        ---------
+        num_units : int
+          The size of cell state.
+        depth : int
+          The number of symbols, i.e. the depth of the one-hot inputs.
+        scope : str
+          The variable scope of the GRUCell variables, as created by `tf.nn.dynamic_rnn`.
+        """
+        super(ProjectedGRUCell, self).__init__()
+        self._num_units = num_units
+        self._depth = depth
+
+        with tf.variable_scope(scope):
+            with tf.variable_scope('gates'):
+                self._gates_kernel = tf.get_variable('kernel', shape=[depth + num_units, 2 * num_units])
+                self._gates_bias = tf.get_variable('bias', shape=[2 * num_units],
+                                                   initializer=tf.constant_initializer(1.0))
+            with tf.variable_scope('candidate'):
+                self._candidate_kernel = tf.get_variable('kernel', shape=[depth + num_units, num_units])
+                self._candidate_bias = tf.get_variable('bias', shape=[num_units],
+                                                       initializer=tf.zeros_initializer())
+
+    @property
+    def state_size(self):
+        return self._num_units
+
+    @property
+    def output_size(self):
+        return self._num_units
+
+    def __call__(self, inputs, state, scope=None):
+        """Gated recurrent unit (GRU) with num_units cells, on the (symbol, dropout scale) inputs"""
+        symbols = tf.cast(inputs[:, 0], tf.int32)
+        scale = inputs[:, 1:]
+
+        # r, u = sigmoid([x, h] W_g + b_g), where x W_g is the row of the symbol
+        gates = tf.gather(self._gates_kernel[:self._depth], symbols) * scale
+        gates = tf.sigmoid(gates + tf.matmul(state, self._gates_kernel[self._depth:]) + self._gates_bias)
+        reset, update = tf.split(value=gates, num_or_size_splits=2, axis=1)
+
+        # c = tanh([x, r * h] W_c + b_c)
+        candidate = tf.gather(self._candidate_kernel[:self._depth], symbols) * scale
+        candidate = tf.tanh(candidate + tf.matmul(reset * state, self._candidate_kernel[self._depth:]) +
+                            self._candidate_bias)
+
+        new_state = update * state + (1 - update) * candidate
+        return new_state, new_state
+
+
+def projected_inputs(x_input, p_keep):
+    """Returns the [batch_size, sequence_length, 2] inputs of `ProjectedGRUCell`
+
+    The input dropout of `DropoutWrapper` on a one-hot input only matters for its non-zero
+    element, so it either zeroes the row of the symbol, or scales it by 1 / p_keep. The same
+    dropout is applied here with a mask of noise shape [batch_size, sequence_length, 1].
+
+    Parameter
+    ---------
+    x_input : tf.Tensor
+      The [batch_size, sequence_length] symbols.
+    p_keep : tf.Tensor
+      The keep probability of the input dropout.
+    """
+    symbols = tf.expand_dims(tf.cast(x_input, tf.float32), axis=2)
+    scale = tf.nn.dropout(tf.ones_like(symbols), keep_prob=p_keep)
+    return tf.concat([symbols, scale], axis=2)
@@ -0,0 +1,169 @@
+# A Neural Network Architecture Combining Gated Recurrent Unit (GRU) and
+# Support Vector Machine (SVM) for Intrusion Detection in Network Traffic Data
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Newton solver of the primal L2-SVM problem, over the chunks of a dataset"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import numpy as np
+import time
+from utils.data import one_hot
+
+CHUNK_SIZE = 65536
+
+# the step sizes tried by the line search, from the full Newton step
+STEP_SIZES = 0.5 ** np.arange(11)
+
+
+def solve_primal(features, labels, num_rows, num_classes, svm_c, chunk_size=CHUNK_SIZE, max_iterations=50,
+                 tolerance=1e-6):
+    """Minimizes the loss of `Svm`, 0.5 * ||W||^2 + C * sum(max(0, 1 - y * (x W + b))^2), with Newton's method
+
+    The loss is separable over the classes, so each column of W and b is solved on its own, as a
+    one-vs-rest problem of num_features + 1 unknowns. On every iteration, a pass over the chunks of
+    the dataset sums the gradient and the (generalized) Hessian over the examples within the margin,
+    the Newton step solves the small linear system, and a second pass evaluates the loss for a set
+    of step sizes at once, for a backtracking line search. Only one chunk is read at a time, so the
+    dataset may be memory-mapped.
+
+    Parameter
+    ---------
+    features : numpy.ndarray
+      The [N, num_features] features, or a `utils.data.FeatureView`.
+    labels : numpy.ndarray
+      The [N] labels.
+    num_rows : int
+      The number of rows of the dataset to train on.
+    num_classes : int
+      The number of classes in a dataset.
+    svm_c : float
+      The SVM penalty parameter.
+    chunk_size : int
+      The number of rows read at a time.
+    max_iterations : int
+      The maximum number of Newton iterations.
+    tolerance : float
+      The norm of the gradient, relative to its initial norm, under which the solver stops.
+
+    Returns
+    -------
+    weights : numpy.ndarray
+      The [num_features, num_classes] float32 weights.
+    biases : numpy.ndarray
+      The [num_classes] float32 biases.
+    """
+    num_features = features.shape[1]
+
+    # the bias is not regularized
+    regularizer = np.ones(num_features + 1)
+    regularizer[-1] = 0.0
+
+    # [num_classes, num_features + 1], the last column being the bias
+    theta = np.zeros([num_classes, num_features + 1])
+    initial_norm = None
+
+    start_time = time.time()
+
+    for iteration in range(max_iterations):
+        loss, gradient, hessian, num_active = newton_terms(features, labels, num_rows, num_classes, svm_c,
+                                                           theta, regularizer, chunk_size)
+        gradient_norm = np.sqrt(np.sum(np.square(gradient)))
+        initial_norm = initial_norm or max(gradient_norm, 1e-12)
+
+        print('iteration [{}] primal -- loss : {}, gradient norm : {}, within the margin : {}'.format(
+            iteration, loss.sum(), gradient_norm, num_active.tolist()))
+
+        if gradient_norm <= tolerance * initial_norm:
+            break
+
+        # the Newton step of each class, with a small ridge for a Hessian without examples within the margin
+        direction = np.stack([-np.linalg.solve(hessian[k] + 1e-10 * np.eye(num_features + 1), gradient[k])
+                              for k in range(num_classes)])
+
+        step_losses = line_losses(features, labels, num_rows, num_classes, svm_c, theta, direction, regularizer,
+                                  chunk_size)
+
+        # take the largest step which decreases the loss enough, i.e. the Armijo condition
+        slope = np.sum(gradient * direction, axis=1)
+        for k in range(num_classes):
+            sufficient = np.flatnonzero(step_losses[:, k] <= loss[k] + 1e-4 * STEP_SIZES * slope[k])
+            step_size = STEP_SIZES[sufficient[0]] if sufficient.size > 0 else STEP_SIZES[-1]
+            theta[k] += step_size * direction[k]
+
+    print('Solved in {:.3f}s'.format(time.time() - start_time))
+
+    return theta[:, :-1].T.astype(np.float32), theta[:, -1].astype(np.float32)
+
+
+def iter_chunks(features, labels, num_rows, num_classes, chunk_size):
+    """Yields the chunks of the features with a column of ones for the bias, and their one-hot labels of -1 and 1"""
+    for offset in range(0, num_rows, chunk_size):
+        end = min(offset + chunk_size, num_rows)
+        chunk = np.asarray(features[offset:end], dtype=np.float64)
+        chunk = np.hstack([chunk, np.ones([chunk.shape[0], 1])])
+        y = one_hot(labels=labels[offset:end], num_classes=num_classes, on_value=1.0, off_value=-1.0)
+        yield chunk, y.astype(np.float64)
+
+
+def newton_terms(features, labels, num_rows, num_classes, svm_c, theta, regularizer, chunk_size):
+    """Returns the loss, gradient, and Hessian of each class, and the number of examples within its margin"""
+    num_unknowns = theta.shape[1]
+    hinge = np.zeros(num_classes)
+    gradient = np.zeros([num_classes, num_unknowns])
+    hessian = np.zeros([num_classes, num_unknowns, num_unknowns])
+    num_active = np.zeros(num_classes, dtype=np.int64)
+
+    for chunk, y in iter_chunks(features, labels, num_rows, num_classes, chunk_size):
+        margins = 1.0 - y * np.dot(chunk, theta.T)
+
+        for k in range(num_classes):
+            active = margins[:, k] > 0
+            active_chunk = chunk[active]
+            active_margins = margins[active, k]
+
+            hinge[k] += np.dot(active_margins, active_margins)
+            gradient[k] -= 2.0 * svm_c * np.dot(active_chunk.T, y[active, k] * active_margins)
+            hessian[k] += 2.0 * svm_c * np.dot(active_chunk.T, active_chunk)
+            num_active[k] += active_chunk.shape[0]
+
+    loss = 0.5 * np.sum(regularizer * np.square(theta), axis=1) + svm_c * hinge
+    gradient += regularizer * theta
+    hessian += np.diag(regularizer)
+
+    return loss, gradient, hessian, num_active
+
+
+def line_losses(features, labels, num_rows, num_classes, svm_c, theta, direction, regularizer, chunk_size):
+    """Returns the [len(STEP_SIZES), num_classes] losses at theta + step_size * direction, in a single pass"""
+    hinge = np.zeros([len(STEP_SIZES), num_classes])
+
+    for chunk, y in iter_chunks(features, labels, num_rows, num_classes, chunk_size):
+        base = y * np.dot(chunk, theta.T)
+        delta = y * np.dot(chunk, direction.T)
+
+        for index, step_size in enumerate(STEP_SIZES):
+            hinge[index] += np.sum(np.square(np.maximum(1.0 - base - step_size * delta, 0.0)), axis=0)
+
+    regularization = [0.5 * np.sum(regularizer * np.square(theta + step_size * direction), axis=1)
+                      for step_size in STEP_SIZES]
+
+    return np.array(regularization) + svm_c * hinge
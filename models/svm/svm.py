@@ -29,12 +29,19 @@ import os
 import sys
 import tensorflow as tf
 import time
+from models.svm.primal import CHUNK_SIZE, solve_primal
+from utils.checkpoint import AsyncCheckpointer
+from utils.data import one_hot
+from utils.results import ResultsWriter
+
+# the number of validation batches whose accuracy ranks the checkpoints
+VALIDATION_BATCHES = 4
 
 
 class Svm:
     """Implementation of L2-Support Vector Machine using TensorFlow"""
 
-    def __init__(self, alpha, batch_size, svm_c, num_classes, num_features):
+    def __init__(self, alpha, batch_size, svm_c, num_classes, num_features, session_config=None):
         """Initialize the SVM class
 
         Parameter
@@ -49,12 +56,15 @@ class Svm:
           Number of classes in a dataset.
         num_features : int
           Number of features in a dataset.
+        session_config : tf.ConfigProto
+          The configuration of the sessions, e.g. from `utils.session.session_config()`. None for the default.
         """
         self.alpha = alpha
         self.batch_size = batch_size
         self.svm_c = svm_c
         self.num_classes = num_classes
         self.num_features = num_features
+        self.session_config = session_config
 
         def __graph__():
             """Building the inference graph"""
@@ -88,8 +98,7 @@ class Svm:
             with tf.name_scope('svm'):
                 regularization = 0.5 * tf.reduce_sum(tf.square(weight))
                 hinge_loss = tf.reduce_sum(
-                    tf.square(tf.maximum(tf.zeros([self.batch_size, self.num_classes]),
-                                         1 - tf.cast(y_onehot, tf.float32) * y_hat)))
+                    tf.square(tf.maximum(tf.zeros_like(y_hat), 1 - tf.cast(y_onehot, tf.float32) * y_hat)))
                 with tf.name_scope('loss'):
                     loss = regularization + self.svm_c * hinge_loss
             tf.summary.scalar('loss', loss)
@@ -117,13 +126,15 @@ class Svm:
             self.learning_rate = learning_rate
             self.accuracy = accuracy
             self.merged = merged
+            self.weight = weight
+            self.bias = bias
 
         sys.stdout.write('\n<log> Building Graph...')
         __graph__()
         sys.stdout.write('</log>\n')
 
     def train(self, checkpoint_path, log_path, model_name, epochs, result_path, train_data, train_size,
-              validation_data, validation_size):
+              validation_data, validation_size, log_interval=100, keep_last=5, keep_interval=None, keep_best=1):
         """Trains the SVM model
 
         Parameter
@@ -146,12 +157,23 @@ class Svm:
           The numpy.ndarray to be used as the validation dataset.
         validation_size : int
           The number of data in `validation_data`.
+        log_interval : int
+          The number of steps between the computations of the summaries, loss, and accuracy.
+        keep_last : int
+          The number of latest checkpoints to keep.
+        keep_interval : float
+          The number of seconds between the checkpoints kept regardless of the others. None to disable.
+        keep_best : int
+          The number of checkpoints to keep with the best accuracy on the first VALIDATION_BATCHES
+          batches of `validation_data`, computed every `log_interval` steps.
         """
 
         if not os.path.exists(checkpoint_path):
             os.mkdir(checkpoint_path)
 
-        saver = tf.train.Saver(max_to_keep=1000)
+        # snapshot the variables, and write the checkpoints on a background thread
+        checkpointer = AsyncCheckpointer(save_path=checkpoint_path + model_name, keep_last=keep_last,
+                                         keep_interval=keep_interval, keep_best=keep_best)
 
         # variable initializer
         init_op = tf.group(tf.local_variables_initializer(), tf.global_variables_initializer())
@@ -165,7 +187,7 @@ class Svm:
         # event file to contain TF graph summaries during validation
         validation_writer = tf.summary.FileWriter(log_path + timestamp + '-validation', graph=tf.get_default_graph())
 
-        with tf.Session() as sess:
+        with tf.Session(config=self.session_config) as sess:
 
             sess.run(init_op)
 
@@ -178,6 +200,10 @@ class Svm:
                 # restore the variables
                 saver.restore(sess, tf.train.latest_checkpoint(checkpoint_path))
 
+            # buffer the predicted and actual labels, and append them to one file per phase
+            training_results = ResultsWriter(result_path=result_path, phase='training', model_name='svm',
+                                             num_classes=self.num_classes)
+
             try:
                 for step in range(epochs * train_size // self.batch_size):
 
@@ -190,14 +216,13 @@ class Svm:
                     feed_dict = {self.x_input: train_feature_batch, self.y_input: train_label_batch,
                                  self.learning_rate: self.alpha}
 
-                    train_summary, _, predictions, actual = sess.run([self.merged, self.optimizer, self.predicted_class,
-                                                                      self.y_onehot], feed_dict=feed_dict)
-
-                    # display training accuracy and loss every 100 steps and at step 0
-                    if step % 100 == 0:
+                    # display training accuracy and loss every log_interval steps and at step 0
+                    if step % log_interval == 0:
 
-                        # get the train loss and train accuracy
-                        train_accuracy, train_loss = sess.run([self.accuracy, self.loss], feed_dict=feed_dict)
+                        # fetch the summaries, train loss and train accuracy in the same run as the training op
+                        train_summary, _, predictions, actual, train_accuracy, train_loss = \
+                            sess.run([self.merged, self.optimizer, self.predicted_class, self.y_onehot, self.accuracy,
+                                      self.loss], feed_dict=feed_dict)
 
                         # display the train loss and train accuracy
                         print('step [{}] train -- loss : {}, accuracy : {}'.format(step, train_loss, train_accuracy))
@@ -206,16 +231,29 @@ class Svm:
                         train_writer.add_summary(train_summary, step)
 
                         # save the model at the current time step
-                        saver.save(sess, checkpoint_path + model_name, global_step=step)
-
-                    self.save_labels(predictions=predictions, actual=actual, result_path=result_path, phase='training',
-                                     step=step)
+                        checkpointer.save(sess=sess, step=step,
+                                          metric=self.validation_accuracy(sess, validation_data, validation_size))
+                    else:
+                        # the predictions are still fetched for the results file,
+                        # but the one-hot labels are computed from the fed labels instead
+                        _, predictions = sess.run([self.optimizer, self.predicted_class], feed_dict=feed_dict)
+                        actual = one_hot(labels=train_label_batch, num_classes=self.num_classes, on_value=1.0,
+                                         off_value=-1.0)
+
+                    training_results.write(step=step, predictions=predictions, actual=actual)
             except KeyboardInterrupt:
                 print('Training interrupted at {}'.format(step))
+                training_results.close()
+                checkpointer.close()
                 os._exit(1)
             finally:
+                training_results.close()
+                checkpointer.close()
                 print('EOF -- training done at step {}'.format(step))
 
+                validation_results = ResultsWriter(result_path=result_path, phase='validation', model_name='svm',
+                                                   num_classes=self.num_classes)
+
                 for step in range(epochs * validation_size // self.batch_size):
 
                     offset = (step * self.batch_size) % validation_size
@@ -225,25 +263,113 @@ class Svm:
                     # dictionary for key-value pair input for validation
                     feed_dict = {self.x_input: validation_feature_batch, self.y_input: validation_label_batch}
 
-                    test_summary, predictions, actual, test_loss, test_accuracy = \
-                        sess.run([self.merged, self.predicted_class, self.y_onehot, self.loss, self.accuracy],
-                                 feed_dict=feed_dict)
-
-                    # display validation accuracy and loss every 100 steps
-                    if step % 100 == 0 and step > 0:
+                    # display validation accuracy and loss every log_interval steps
+                    if step % log_interval == 0 and step > 0:
+                        test_summary, predictions, actual, test_loss, test_accuracy = \
+                            sess.run([self.merged, self.predicted_class, self.y_onehot, self.loss, self.accuracy],
+                                     feed_dict=feed_dict)
 
                         # write the validation summary
                         validation_writer.add_summary(test_summary, step)
 
                         print('step [{}] validation -- loss : {}, accuracy : {}'.format(step, test_loss, test_accuracy))
+                    else:
+                        predictions, actual = sess.run([self.predicted_class, self.y_onehot], feed_dict=feed_dict)
 
-                    self.save_labels(predictions=predictions, actual=actual, result_path=result_path,
-                                     phase='validation', step=step)
+                    validation_results.write(step=step, predictions=predictions, actual=actual)
 
+                validation_results.close()
                 print('EOF -- Testing done at step {}'.format(step))
 
+    def train_primal(self, checkpoint_path, model_name, result_path, train_data, train_size, validation_data,
+                     validation_size, chunk_size=CHUNK_SIZE, max_iterations=50, tolerance=1e-6):
+        """Trains the SVM model by solving its loss with Newton's method, instead of Adam
+
+        The loss is the same as in `train()`, and the solution is saved as a checkpoint of the same
+        graph, so it is loaded by `predict()` as the model trained by `train()`.
+
+        Parameter
+        ---------
+        checkpoint_path : str
+          The directory where to save the trained model.
+        model_name : str
+          The filename of the trained model.
+        result_path : str
+          The path where to save the NPY files consisting of the actual and predicted labels.
+        train_data : numpy.ndarray
+          The numpy.ndarray to be used as the training dataset.
+        train_size : int
+          The number of data in `train_data`.
+        validation_data : numpy.ndarray
+          The numpy.ndarray to be used as the validation dataset.
+        validation_size : int
+          The number of data in `validation_data`.
+        chunk_size : int
+          The number of rows of the training dataset read at a time.
+        max_iterations : int
+          The maximum number of Newton iterations.
+        tolerance : float
+          The norm of the gradient, relative to its initial norm, under which the solver stops.
+        """
+
+        if not os.path.exists(checkpoint_path):
+            os.mkdir(checkpoint_path)
+
+        weights, biases = solve_primal(features=train_data[0], labels=train_data[1], num_rows=train_size,
+                                       num_classes=self.num_classes, svm_c=self.svm_c, chunk_size=chunk_size,
+                                       max_iterations=max_iterations, tolerance=tolerance)
+
+        saver = tf.train.Saver()
+
+        # variable initializer
+        init_op = tf.group(tf.local_variables_initializer(), tf.global_variables_initializer())
+
+        with tf.Session(config=self.session_config) as sess:
+            sess.run(init_op)
+
+            # assign the solution to the variables of the graph, and save them
+            self.weight.load(weights, sess)
+            self.bias.load(biases, sess)
+            path = saver.save(sess, checkpoint_path + model_name, global_step=0)
+            print('Saved the model to {}'.format(path))
+
+            validation_results = ResultsWriter(result_path=result_path, phase='validation', model_name='svm',
+                                               num_classes=self.num_classes)
+            num_correct = 0
+
+            # score every row, the last batch having the remaining validation_size % batch_size rows if any
+            for step in range((validation_size + self.batch_size - 1) // self.batch_size):
+                offset = step * self.batch_size
+                validation_feature_batch = validation_data[0][offset:(offset + self.batch_size)]
+                validation_label_batch = validation_data[1][offset:(offset + self.batch_size)]
+
+                feed_dict = {self.x_input: validation_feature_batch, self.y_input: validation_label_batch}
+
+                predictions, actual = sess.run([self.predicted_class, self.y_onehot], feed_dict=feed_dict)
+                num_correct += np.sum(np.argmax(predictions, axis=1) == np.argmax(actual, axis=1))
+
+                validation_results.write(step=step, predictions=predictions, actual=actual)
+
+            validation_results.close()
+            print('EOF -- validation accuracy : {}'.format(num_correct / max(validation_size, 1)))
+
+    def validation_accuracy(self, sess, validation_data, validation_size, num_batches=VALIDATION_BATCHES):
+        """Returns the accuracy on the first `num_batches` batches of the validation dataset, or None if empty
+
+        It is computed every log interval of the training, to rank the checkpoints.
+        """
+        accuracies = []
+
+        for step in range(min(num_batches, validation_size // self.batch_size)):
+            offset = step * self.batch_size
+            feed_dict = {self.x_input: validation_data[0][offset:(offset + self.batch_size)],
+                         self.y_input: validation_data[1][offset:(offset + self.batch_size)]}
+            accuracies.append(sess.run(self.accuracy, feed_dict=feed_dict))
+
+        return float(np.mean(accuracies)) if accuracies else None
+
     @staticmethod
-    def predict(batch_size, num_classes, test_data, test_size, checkpoint_path, result_path):
+    def predict(batch_size, num_classes, test_data, test_size, checkpoint_path, result_path, session_config=None):
         """Classifies the data whether there is an intrusion or none
 
         Parameter
@@ -260,12 +386,16 @@ class Svm:
           The path where to save the trained model.
         result_path : str
           The path where to save the actual and predicted classes array.
+        session_config : tf.ConfigProto
+          The configuration of the session, e.g. from `utils.session.session_config()`. None for the default.
         """
 
-        # variables initializer
-        init_op = tf.group(tf.global_variables_initializer(), tf.local_variables_initializer())
+        # restore the checkpoint in a graph of its own, so that finalizing it leaves the default graph usable
+        graph = tf.Graph()
 
-        with tf.Session() as sess:
+        with graph.as_default(), tf.Session(graph=graph, config=session_config) as sess:
+            # variables initializer
+            init_op = tf.group(tf.global_variables_initializer(), tf.local_variables_initializer())
             sess.run(init_op)
 
             checkpoint = tf.train.get_checkpoint_state(checkpoint_path)
@@ -278,37 +408,40 @@ class Svm:
                 saver.restore(sess, tf.train.latest_checkpoint(checkpoint_path))
                 print('Loaded model from {}'.format(tf.train.latest_checkpoint(checkpoint_path)))
 
+            # resolve the tensors once, and freeze the graph so that no op is added per batch
+            prediction_tensor = sess.graph.get_tensor_by_name('accuracy/prediction:0')
+            accuracy_tensor = sess.graph.get_tensor_by_name('accuracy/accuracy/Mean:0')
+            sess.graph.finalize()
+
+            testing_results = ResultsWriter(result_path=result_path, phase='testing', model_name='svm',
+                                            num_classes=num_classes)
+
+            step = 0
+
             try:
-                for step in range(test_size // batch_size):
-                    offset = (step * batch_size) % test_size
+                # score every row, the last batch having the remaining test_size % batch_size rows if any
+                for step in range((test_size + batch_size - 1) // batch_size):
+                    offset = step * batch_size
                     test_example_batch = test_data[0][offset:(offset + batch_size)]
                     test_label_batch = test_data[1][offset:(offset + batch_size)]
 
-                    # dictionary for input values for the tensors
-                    feed_dict = {'input/x_input:0': test_example_batch}
-
-                    # get the tensor for classification
-                    svm_tensor = sess.graph.get_tensor_by_name('accuracy/prediction:0')
-                    predictions = sess.run(svm_tensor, feed_dict=feed_dict)
+                    # one-hot encode labels according to NUM_CLASSES
+                    y_onehot = one_hot(labels=test_label_batch, num_classes=num_classes, on_value=1.0, off_value=-1.0)
 
-                    label_onehot = tf.one_hot(test_label_batch, num_classes, 1.0, -1.0)
-                    y_onehot = sess.run(label_onehot)
-
-                    # add key, value pair for labels
-                    feed_dict['input/y_input:0'] = test_label_batch
+                    # dictionary for input values for the tensors
+                    feed_dict = {'input/x_input:0': test_example_batch, 'input/y_input:0': test_label_batch}
 
-                    # get the tensor for calculating the classification accuracy
-                    accuracy_tensor = sess.graph.get_tensor_by_name('accuracy/accuracy/Mean:0')
-                    accuracy = sess.run(accuracy_tensor, feed_dict=feed_dict)
+                    # get the predictions and the classification accuracy in a single run
+                    predictions, accuracy = sess.run([prediction_tensor, accuracy_tensor], feed_dict=feed_dict)
 
                     if step % 100 == 0 and step > 0:
                         print('step [{}] test -- accuracy : {}'.format(step, accuracy))
 
-                    Svm.save_labels(predictions=predictions, actual=y_onehot, result_path=result_path, step=step,
-                                    phase='testing')
+                    testing_results.write(step=step, predictions=predictions, actual=y_onehot)
             except KeyboardInterrupt:
                 print('KeyboardInterrupt at step {}'.format(step))
             finally:
+                testing_results.close()
                 print('Done classifying at step {}'.format(step))
 
     @staticmethod
@@ -322,31 +455,3 @@ class Svm:
             tf.summary.scalar('max', tf.reduce_max(var))
             tf.summary.scalar('min', tf.reduce_min(var))
             tf.summary.histogram('histogram', var)
-
-    @staticmethod
-    def save_labels(predictions, actual, result_path, step, phase):
-        """Saves the actual and predicted labels to a NPY file
-
-        Parameter
-        ---------
-        predictions : numpy.ndarray
-          The NumPy array containing the predicted labels.
-        actual : numpy.ndarray
-          The NumPy array containing the actual labels.
-        result_path : str
-          The path where to save the concatenated actual and predicted labels.
-        step : int
-          The time step for the NumPy arrays.
-        phase : str
-          The phase for which the predictions is, i.e. training/validation/testing.
-        """
-
-        # Concatenate the predicted and actual labels
-        labels = np.concatenate((predictions, actual), axis=1)
-
-        # Creates the result_path directory if it does not exist
-        if not os.path.exists(path=result_path):
-            os.mkdir(path=result_path)
-
-        # save every labels array to NPY file
-        np.save(file=os.path.join(result_path, '{}-svm-{}.npy'.format(phase, step)), arr=labels)
@@ -0,0 +1,250 @@
+# A Neural Network Architecture Combining Gated Recurrent Unit (GRU) and
+# Support Vector Machine (SVM) for Intrusion Detection in Network Traffic Data
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Online scoring of raw Kyoto University 2013 records with the trained GRU+SVM model"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.2.0'
+__author__ = 'Abien Fred Agarap'
+
+import argparse
+from dataset import bin_data as bd
+from dataset import normalize_data as nd
+from dataset import pipeline
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+from models.gru_svm.numpy_gru_svm import NumpyGruSvm
+import numpy as np
+import os
+import socketserver
+import threading
+import time
+from utils.batching import MicroBatcher
+
+# the number of latencies kept for the percentiles
+LATENCY_WINDOW = 10000
+
+
+class Scorer:
+    """Applies the saved normalization and binning to raw records, and classifies them
+
+    The records are the 24 tab-separated fields of the raw TXT files of the dataset, one per line.
+    The label field is required by the format, but its value is not used for the verdicts.
+
+    The features of the concurrent requests are classified together by a `MicroBatcher`.
+    """
+
+    def __init__(self, model, statistics, edges, binning, max_batch_size=256, max_delay=0.005):
+        """Initialize the Scorer class
+
+        Parameter
+        ---------
+        model : NumpyGruSvm
+          The trained model.
+        statistics : dict
+          The normalization statistics saved by the pipeline.
+        edges : dict
+          The bin edges of each binned feature, saved by the pipeline.
+        binning : int
+          The type of binning the edges were fitted for.
+        max_batch_size : int
+          The maximum number of records classified in a batch.
+        max_delay : float
+          The maximum time in seconds that a request waits for others to be batched with.
+        """
+        self.model = model
+        self.statistics = statistics
+        self.edges = edges
+        self.binning = binning
+        self.batcher = MicroBatcher(predict=model.predict, max_batch_size=max_batch_size, max_delay=max_delay)
+
+    def score(self, text):
+        """Returns the verdict of each record in `text`: 1 if an attack, 0 if normal, None if invalid"""
+        if not text.strip():
+            return []
+
+        features, index, num_records = pipeline.transform_records(text=text, statistics=self.statistics,
+                                                                  edges=self.edges, binning=self.binning)
+
+        verdicts = [None] * num_records
+        if features.shape[0] > 0:
+            for position, verdict in zip(index, np.argmax(self.batcher.submit(features), axis=1)):
+                verdicts[position] = int(verdict)
+
+        return verdicts
+
+
+class LatencyStats:
+    """Thread-safe counters of the scored requests, with a window of their latencies"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = np.zeros(window, dtype=np.float64)
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.num_requests = 0
+        self.num_records = 0
+
+    def add(self, latency, num_records):
+        with self.lock:
+            self.latencies[self.num_requests % self.latencies.shape[0]] = latency
+            self.num_requests += 1
+            self.num_records += num_records
+
+    def summary(self):
+        """Returns the p50 and p99 latencies in ms over the window, and the throughput since the start"""
+        with self.lock:
+            latencies = self.latencies[:min(self.num_requests, self.latencies.shape[0])].copy()
+            num_requests, num_records = self.num_requests, self.num_records
+        uptime = time.time() - self.start_time
+
+        summary = {'requests': num_requests, 'records': num_records, 'uptime_sec': uptime,
+                   'requests_per_sec': num_requests / uptime, 'records_per_sec': num_records / uptime,
+                   'p50_ms': None, 'p99_ms': None}
+        if latencies.shape[0] > 0:
+            summary['p50_ms'], summary['p99_ms'] = (np.percentile(latencies, [50, 99]) * 1000).tolist()
+
+        return summary
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """POST /score classifies the records in the body, GET /stats returns the latency stats"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path != '/score':
+            self.send_json(404, {'error': 'Unknown path {}'.format(self.path)})
+            return
+
+        start_time = time.time()
+
+        try:
+            # a body which is not UTF-8 is a bad request, as UnicodeDecodeError is a ValueError
+            text = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+            verdicts = self.server.scorer.score(text)
+        except (ValueError, KeyError) as error:
+            self.send_json(400, {'error': str(error)})
+            return
+
+        self.send_json(200, {'verdicts': verdicts})
+        self.server.stats.add(latency=time.time() - start_time, num_records=len(verdicts))
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self.send_json(404, {'error': 'Unknown path {}'.format(self.path)})
+            return
+
+        summary = self.server.stats.summary()
+        summary['batching'] = self.server.scorer.batcher.summary()
+        self.send_json(200, summary)
+
+    def send_json(self, code, body):
+        body = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # the clients of a Unix socket have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else self.server.server_address
+
+    def log_message(self, format, *args):
+        # logging every request to stderr would dominate the latency
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(scorer, host='127.0.0.1', port=8080, unix_socket=None):
+    """Returns the scoring server, listening on the Unix socket if given, else on host:port"""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixServer(unix_socket, ScoringHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ScoringHandler)
+
+    server.scorer = scorer
+    server.stats = LatencyStats()
+
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Online scoring server of GRU+SVM for Intrusion Detection')
+    group = parser.add_argument_group('Arguments')
+    group.add_argument('-c', '--checkpoint_path', required=False, type=str,
+                       help='path of the trained model')
+    group.add_argument('--numpy_weights', required=False, type=str,
+                       help='the NPZ file of the trained variables, read instead of the checkpoint if it exists')
+    group.add_argument('-s', '--statistics', required=True, type=str,
+                       help='the JSON file of the normalization statistics saved by the pipeline')
+    group.add_argument('-e', '--edges', required=True, type=str,
+                       help='the JSON file of the bin edges saved by the pipeline')
+    group.add_argument('--host', required=False, type=str, default='127.0.0.1',
+                       help='the address to listen on')
+    group.add_argument('-p', '--port', required=False, type=int, default=8080,
+                       help='the port to listen on')
+    group.add_argument('-u', '--unix_socket', required=False, type=str,
+                       help='the path of a Unix socket to listen on, instead of the host and port')
+    group.add_argument('--max_batch_size', required=False, type=int, default=256,
+                       help='the maximum number of records classified in a batch')
+    group.add_argument('--max_delay_ms', required=False, type=float, default=5.0,
+                       help='the maximum time a request waits for others to be batched with')
+    arguments = parser.parse_args()
+    if not arguments.checkpoint_path and not (arguments.numpy_weights and os.path.exists(arguments.numpy_weights)):
+        parser.error('--checkpoint_path is required without an existing --numpy_weights file')
+    return arguments
+
+
+def main(arguments):
+    model = NumpyGruSvm.from_weights_or_checkpoint(checkpoint_path=arguments.checkpoint_path,
+                                                   numpy_weights=arguments.numpy_weights)
+    statistics = nd.load_statistics(arguments.statistics)
+    edges, binning = bd.load_edges(arguments.edges)
+
+    scorer = Scorer(model=model, statistics=statistics, edges=edges, binning=binning,
+                    max_batch_size=arguments.max_batch_size, max_delay=arguments.max_delay_ms / 1000)
+    server = make_server(scorer=scorer, host=arguments.host, port=arguments.port, unix_socket=arguments.unix_socket)
+    print('Listening on {}'.format(arguments.unix_socket or '{}:{}'.format(arguments.host, arguments.port)))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopping the server')
+    finally:
+        server.server_close()
+        scorer.batcher.close()
+        if arguments.unix_socket and os.path.exists(arguments.unix_socket):
+            os.remove(arguments.unix_socket)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    main(args)
@@ -0,0 +1,256 @@
+# A Neural Network Architecture Combining Gated Recurrent Unit (GRU) and
+# Support Vector Machine (SVM) for Intrusion Detection in Network Traffic Data
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Scores the Kyoto University 2013 TXT files with the trained GRU+SVM model as they are appended"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import argparse
+from dataset import bin_data as bd
+from dataset import normalize_data as nd
+from dataset import pipeline
+import json
+from models.gru_svm.numpy_gru_svm import NumpyGruSvm
+import numpy as np
+import os
+import time
+
+# the maximum number of bytes read from a file at a time
+READ_SIZE = 1 << 20
+
+
+class StreamScorer:
+    """Follows the TXT files of a directory, and scores their new lines
+
+    Only the complete lines are scored, a partially written line is left for the next read.
+    The verdicts are appended to the output as `file<TAB>offset<TAB>verdict` lines, where offset
+    is the byte offset of the record in its file, and the verdict is 1 if an attack, 0 if normal,
+    or empty if the record has missing or malformed fields. The bytes which are not UTF-8 are replaced.
+
+    After the verdicts of a read are written, the offset reached in each file is saved to a JSON
+    checkpoint, along with the size of the output. On a restart, the output is truncated to that
+    size, dropping the verdicts written after the last checkpoint, and the files are read from
+    their saved offsets, so that no record is scored twice or skipped.
+    """
+
+    def __init__(self, model, statistics, edges, binning, output_path, checkpoint_path, batch_size=256):
+        """Initialize the StreamScorer class
+
+        Parameter
+        ---------
+        model : NumpyGruSvm
+          The trained model.
+        statistics : dict
+          The normalization statistics saved by the pipeline.
+        edges : dict
+          The bin edges of each binned feature, saved by the pipeline.
+        binning : int
+          The type of binning the edges were fitted for.
+        output_path : str
+          The path of the append-only verdicts file.
+        checkpoint_path : str
+          The path of the JSON checkpoint of the offsets.
+        batch_size : int
+          The number of records per forward pass.
+        """
+        self.model = model
+        self.statistics = statistics
+        self.edges = edges
+        self.binning = binning
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+
+        self.offsets = {}
+        output_size = 0
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r') as file:
+                checkpoint = json.load(file)
+            self.offsets, output_size = checkpoint['offsets'], checkpoint['output_size']
+            print('Resuming {} files from {}'.format(len(self.offsets), checkpoint_path))
+
+        self.output = open(output_path, 'ab')
+        if self.output.tell() > output_size:
+            # drop the verdicts written after the last checkpoint
+            self.output.truncate(output_size)
+        self.output.seek(0, os.SEEK_END)
+
+        self.num_records = 0
+
+    def poll(self, files):
+        """Scores the new lines of the files, and returns the number of scored records"""
+        num_records = 0
+
+        for path in sorted(files):
+            size = os.path.getsize(path)
+            offset = self.offsets.get(path, 0)
+
+            if size < offset:
+                print('{} was truncated, scoring it from the start'.format(path))
+                offset = 0
+
+            while offset < size:
+                with open(path, 'rb') as file:
+                    file.seek(offset)
+                    data = file.read(min(size - offset, READ_SIZE))
+
+                # leave the partially written line for the next read
+                end = data.rfind(b'\n') + 1
+                if end == 0:
+                    break
+
+                num_records += self.score(path=path, offset=offset, data=data[:end])
+                offset += end
+                self.offsets[path] = offset
+                self.save_checkpoint()
+
+        self.num_records += num_records
+        return num_records
+
+    def score(self, path, offset, data):
+        """Appends the verdicts of the complete lines in `data`, read from `offset` of the file"""
+        lines = data.split(b'\n')[:-1]
+        line_offsets = offset + np.cumsum([0] + [len(line) + 1 for line in lines[:-1]])
+
+        # blank lines have no verdict
+        line_offsets = [line_offset for line, line_offset in zip(lines, line_offsets) if line.strip()]
+        lines = [line.decode('utf-8', errors='replace') for line in lines if line.strip()]
+
+        try:
+            features, index, num_records = pipeline.transform_records(text='\n'.join(lines),
+                                                                      statistics=self.statistics, edges=self.edges,
+                                                                      binning=self.binning)
+        except ValueError:
+            # e.g. a record with too many fields, which fails the whole read
+            num_records = None
+        if num_records != len(lines):
+            features, index, num_records = self.transform_lines(lines)
+
+        verdicts = [''] * num_records
+        for start in range(0, features.shape[0], self.batch_size):
+            predictions = np.argmax(self.model.predict(features[start:(start + self.batch_size)]), axis=1)
+            for position, verdict in zip(index[start:(start + self.batch_size)], predictions):
+                verdicts[position] = str(verdict)
+
+        self.output.write(''.join('{}\t{}\t{}\n'.format(path, line_offset, verdict)
+                                  for line_offset, verdict in zip(line_offsets, verdicts)).encode('utf-8'))
+
+        return num_records
+
+    def transform_lines(self, lines):
+        """Transforms the lines one at a time, leaving out those which fail, so that they have no verdict"""
+        features, index = [], []
+
+        for position, line in enumerate(lines):
+            try:
+                line_features, _, _ = pipeline.transform_records(text=line, statistics=self.statistics,
+                                                                 edges=self.edges, binning=self.binning)
+            except Exception as error:
+                print('Skipping a malformed record : {}'.format(error))
+                continue
+            if line_features.shape[0] == 1:
+                features.append(line_features)
+                index.append(position)
+
+        features = np.concatenate(features) if features else np.zeros([0, len(pipeline.FEATURE_COLUMNS)], np.uint8)
+        return features, np.array(index, dtype=np.int64), len(lines)
+
+    def save_checkpoint(self):
+        """Syncs the verdicts, then atomically replaces the checkpoint of the offsets"""
+        self.output.flush()
+        os.fsync(self.output.fileno())
+
+        temporary_path = self.checkpoint_path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump({'offsets': self.offsets, 'output_size': self.output.tell()}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def close(self):
+        self.output.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Streaming scorer of GRU+SVM for Intrusion Detection')
+    group = parser.add_argument_group('Arguments')
+    group.add_argument('-w', '--watch_path', required=True, type=str,
+                       help='path of the directory of the TXT files to follow')
+    group.add_argument('-c', '--checkpoint_path', required=False, type=str,
+                       help='path of the trained model')
+    group.add_argument('--numpy_weights', required=False, type=str,
+                       help='the NPZ file of the trained variables, read instead of the checkpoint if it exists')
+    group.add_argument('-s', '--statistics', required=True, type=str,
+                       help='the JSON file of the normalization statistics saved by the pipeline')
+    group.add_argument('-e', '--edges', required=True, type=str,
+                       help='the JSON file of the bin edges saved by the pipeline')
+    group.add_argument('-o', '--output', required=True, type=str,
+                       help='the file where to append the verdicts')
+    group.add_argument('--offsets', required=False, type=str,
+                       help='the JSON file of the processed offsets, defaults to the output path with .offsets.json')
+    group.add_argument('--batch_size', required=False, type=int, default=256,
+                       help='number of records per forward pass')
+    group.add_argument('--poll_interval', required=False, type=float, default=1.0,
+                       help='seconds to wait when there are no new lines')
+    group.add_argument('--once', action='store_true',
+                       help='exit once the existing lines are scored, instead of following the files')
+    arguments = parser.parse_args()
+    if not arguments.checkpoint_path and not (arguments.numpy_weights and os.path.exists(arguments.numpy_weights)):
+        parser.error('--checkpoint_path is required without an existing --numpy_weights file')
+    return arguments
+
+
+def main(arguments):
+    model = NumpyGruSvm.from_weights_or_checkpoint(checkpoint_path=arguments.checkpoint_path,
+                                                   numpy_weights=arguments.numpy_weights)
+    statistics = nd.load_statistics(arguments.statistics)
+    edges, binning = bd.load_edges(arguments.edges)
+
+    scorer = StreamScorer(model=model, statistics=statistics, edges=edges, binning=binning,
+                          output_path=arguments.output,
+                          checkpoint_path=arguments.offsets or arguments.output + '.offsets.json',
+                          batch_size=arguments.batch_size)
+    start_time = time.time()
+
+    try:
+        while True:
+            files = [file for file in nd.list_files(arguments.watch_path) if file.endswith('.txt')]
+            poll_start_time = time.time()
+            num_records = scorer.poll(files)
+
+            if num_records > 0:
+                print('Scored {} records in {:.3f}s'.format(num_records, time.time() - poll_start_time))
+            elif arguments.once:
+                break
+            else:
+                time.sleep(arguments.poll_interval)
+    except KeyboardInterrupt:
+        print('Stopping the scorer')
+    finally:
+        scorer.close()
+        print('Scored {} records in {:.3f}s'.format(scorer.num_records, time.time() - start_time))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    main(args)
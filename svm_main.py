@@ -25,13 +25,17 @@ __version__ = '0.1.2'
 __author__ = 'Abien Fred Agarap'
 
 import argparse
+from utils import data
 from models.svm.svm import Svm
+from utils.session import session_config
 
 # Hyper-parameters
 BATCH_SIZE = 256
+HM_EPOCHS = 10
 LEARNING_RATE = 1e-5
 N_CLASSES = 2
 SEQUENCE_LENGTH = 21
+SVM_C = 0.5
 
 
 def parse_args():
@@ -51,38 +55,76 @@ def parse_args():
                        help='filename for the trained model')
     group.add_argument('-r', '--result_path', required=True, type=str,
                        help='path where to save the actual and predicted labels')
+    group.add_argument('--svm_c', required=False, type=float, default=SVM_C,
+                       help='the SVM penalty parameter')
+    group.add_argument('--num_epochs', required=False, type=int, default=HM_EPOCHS,
+                       help='number of passes through the training dataset with the "adam" solver')
+    group.add_argument('--solver', required=False, type=str, default='adam', choices=['adam', 'newton'],
+                       help='"adam" to train with minibatches, or "newton" to solve the loss directly over the dataset')
+    group.add_argument('--max_iterations', required=False, type=int, default=50,
+                       help='maximum number of iterations of the "newton" solver')
+    group.add_argument('--mmap', action='store_true',
+                       help='memory-map the datasets instead of reading them into memory')
+    group.add_argument('--log_interval', required=False, type=int, default=100,
+                       help='number of training steps between the summaries, loss, and accuracy')
+    group.add_argument('--keep_last', required=False, type=int, default=5,
+                       help='number of latest checkpoints to keep')
+    group.add_argument('--keep_interval', required=False, type=float,
+                       help='seconds between the checkpoints kept regardless of the others')
+    group.add_argument('--keep_best', required=False, type=int, default=1,
+                       help='number of checkpoints to keep with the best accuracy on the first validation batches')
+    group.add_argument('--inference_batch_size', required=False, type=int, default=BATCH_SIZE,
+                       help='number of examples per batch on "test", which scores every example')
+    group.add_argument('--intra_op_threads', required=False, type=int, default=0,
+                       help='number of threads per op, e.g. a matmul; 0 for the number of cores')
+    group.add_argument('--inter_op_threads', required=False, type=int, default=0,
+                       help='number of threads running independent ops concurrently; 0 for the number of cores')
+    group.add_argument('--opt_level', required=False, type=str, choices=['L0', 'L1'],
+                       help='level of the graph optimizer: "L0" for none, "L1" for the default')
+    group.add_argument('--xla', action='store_true',
+                       help='compile the graph with the XLA JIT')
     arguments = parser.parse_args()
     return arguments
 
 
 def main(arguments):
 
+    config = session_config(intra_op_threads=arguments.intra_op_threads, inter_op_threads=arguments.inter_op_threads,
+                            opt_level=arguments.opt_level, xla=arguments.xla)
+
     if arguments.operation == 'train':
-        train_features, train_labels = data.load_data(dataset=arguments.train_dataset)
-        validation_features, validation_labels = data.load_data(dataset=arguments.validation_dataset)
+        train_features, train_labels = data.load_data(dataset=arguments.train_dataset, mmap=arguments.mmap)
+        validation_features, validation_labels = data.load_data(dataset=arguments.validation_dataset,
+                                                                mmap=arguments.mmap)
 
         train_size = train_features.shape[0]
         validation_size = validation_features.shape[0]
 
         model = Svm(alpha=LEARNING_RATE, batch_size=BATCH_SIZE, svm_c=arguments.svm_c, num_classes=N_CLASSES,
-                    num_features=SEQUENCE_LENGTH)
-
-        model.train(checkpoint_path=arguments.checkpoint_path, log_path=arguments.log_path,
-                    model_name=arguments.model_name, epochs=arguments.num_epochs, result_path=arguments.result_path,
-                    train_data=[train_features, train_labels], train_size=train_size,
-                    validation_data=[validation_features, validation_labels], validation_size=validation_size)
+                    num_features=SEQUENCE_LENGTH, session_config=config)
+
+        if arguments.solver == 'newton':
+            model.train_primal(checkpoint_path=arguments.checkpoint_path, model_name=arguments.model_name,
+                               result_path=arguments.result_path, train_data=[train_features, train_labels],
+                               train_size=train_size, validation_data=[validation_features, validation_labels],
+                               validation_size=validation_size, max_iterations=arguments.max_iterations)
+        else:
+            model.train(checkpoint_path=arguments.checkpoint_path, log_path=arguments.log_path,
+                        model_name=arguments.model_name, epochs=arguments.num_epochs, result_path=arguments.result_path,
+                        train_data=[train_features, train_labels], train_size=train_size,
+                        validation_data=[validation_features, validation_labels], validation_size=validation_size,
+                        log_interval=arguments.log_interval, keep_last=arguments.keep_last,
+                        keep_interval=arguments.keep_interval, keep_best=arguments.keep_best)
     elif arguments.operation == 'test':
-        test_features, test_labels = data.load_data(dataset=arguments.validation_dataset)
-
-        test_size = test_features.shape[0]
-
-        test_features = test_features[:test_size - (test_size % BATCH_SIZE)]
-        test_labels = test_labels[:test_size - (test_size % BATCH_SIZE)]
+        test_features, test_labels = data.load_data(dataset=arguments.validation_dataset, mmap=arguments.mmap)
 
+        # score every example, without truncating the dataset to a multiple of the batch size
         test_size = test_features.shape[0]
 
-        Svm.predict(batch_size=BATCH_SIZE, num_classes=N_CLASSES, test_data=[test_features, test_labels],
-                    test_size=test_size, checkpoint_path=arguments.checkpoint_path, result_path=arguments.result_path)
+        Svm.predict(batch_size=arguments.inference_batch_size, num_classes=N_CLASSES,
+                    test_data=[test_features, test_labels], test_size=test_size,
+                    checkpoint_path=arguments.checkpoint_path, result_path=arguments.result_path,
+                    session_config=config)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,213 @@
+# A Neural Network Architecture Combining Gated Recurrent Unit (GRU) and
+# Support Vector Machine (SVM) for Intrusion Detection in Network Traffic Data
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Coalescing of concurrent inference requests into batches"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import numpy as np
+import queue
+import threading
+import time
+
+# the upper edges of the histogram buckets, the last bucket counting the larger values
+QUEUE_DELAY_EDGES_MS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100]
+BATCH_SIZE_EDGES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+
+class Request:
+    """The features of a request, waiting for their predictions"""
+
+    def __init__(self, features):
+        self.features = features
+        self.arrival_time = time.time()
+        self.done = threading.Event()
+        self.predictions = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Gathers the features of concurrent requests into batches for a single forward pass
+
+    A batch is flushed when it reaches the size cap, or when the deadline after the arrival of
+    its first request expires. Both are tuned from an exponentially weighted moving average of
+    the time between the requests and of their number of rows: when the requests are sparse,
+    the cap shrinks to the rows expected within `max_delay` so a batch is flushed without waiting,
+    and when they are dense, the deadline shrinks to the time expected to fill `max_batch_size`.
+    """
+
+    def __init__(self, predict, max_batch_size=256, max_delay=0.005, smoothing=0.1):
+        """Initialize the MicroBatcher class
+
+        Parameter
+        ---------
+        predict : callable
+          The forward pass, taking the [N, sequence_length] features, and returning N predictions.
+        max_batch_size : int
+          The maximum number of rows per batch. A larger request is run as its own batch.
+        max_delay : float
+          The maximum time in seconds that the first request of a batch waits for others.
+        smoothing : float
+          The weight of the newest observation in the moving averages.
+        """
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.smoothing = smoothing
+
+        self.interval = max_delay
+        self.rows = 1.0
+        self.last_arrival_time = None
+
+        self.lock = threading.Lock()
+        self.queue_delay_counts = np.zeros(len(QUEUE_DELAY_EDGES_MS) + 1, dtype=np.int64)
+        self.batch_size_counts = np.zeros(len(BATCH_SIZE_EDGES) + 1, dtype=np.int64)
+        self.num_batches = 0
+
+        self.queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='micro-batcher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, features):
+        """Returns the predictions of the features, once their batch has run"""
+        if self.stop_event.is_set():
+            raise RuntimeError('The micro-batcher is closed')
+
+        request = Request(features)
+
+        with self.lock:
+            if self.last_arrival_time is not None:
+                self.interval += self.smoothing * (request.arrival_time - self.last_arrival_time - self.interval)
+            self.last_arrival_time = request.arrival_time
+            self.rows += self.smoothing * (len(features) - self.rows)
+
+        self.queue.put(request)
+        request.done.wait()
+
+        if request.error is not None:
+            raise request.error
+        return request.predictions
+
+    def limits(self):
+        """Returns the size cap and the deadline tuned from the moving averages"""
+        with self.lock:
+            interval, rows = max(self.interval, 1e-6), self.rows
+
+        # the rows expected to arrive within max_delay
+        expected_rows = rows * self.max_delay / interval
+        if expected_rows >= self.max_batch_size:
+            return self.max_batch_size, self.max_batch_size * interval / rows
+        return max(int(np.ceil(expected_rows)), 1), self.max_delay
+
+    def _run(self):
+        """Gathers the requests in batches, and runs them"""
+        pending = None
+
+        while not self.stop_event.is_set():
+            if pending is None:
+                try:
+                    pending = self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+            batch, pending = [pending], None
+            batch_size = len(batch[0].features)
+            size_cap, delay = self.limits()
+            deadline = batch[0].arrival_time + delay
+
+            while batch_size < size_cap:
+                try:
+                    request = self.queue.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if batch_size + len(request.features) > self.max_batch_size:
+                    # keep the request for the next batch
+                    pending = request
+                    break
+                batch.append(request)
+                batch_size += len(request.features)
+
+            self._run_batch(batch)
+
+        # fail the requests left when closing
+        for request in ([pending] if pending is not None else []) + self._drain():
+            request.error = RuntimeError('The micro-batcher is closed')
+            request.done.set()
+
+    def _run_batch(self, batch):
+        """Runs the forward pass over the concatenated features, and splits the predictions"""
+        start_time = time.time()
+
+        try:
+            predictions = self.predict(np.concatenate([request.features for request in batch]))
+            offsets = np.cumsum([len(request.features) for request in batch])[:-1]
+            for request, request_predictions in zip(batch, np.split(predictions, offsets)):
+                request.predictions = request_predictions
+        except Exception as error:
+            for request in batch:
+                request.error = error
+
+        batch_size = sum(len(request.features) for request in batch)
+
+        with self.lock:
+            for request in batch:
+                delay_ms = (start_time - request.arrival_time) * 1000
+                self.queue_delay_counts[np.searchsorted(QUEUE_DELAY_EDGES_MS, delay_ms)] += 1
+            self.batch_size_counts[np.searchsorted(BATCH_SIZE_EDGES, batch_size)] += 1
+            self.num_batches += 1
+
+        for request in batch:
+            request.done.set()
+
+    def _drain(self):
+        requests = []
+        while True:
+            try:
+                requests.append(self.queue.get_nowait())
+            except queue.Empty:
+                return requests
+
+    def summary(self):
+        """Returns the histograms of the queueing delays and batch sizes, and the current limits
+
+        Each histogram maps the upper edge of a bucket to its count, '+inf' being the last bucket.
+        """
+        size_cap, delay = self.limits()
+
+        with self.lock:
+            queue_delay_counts = self.queue_delay_counts.tolist()
+            batch_size_counts = self.batch_size_counts.tolist()
+            num_batches = self.num_batches
+
+        def histogram(edges, counts):
+            return dict(zip([str(edge) for edge in edges] + ['+inf'], counts))
+
+        return {'batches': num_batches, 'size_cap': size_cap, 'delay_ms': delay * 1000,
+                'queue_delay_ms': histogram(QUEUE_DELAY_EDGES_MS, queue_delay_counts),
+                'batch_size': histogram(BATCH_SIZE_EDGES, batch_size_counts)}
+
+    def close(self):
+        """Stops the batching thread, failing the requests not yet batched"""
+        self.stop_event.set()
+        self.thread.join()
@@ -0,0 +1,208 @@
+# A Neural Network Architecture Combining Gated Recurrent Unit (GRU) and
+# Support Vector Machine (SVM) for Intrusion Detection in Network Traffic Data
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Checkpoint saving on a background thread, with a retention policy"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import glob
+import os
+import queue
+import tensorflow as tf
+import threading
+import time
+
+
+class AsyncCheckpointer:
+    """Saves the variables of a session without blocking the training steps on the disk
+
+    `save()` only copies the values of the variables out of the session. A background thread
+    loads them in a shadow graph of the same variables, and writes them with its own saver,
+    followed by the meta graph of the model. The checkpoints are then the same as those of
+    `tf.train.Saver.save()`, and restored in the same way, e.g. by `tf.train.import_meta_graph()`.
+
+    A checkpoint is kept if it is one of the `keep_last` latest, the first after every
+    `keep_interval` seconds, or one of the `keep_best` with the best metric. The others are deleted.
+    """
+
+    def __init__(self, save_path, keep_last=5, keep_interval=None, keep_best=0, mode='max', capacity=2, graph=None):
+        """Initialize the AsyncCheckpointer class
+
+        Parameter
+        ---------
+        save_path : str
+          The path prefix of the checkpoints, to which the step is appended.
+        keep_last : int
+          The number of latest checkpoints to keep.
+        keep_interval : float
+          The number of seconds between the checkpoints kept regardless of the others. None to disable.
+        keep_best : int
+          The number of checkpoints with the best metric to keep.
+        mode : str
+          'max' if a higher metric is better, e.g. the accuracy, or 'min', e.g. the loss.
+        capacity : int
+          The number of snapshots waiting to be written, after which `save()` blocks.
+        graph : tf.Graph
+          The graph of the variables. Defaults to the default graph.
+        """
+        assert mode in ['max', 'min'], 'mode must be "max" or "min"'
+        assert keep_last > 0 or keep_best > 0 or keep_interval is not None, 'The retention policy keeps no checkpoint'
+
+        self.save_path = save_path
+        self.checkpoint_dir = os.path.dirname(save_path)
+        self.keep_last = keep_last
+        self.keep_interval = keep_interval
+        self.keep_best = keep_best
+        self.mode = mode
+
+        graph = graph or tf.get_default_graph()
+        with graph.as_default():
+            self.variables = tf.global_variables()
+            # the saver of the meta graph, which restores the checkpoints in the graph of the model
+            self.saver_def = tf.train.Saver(var_list=self.variables).as_saver_def()
+        self.meta_graph = None
+
+        # a copy of the variables, fed with the snapshots, in a graph of its own
+        self.shadow_graph = tf.Graph()
+        with self.shadow_graph.as_default():
+            self.placeholders = [tf.placeholder(dtype=variable.dtype.base_dtype, shape=variable.get_shape())
+                                 for variable in self.variables]
+            shadow_variables = {variable.op.name: tf.Variable(placeholder, trainable=False, collections=[])
+                                for variable, placeholder in zip(self.variables, self.placeholders)}
+            self.load_op = tf.group(*[variable.initializer for variable in shadow_variables.values()])
+            self.shadow_saver = tf.train.Saver(var_list=shadow_variables, max_to_keep=None)
+        self.shadow_sess = tf.Session(graph=self.shadow_graph,
+                                      config=tf.ConfigProto(device_count={'GPU': 0}, intra_op_parallelism_threads=1,
+                                                            inter_op_parallelism_threads=1))
+
+        # (step, path, metric, kept for the interval) of every checkpoint on the disk,
+        # updated by the writing thread, and read by `best()`
+        self.checkpoints = []
+        self.lock = threading.Lock()
+        self.last_interval_time = None
+        self.snapshot_time = 0.0
+        self.error = None
+
+        self.queue = queue.Queue(maxsize=capacity)
+        self.thread = threading.Thread(target=self._write, name='async-checkpointer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def save(self, sess, step, metric=None):
+        """Copies the variables out of the session, and queues them to be written as the checkpoint of `step`
+
+        Parameter
+        ---------
+        sess : tf.Session
+          The session of the variables.
+        step : int
+          The global step of the checkpoint.
+        metric : float
+          The metric of the checkpoint, for keeping the best ones.
+        """
+        if self.error is not None:
+            raise self.error
+
+        start_time = time.time()
+
+        if self.meta_graph is None:
+            # export the meta graph on this thread, once the graph of the model is complete
+            self.meta_graph = tf.train.export_meta_graph(graph=sess.graph,
+                                                         saver_def=self.saver_def).SerializeToString()
+        values = sess.run(self.variables)
+
+        self.snapshot_time += time.time() - start_time
+        self.queue.put((step, values, metric, time.time()))
+
+    def _write(self):
+        """Writes the queued snapshots until None is queued"""
+        while True:
+            snapshot = self.queue.get()
+            if snapshot is None:
+                return
+            if self.error is not None:
+                continue
+
+            step, values, metric, snapshot_time = snapshot
+            try:
+                self.shadow_sess.run(self.load_op, feed_dict=dict(zip(self.placeholders, values)))
+                path = self.shadow_saver.save(sess=self.shadow_sess, save_path=self.save_path, global_step=step,
+                                              write_meta_graph=False, write_state=False)
+                with open(path + '.meta', 'wb') as file:
+                    file.write(self.meta_graph)
+
+                keep_for_interval = self.keep_interval is not None and (
+                    self.last_interval_time is None or snapshot_time - self.last_interval_time >= self.keep_interval)
+                if keep_for_interval:
+                    self.last_interval_time = snapshot_time
+                with self.lock:
+                    # a checkpoint saved again for the same step replaces the previous one
+                    self.checkpoints = [checkpoint for checkpoint in self.checkpoints if checkpoint[1] != path]
+                    self.checkpoints.append((step, path, metric, keep_for_interval))
+                    self._retain()
+            except Exception as error:
+                self.error = error
+
+    def _retain(self):
+        """Deletes the checkpoints outside of the retention policy, and updates the checkpoint state
+
+        The lock must be held.
+        """
+        kept = set(path for _, path, _, keep_for_interval in self.checkpoints if keep_for_interval)
+        kept.update(path for _, path, _, _ in self.checkpoints[-self.keep_last:] if self.keep_last > 0)
+
+        if self.keep_best > 0:
+            scored = [(metric, path) for _, path, metric, _ in self.checkpoints if metric is not None]
+            scored.sort(key=lambda checkpoint: checkpoint[0], reverse=self.mode == 'max')
+            kept.update(path for _, path in scored[:self.keep_best])
+
+        for _, path, _, _ in self.checkpoints:
+            if path not in kept:
+                for filename in glob.glob(path + '.*'):
+                    os.remove(filename)
+        self.checkpoints = [checkpoint for checkpoint in self.checkpoints if checkpoint[1] in kept]
+
+        if not self.checkpoints:
+            # e.g. only the best are kept, and no checkpoint has a metric yet
+            return
+
+        tf.train.update_checkpoint_state(save_dir=self.checkpoint_dir,
+                                         model_checkpoint_path=self.checkpoints[-1][1],
+                                         all_model_checkpoint_paths=[path for _, path, _, _ in self.checkpoints])
+
+    def best(self):
+        """Returns the path and the metric of the best checkpoint written, or None"""
+        with self.lock:
+            scored = [(metric, path) for _, path, metric, _ in self.checkpoints if metric is not None]
+        if not scored:
+            return None
+        metric, path = (max if self.mode == 'max' else min)(scored, key=lambda checkpoint: checkpoint[0])
+        return path, metric
+
+    def close(self):
+        """Waits for the queued snapshots to be written"""
+        self.queue.put(None)
+        self.thread.join()
+        self.shadow_sess.close()
+
+        if self.error is not None:
+            raise self.error
@@ -20,24 +20,30 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-__version__ = '0.5.4'
+__version__ = '0.7.0'
 __author__ = 'Abien Fred Agarap'
 
 from dataset.normalize_data import list_files
-import matplotlib.pyplot as plt
+from dataset.store import is_store, read_store
 import numpy as np
-from sklearn.metrics import confusion_matrix
-import tensorflow as tf
+import os
+from utils.results import read_results
 
 
-def load_data(dataset):
+def load_data(dataset, mmap=False):
     """Returns a tuple containing the features and labels
     in a dataset.
 
     Parameter
     ---------
     dataset : numpy.ndarray
-      A NumPy array file containing the dataset to be loaded.
+      A NumPy array file containing the dataset to be loaded, or a binary store
+      written by `dataset/csv_to_npy.py` or `dataset/pipeline.py`. The uint8 features
+      and labels of a binary store are returned as stored, i.e. without casting them.
+    mmap : bool
+      If True, the file is memory-mapped instead of read into memory. The labels are
+      then a strided view of the file, and the features a `FeatureView` whose rows are
+      only read when a slice of it is converted to an array, e.g. when fed to a session.
 
     Returns
     -------
@@ -63,6 +69,21 @@ def load_data(dataset):
 
     """
 
+    if is_store(dataset):
+        return read_store(dataset, mmap=mmap)
+
+    if mmap:
+        # map the file into memory, without reading it
+        data = np.load(dataset, mmap_mode='r')
+
+        # get the labels from the dataset, as a view
+        labels = data[:, 17]
+
+        # get the features from the dataset, as a lazy view
+        features = FeatureView(data=data, columns=[index for index in range(data.shape[1]) if index != 17])
+
+        return features, labels
+
     # load the data into memory
     data = np.load(dataset)
 
@@ -77,80 +98,164 @@ def load_data(dataset):
     return data, labels
 
 
-def plot_confusion_matrix(phase, path, class_names):
-    """Plots the confusion matrix using matplotlib.
+def one_hot(labels, num_classes, on_value=1.0, off_value=0.0):
+    """Returns the one-hot encoding of the labels, as `tf.one_hot` does, without adding an op to the graph
+
+    Parameter
+    ---------
+    labels : numpy.ndarray
+      The class indices, of any numeric dtype.
+    num_classes : int
+      The number of classes in a dataset.
+    on_value : float
+      The value of the class of a label.
+    off_value : float
+      The value of the other classes.
+
+    Returns
+    -------
+    onehot : numpy.ndarray
+      A [N, num_classes] float32 array.
+    """
+    labels = np.asarray(labels).astype(np.int64)
+    return np.where(labels[:, np.newaxis] == np.arange(num_classes), on_value, off_value).astype(np.float32)
+
+
+class FeatureView:
+    """Lazy view of the feature columns of a memory-mapped dataset
+
+    Slicing the rows of a view returns another view, without reading the file.
+    The selected rows and columns are only read when the view is converted to an array.
+    """
+
+    def __init__(self, data, columns):
+        """Initialize the FeatureView class
+
+        Parameter
+        ---------
+        data : numpy.memmap
+          The memory-mapped dataset, or a slice of its rows.
+        columns : list
+          The indices of the feature columns.
+        """
+        self.data = data
+        self.columns = np.asarray(columns)
+
+    @property
+    def shape(self):
+        return self.data.shape[0], self.columns.shape[0]
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FeatureView(data=self.data[index], columns=self.columns)
+        return np.asarray(self.data[index])[..., self.columns]
+
+    def __array__(self, dtype=None):
+        # fancy indexing reads the rows into a new array
+        array = self.data[:, self.columns]
+        return array if dtype is None else array.astype(dtype)
+
+
+def confusion_matrix(path, num_classes=2):
+    """Counts the confusion matrix of the results files, one block at a time
 
     Parameter
     ---------
-    phase : str
-      String value indicating for what phase is the confusion matrix, i.e. training/validation/testing
     path : str
-      Directory where the predicted and actual label NPY files reside
-    class_names : str
-      List consisting of the class names for the labels
+      Results file written by `utils.results.ResultsWriter`, or directory where
+      the results files or the per-step predicted and actual label NPY files reside
+    num_classes : int
+      The number of classes in a dataset.
 
     Returns
     -------
     conf : array, shape = [num_classes, num_classes]
-      Confusion matrix
-    accuracy : float
-      Predictive accuracy
+      Confusion matrix, where conf[i][j] is the number of examples of class i predicted as class j
     """
 
     # list all the results files
-    files = list_files(path=path)
+    files = [path] if os.path.isfile(path) else list_files(path=path)
 
-    labels = np.array([])
+    conf = np.zeros([num_classes, num_classes], dtype=np.int64)
 
-    for file in files:
-        labels_batch = np.load(file)
-        labels = np.append(labels, labels_batch)
+    for index, file in enumerate(files):
+        for labels in read_results(file):
+            # drop the step column of the results files
+            if labels.shape[1] % 2 == 1:
+                labels = labels[:, 1:]
 
-        if (files.index(file) / files.__len__()) % 0.2 == 0:
-            print('Done appending {}% of {}'.format((files.index(file) / files.__len__()) * 100, files.__len__()))
+            # decode the one-hot encoded labels to single integer
+            predictions = np.argmax(labels[:, :num_classes], axis=1)
+            actual = np.argmax(labels[:, num_classes:], axis=1)
 
-    labels = np.reshape(labels, newshape=(labels.shape[0] // 4, 4))
+            # count the (actual, predicted) pairs
+            conf += np.bincount(actual * num_classes + predictions,
+                                minlength=num_classes * num_classes).reshape(num_classes, num_classes)
 
-    print('Done appending NPY files.')
+        if (index + 1) % max(len(files) // 5, 1) == 0:
+            print('Done counting {:.0f}% of {}'.format((index + 1) / len(files) * 100, len(files)))
 
-    # get the predicted labels
-    predictions = labels[:, :2]
+    return conf
 
-    # get the actual labels
-    actual = labels[:, 2:]
 
-    # create a TensorFlow session
-    with tf.Session() as sess:
+def plot_confusion_matrix(phase, path, class_names, headless=False):
+    """Plots the confusion matrix using matplotlib.
 
-        # decode the one-hot encoded labels to single integer
-        predictions = sess.run(tf.argmax(predictions, 1))
-        actual = sess.run(tf.argmax(actual, 1))
+    Parameter
+    ---------
+    phase : str
+      String value indicating for what phase is the confusion matrix, i.e. training/validation/testing
+    path : str
+      Results file written by `utils.results.ResultsWriter`, or directory where
+      the results files or the per-step predicted and actual label NPY files reside
+    class_names : str
+      List consisting of the class names for the labels
+    headless : bool
+      If True, the confusion matrix is only computed, without importing matplotlib to plot it.
+
+    Returns
+    -------
+    conf : array, shape = [num_classes, num_classes]
+      Confusion matrix
+    accuracy : float
+      Predictive accuracy
+    """
 
     # get the confusion matrix based on the actual and predicted labels
-    conf = confusion_matrix(y_true=actual, y_pred=predictions)
+    conf = confusion_matrix(path=path, num_classes=len(class_names))
+
+    if not headless:
+        import matplotlib.pyplot as plt
 
-    # create a confusion matrix plot
-    plt.imshow(conf, cmap=plt.cm.Purples, interpolation='nearest')
+        # create a confusion matrix plot
+        plt.imshow(conf, cmap=plt.cm.Purples, interpolation='nearest')
 
-    # set the plot title
-    plt.title('Confusion Matrix for {} Phase'.format(phase))
+        # set the plot title
+        plt.title('Confusion Matrix for {} Phase'.format(phase))
 
-    # legend of intensity for the plot
-    plt.colorbar()
+        # legend of intensity for the plot
+        plt.colorbar()
 
-    tick_marks = np.arange(len(class_names))
-    plt.xticks(tick_marks, class_names, rotation=45)
-    plt.yticks(tick_marks, class_names)
+        tick_marks = np.arange(len(class_names))
+        plt.xticks(tick_marks, class_names, rotation=45)
+        plt.yticks(tick_marks, class_names)
 
-    plt.tight_layout()
-    plt.ylabel('Actual label')
-    plt.xlabel('Predicted label')
+        plt.tight_layout()
+        plt.ylabel('Actual label')
+        plt.xlabel('Predicted label')
 
-    # show the plot
-    plt.show()
+        # show the plot
+        plt.show()
 
     # get the accuracy of the phase
-    accuracy = (conf[0][0] + conf[1][1]) / labels.shape[0]
+    accuracy = np.trace(conf) / max(conf.sum(), 1)
 
     # return the confusion matrix and the accuracy
     return conf, accuracy
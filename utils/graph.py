@@ -0,0 +1,114 @@
+# Module for exporting and loading frozen inference graphs
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Freezes trained models into minimal inference graphs"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import os
+import tensorflow as tf
+
+
+def freeze_graph(checkpoint_path, output_names, frozen_graph_path, constants=None):
+    """Freezes the latest checkpoint into a GraphDef of the ops needed by the outputs
+
+    The variables are replaced by constants of their trained values, and the placeholders
+    in `constants` by constants of the given values, e.g. the dropout keep probability.
+    Only the ops the outputs depend on are kept, so the optimizer, its slots, and the
+    summaries are dropped.
+
+    Parameter
+    ---------
+    checkpoint_path : str
+      The path where the trained model is saved.
+    output_names : list
+      The names of the output ops, e.g. 'accuracy/prediction'.
+    frozen_graph_path : str
+      The path of the frozen graph (*.pb) to save.
+    constants : dict
+      The placeholders to replace, as {name: value}.
+
+    Returns
+    -------
+    graph_def : tf.GraphDef
+      The frozen graph.
+    """
+    checkpoint = tf.train.get_checkpoint_state(checkpoint_path)
+    assert checkpoint and checkpoint.model_checkpoint_path, 'No checkpoint found in {}'.format(checkpoint_path)
+
+    graph = tf.Graph()
+
+    with graph.as_default(), tf.Session(graph=graph) as sess:
+        saver = tf.train.import_meta_graph(checkpoint.model_checkpoint_path + '.meta', clear_devices=True)
+        saver.restore(sess, tf.train.latest_checkpoint(checkpoint_path))
+
+        # replace the variables with constants, and keep only the ops needed by the outputs
+        graph_def = tf.graph_util.convert_variables_to_constants(sess=sess, input_graph_def=graph.as_graph_def(),
+                                                                 output_node_names=output_names)
+
+    for node in graph_def.node:
+        if constants and node.name in constants:
+            # turn the placeholder into a constant of the same dtype
+            node.op = 'Const'
+            for attr in list(node.attr.keys()):
+                if attr != 'dtype':
+                    del node.attr[attr]
+            dtype = tf.as_dtype(node.attr['dtype'].type)
+            node.attr['value'].CopyFrom(tf.AttrValue(tensor=tf.make_tensor_proto(constants[node.name], dtype=dtype)))
+
+    # drop the ops which only fed the replaced placeholders
+    graph_def = tf.graph_util.extract_sub_graph(graph_def, output_names)
+
+    if os.path.dirname(frozen_graph_path) and not os.path.exists(os.path.dirname(frozen_graph_path)):
+        os.makedirs(os.path.dirname(frozen_graph_path))
+
+    with tf.gfile.GFile(frozen_graph_path, 'wb') as file:
+        file.write(graph_def.SerializeToString())
+
+    print('Saved frozen graph of {} ops to {}'.format(len(graph_def.node), frozen_graph_path))
+
+    return graph_def
+
+
+def load_frozen_graph(frozen_graph_path):
+    """Returns a new graph of the frozen GraphDef, with the same op names
+
+    Parameter
+    ---------
+    frozen_graph_path : str
+      The path of the frozen graph (*.pb) saved by `freeze_graph()`.
+
+    Returns
+    -------
+    graph : tf.Graph
+      The inference graph.
+    """
+    graph_def = tf.GraphDef()
+
+    with tf.gfile.GFile(frozen_graph_path, 'rb') as file:
+        graph_def.ParseFromString(file.read())
+
+    graph = tf.Graph()
+
+    with graph.as_default():
+        tf.import_graph_def(graph_def, name='')
+
+    return graph
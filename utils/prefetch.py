@@ -0,0 +1,124 @@
+# Module for producing batches of data ahead of the training loop
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Background batch producer for the training loops"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import numpy as np
+import queue
+import threading
+import time
+
+
+class BatchPrefetcher:
+    """Produces batches of features and labels on a background thread
+
+    The batches are sliced, converted to arrays of the given dtype (which reads
+    the rows of a memory-mapped dataset), and put in a bounded queue, while the
+    session runs the previous steps. Iterating over the prefetcher yields the
+    batches in order, and accumulates the time spent waiting for them in `wait_time`.
+    """
+
+    def __init__(self, features, labels, batch_size, num_steps, shuffle=False, capacity=8, dtype=None, seed=None):
+        """Initialize the BatchPrefetcher class
+
+        Parameter
+        ---------
+        features : numpy.ndarray
+          The features of the dataset, or a `utils.data.FeatureView`.
+        labels : numpy.ndarray
+          The labels of the dataset.
+        batch_size : int
+          The number of rows per batch.
+        num_steps : int
+          The number of batches to produce, wrapping around the dataset for every epoch.
+        shuffle : bool
+          If True, the order of the batches is shuffled for every epoch.
+        capacity : int
+          The maximum number of batches staged ahead.
+        dtype : numpy.dtype
+          The dtype of the produced batches, e.g. the dtype of the input placeholders.
+        seed : int
+          The seed for shuffling the batches.
+        """
+        self.features = features
+        self.labels = labels
+        self.batch_size = batch_size
+        self.num_steps = num_steps
+        self.shuffle = shuffle
+        self.dtype = dtype
+        self.random = np.random.RandomState(seed)
+        self.wait_time = 0.0
+
+        self.queue = queue.Queue(maxsize=capacity)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._produce, name='batch-prefetcher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _produce(self):
+        """Puts the batches in the queue, followed by None when done"""
+        try:
+            steps_per_epoch = max(self.features.shape[0] // self.batch_size, 1)
+            order = np.arange(steps_per_epoch)
+
+            for step in range(self.num_steps):
+                index = step % steps_per_epoch
+                if self.shuffle and index == 0:
+                    order = self.random.permutation(steps_per_epoch)
+
+                offset = order[index] * self.batch_size
+                batch = (np.asarray(self.features[offset:(offset + self.batch_size)], dtype=self.dtype),
+                         np.asarray(self.labels[offset:(offset + self.batch_size)], dtype=self.dtype))
+
+                if not self._put(batch):
+                    return
+            self._put(None)
+        except Exception as exception:
+            self._put(exception)
+
+    def _put(self, item):
+        """Puts an item in the queue, unless the prefetcher is closed; returns False if closed"""
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        while True:
+            start_time = time.time()
+            batch = self.queue.get()
+            self.wait_time += time.time() - start_time
+
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+
+    def close(self):
+        """Stops the background thread"""
+        self.stop_event.set()
+        self.thread.join()
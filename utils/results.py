@@ -0,0 +1,133 @@
+# Module for saving the actual and predicted labels of the models
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Buffered writer and reader of the results file of each phase"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import numpy as np
+import os
+
+
+class ResultsWriter:
+    """Appends the predicted and actual labels of each batch to one results file per phase
+
+    The rows [step, predictions..., actual...] are buffered in a preallocated block,
+    and the block is appended to the file as a NPY array whenever it is full. A results
+    file is thus a sequence of NPY arrays, which `read_results()` yields one at a time.
+    """
+
+    def __init__(self, result_path, phase, model_name, num_classes, block_size=65536):
+        """Initialize the ResultsWriter class
+
+        Parameter
+        ---------
+        result_path : str
+          The path where to save the results file.
+        phase : str
+          The phase for which the predictions is, i.e. training/validation/testing.
+        model_name : str
+          The name of the model, e.g. gru_svm.
+        num_classes : int
+          The number of classes in a dataset.
+        block_size : int
+          The number of rows to buffer before appending them to the file.
+        """
+
+        # Create the result_path directory if it does not exist
+        if not os.path.exists(path=result_path):
+            os.makedirs(result_path)
+
+        self.path = os.path.join(result_path, '{}-{}.npy'.format(phase, model_name))
+        self.num_classes = num_classes
+        self.buffer = np.empty([block_size, 1 + 2 * num_classes], dtype=np.float32)
+        self.size = 0
+        self.file = open(self.path, 'wb')
+
+    def write(self, step, predictions, actual):
+        """Buffers the predicted and actual labels of a batch
+
+        Parameter
+        ---------
+        step : int
+          The time step of the batch.
+        predictions : numpy.ndarray
+          The NumPy array containing the predicted labels.
+        actual : numpy.ndarray
+          The NumPy array containing the actual labels.
+        """
+        num_rows = predictions.shape[0]
+
+        if self.size + num_rows > self.buffer.shape[0]:
+            self.flush()
+
+        if num_rows > self.buffer.shape[0]:
+            # the batch does not fit in the buffer, append it as its own block
+            block = np.empty([num_rows, self.buffer.shape[1]], dtype=np.float32)
+            self._fill(block, step, predictions, actual)
+            np.save(self.file, block)
+            return
+
+        self._fill(self.buffer[self.size:(self.size + num_rows)], step, predictions, actual)
+        self.size += num_rows
+
+    def _fill(self, block, step, predictions, actual):
+        block[:, 0] = step
+        block[:, 1:(1 + self.num_classes)] = predictions
+        block[:, (1 + self.num_classes):] = actual
+
+    def flush(self):
+        """Appends the buffered rows to the file"""
+        if self.size > 0:
+            np.save(self.file, self.buffer[:self.size])
+            self.size = 0
+        self.file.flush()
+
+    def close(self):
+        """Appends the buffered rows to the file, and closes it"""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_results(path):
+    """Yields the blocks of a results file
+
+    Parameter
+    ---------
+    path : str
+      The results file, written by `ResultsWriter`.
+
+    Returns
+    -------
+    block : numpy.ndarray
+      A [N, 1 + 2 * NUM_CLASSES] array of the step, predicted labels, and actual labels of N rows.
+    """
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        while file.tell() < size:
+            yield np.load(file)
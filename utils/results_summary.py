@@ -21,7 +21,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-__version__ = '0.3.0'
+__version__ = '0.3.1'
 __author__ = 'Abien Fred Agarap'
 
 import argparse
@@ -35,15 +35,17 @@ def parse_args():
                        help='path where the results of model training are stored')
     group.add_argument('-v', '--validation_results_path', required=True, type=str,
                        help='path where the results of model validation are stored')
+    group.add_argument('--headless', action='store_true',
+                       help='only compute the confusion matrices, without plotting them')
     arguments = parser.parse_args()
     return arguments
 
 
 def main(argv):
     training_confusion_matrix = plot_confusion_matrix(phase='Training', path=argv.training_results_path,
-                                                      class_names=['normal', 'under attack'])
+                                                      class_names=['normal', 'under attack'], headless=argv.headless)
     validation_confusion_matrix = plot_confusion_matrix(phase='Validation', path=argv.validation_results_path,
-                                                        class_names=['normal', 'under attack'])
+                                                        class_names=['normal', 'under attack'], headless=argv.headless)
     # display the findings from the confusion matrix
     print('True negative : {}'.format(training_confusion_matrix[0][0][0]))
     print('False negative : {}'.format(training_confusion_matrix[0][1][0]))
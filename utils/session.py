@@ -0,0 +1,62 @@
+# Module for configuring the TensorFlow sessions of the models
+# Copyright (C) 2017  Abien Fred Agarap
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+"""Thread and graph optimizer configuration of the TensorFlow sessions"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__version__ = '0.1.0'
+__author__ = 'Abien Fred Agarap'
+
+import tensorflow as tf
+
+# the levels of the graph optimizer
+OPT_LEVELS = {'L0': tf.OptimizerOptions.L0, 'L1': tf.OptimizerOptions.L1}
+
+
+def session_config(intra_op_threads=0, inter_op_threads=0, opt_level=None, xla=False):
+    """Returns the configuration of a session
+
+    Parameter
+    ---------
+    intra_op_threads : int
+      The number of threads of a single op, e.g. a matmul. 0 lets TensorFlow choose, i.e. the number of cores.
+    inter_op_threads : int
+      The number of threads running independent ops concurrently. 0 lets TensorFlow choose.
+    opt_level : str
+      The level of the graph optimizer: 'L0' for no optimization, 'L1' for the default common
+      subexpression elimination and constant folding. None keeps the default.
+    xla : bool
+      If True, the graph is compiled with the XLA JIT. TensorFlow must be built with XLA, and on CPU,
+      the JIT must also be enabled with TF_XLA_FLAGS=--tf_xla_cpu_global_jit on the versions which support it.
+
+    Returns
+    -------
+    config : tf.ConfigProto
+      The session configuration.
+    """
+    config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                            inter_op_parallelism_threads=inter_op_threads)
+
+    if opt_level is not None:
+        config.graph_options.optimizer_options.opt_level = OPT_LEVELS[opt_level]
+
+    if xla:
+        config.graph_options.optimizer_options.global_jit_level = tf.OptimizerOptions.ON_1
+
+    return config